@@ -1,82 +1,451 @@
 # core/alerts.py
 
+import math
+import time
 import uuid
-from datetime import datetime
-from core.db import get_connection
+import atexit
+import sqlite3
+import threading
+from core.db import init_db, get_connection
+from core.logger import LLMLogger
+from core.utils import now_ms, ms_to_iso, iso_to_ms
 
 # ------- Option 2 thresholds (Balanced) -------
+# Used until a model has enough history for an adaptive baseline, and as floors after that
 LATENCY_STATIC = 1500            # ms
 ERROR_RATE_STATIC = 15           # %
-COST_SPIKE_STATIC = 2.0          # 2x normal daily cost
+COST_SPIKE_STATIC = 2.0          # 2x normal spend rate
+LATENCY_FLOOR = 500              # ms — adaptive latency thresholds never go below this
+TTFT_STATIC = 1000               # ms — time to first token of a streamed call
 
+# ------- Streaming engine settings -------
+WINDOW_SLOTS = 15                # per-minute buckets kept per model (1/5/15 min windows)
+EWMA_ALPHA = 0.1                 # baseline smoothing, applied once per completed minute
+BASELINE_SIGMAS = 3              # adaptive threshold = baseline mean + k·σ
+WARMUP_MINUTES = 10              # completed minutes before a baseline is trusted
+MIN_WINDOW_EVENTS = 5            # don't judge rates/percentiles on fewer events
 
-def insert_alert(alert_type, message, severity, value=None, expected=None):
-    conn = get_connection()
-    alert_id = str(uuid.uuid4())
+# ------- Incident settings -------
+ALERT_COOLDOWN = 300             # s — repeats within this window update the open incident
+ALERT_FLUSH_INTERVAL = 2.0       # s — alert writes are batched on this interval
 
-    conn.execute("""
+# Latency histogram: log-spaced bins, bin i covers (1.25^(i-1), 1.25^i] ms
+_BIN_BASE = 1.25
+_LOG_BASE = math.log(_BIN_BASE)
+_NUM_BINS = 64
+
+
+# ============================================================
+# INCIDENT STORE (dedup + cooldown + batched writes)
+# ============================================================
+def alert_fingerprint(alert_type, model_name, severity):
+    return f"{alert_type}|{model_name or '-'}|{severity}"
+
+
+UPSERT_INCIDENT_SQL = """
     INSERT INTO llm_alerts (
-        id, timestamp, alert_type, message, severity, value, expected, resolved
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, 0)
-    """, (
-        alert_id,
-        datetime.utcnow().isoformat(),
-        alert_type,
-        message,
-        severity,
-        value,
-        expected
-    ))
-
-    conn.commit()
-    conn.close()
-    print(f"[ALERT] → {alert_type} | {severity} | {message}")
-
-
-def run_alert_checks(log_row, daily_row):
+        id, timestamp, alert_type, message, severity, value, expected, resolved,
+        fingerprint, model_name, count, first_seen, last_seen, peak_value
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        message = excluded.message,
+        value = excluded.value,
+        expected = excluded.expected,
+        count = excluded.count,
+        last_seen = excluded.last_seen,
+        peak_value = excluded.peak_value,
+        resolved = 0
+"""
+
+
+def upsert_incidents(conn, rows):
+    """Write incident rows built by AlertStore.flush (caller owns the transaction; also run by the collector)."""
+    conn.executemany(UPSERT_INCIDENT_SQL, rows)
+
+
+class AlertStore:
     """
-    log_row = last interaction logged
-    daily_row = aggregated daily metrics from llm_metrics_daily
+    Collapses repeated alerts into incidents and writes them in batches.
+
+    An alert whose fingerprint (type, model, severity) matches an incident seen
+    within `cooldown` seconds updates that incident's count, last_seen, peak value
+    and message (and reopens it if it was resolved) instead of inserting a new row.
+    Changed incidents are upserted by a background thread every `flush_interval` s,
+    through the collector in collector mode (kept and resent if it is unreachable).
     """
 
-    latency = log_row["latency_ms"]
-    cost = log_row["cost_usd"]
-    error = log_row["error_type"]
-
-    avg_cost_today = daily_row["total_cost_usd"]
-    total_requests_today = daily_row["total_requests"]
-
-    # ---------------- LATENCY ALERT ----------------
-    if latency > LATENCY_STATIC:
-        insert_alert(
-            alert_type="HIGH_LATENCY",
-            message=f"Latency {latency}ms exceeded threshold {LATENCY_STATIC}ms",
-            severity="warning",
-            value=latency,
-            expected=LATENCY_STATIC
-        )
-
-    # ---------------- ERROR SPIKE ALERT ----------------
-    if error is not None:
-        # error_rate = 1 error over X requests
-        error_rate = (daily_row["error_count"] / total_requests_today) * 100
-        if error_rate > ERROR_RATE_STATIC:
-            insert_alert(
-                alert_type="ERROR_SPIKE",
-                message=f"Error rate {error_rate:.1f}% exceeded threshold {ERROR_RATE_STATIC}%",
-                severity="critical",
-                value=error_rate,
-                expected=ERROR_RATE_STATIC
-            )
-
-    # ---------------- COST SPIKE ALERT ----------------
-    # Check if cost is unusually high (compared to avg daily cost)
-    if avg_cost_today > 0 and cost > avg_cost_today * COST_SPIKE_STATIC:
-        insert_alert(
-            alert_type="COST_SPIKE",
-            message=f"Cost ${cost:.4f} exceeded {COST_SPIKE_STATIC}× of today's avg ${avg_cost_today:.4f}",
-            severity="warning",
-            value=cost,
-            expected=avg_cost_today * COST_SPIKE_STATIC
-        )
- 
\ No newline at end of file
+    def __init__(self, cooldown=ALERT_COOLDOWN, flush_interval=ALERT_FLUSH_INTERVAL):
+        self.cooldown_ms = cooldown * 1000
+        self.flush_interval = flush_interval
+        self._open = {}
+        self._dirty = set()
+        self._unsent = []
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._thread = None
+
+    def record(self, alert_type, message, severity, value=None, expected=None, model_name=None):
+        fp = alert_fingerprint(alert_type, model_name, severity)
+        ts = now_ms()
+
+        with self._lock:
+            if not self._loaded:
+                self._load_open_incidents()
+
+            inc = self._open.get(fp)
+            if inc is not None and ts - inc["last_seen_ms"] <= self.cooldown_ms:
+                inc["count"] += 1
+                inc["last_seen_ms"] = ts
+                inc["message"] = message
+                inc["value"] = value
+                inc["expected"] = expected
+                if value is not None and (inc["peak_value"] is None or value > inc["peak_value"]):
+                    inc["peak_value"] = value
+                is_new = False
+            else:
+                inc = self._open[fp] = {
+                    "id": str(uuid.uuid4()),
+                    "fingerprint": fp,
+                    "alert_type": alert_type,
+                    "model_name": model_name,
+                    "severity": severity,
+                    "message": message,
+                    "value": value,
+                    "expected": expected,
+                    "peak_value": value,
+                    "count": 1,
+                    "first_seen_ms": ts,
+                    "last_seen_ms": ts
+                }
+                is_new = True
+            self._dirty.add(fp)
+
+        if is_new:
+            print(f"[ALERT] → {alert_type} | {severity} | {message}")
+        self._ensure_flusher()
+        return inc["id"]
+
+    def flush(self):
+        with self._lock:
+            rows = [self._open[fp] for fp in self._dirty]
+            # Rows the collector did not take last time, superseded by newer versions of the same incident
+            rows = self._unsent + [
+                (r["id"], ms_to_iso(r["first_seen_ms"]), r["alert_type"], r["message"], r["severity"],
+                 r["value"], r["expected"], r["fingerprint"], r["model_name"], r["count"],
+                 ms_to_iso(r["first_seen_ms"]), ms_to_iso(r["last_seen_ms"]), r["peak_value"])
+                for r in rows
+            ]
+            rows = list({r[0]: r for r in rows}.values())
+            self._unsent = []
+            self._dirty.clear()
+            # Forget incidents whose cooldown has passed
+            cutoff = now_ms() - self.cooldown_ms
+            for fp in [fp for fp, inc in self._open.items() if inc["last_seen_ms"] < cutoff]:
+                del self._open[fp]
+
+        if not rows:
+            return 0
+
+        collector = LLMLogger.collector()
+        if collector is not None:
+            if not collector.write("alerts", rows):
+                with self._lock:
+                    self._unsent = rows
+                return 0
+            return len(rows)
+
+        conn = get_connection()
+        with conn:
+            upsert_incidents(conn, rows)
+        return len(rows)
+
+    def _load_open_incidents(self):
+        # Once per process: pick up incidents still in cooldown so a restart doesn't duplicate them
+        self._loaded = True
+        remote = LLMLogger.collector() is not None
+        try:
+            if not remote:
+                init_db()
+            cutoff = ms_to_iso(now_ms() - self.cooldown_ms)
+            rows = get_connection(readonly=remote).execute("""
+                SELECT id, fingerprint, alert_type, model_name, severity, message, value, expected,
+                       peak_value, count, first_seen, last_seen
+                FROM llm_alerts
+                WHERE resolved = 0 AND fingerprint IS NOT NULL AND last_seen >= ?
+            """, (cutoff,)).fetchall()
+        except sqlite3.Error:
+            return
+        for r in rows:
+            self._open[r[1]] = {
+                "id": r[0], "fingerprint": r[1], "alert_type": r[2], "model_name": r[3],
+                "severity": r[4], "message": r[5], "value": r[6], "expected": r[7],
+                "peak_value": r[8], "count": r[9] or 1,
+                "first_seen_ms": iso_to_ms(r[10]), "last_seen_ms": iso_to_ms(r[11])
+            }
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="alert-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[ALERT STORE] flush failed → {e}")
+
+
+alert_store = AlertStore()
+
+
+def insert_alert(alert_type, message, severity, value=None, expected=None, model_name=None):
+    """Record an alert occurrence (deduplicated into an incident, written in the next batch)."""
+    return alert_store.record(alert_type, message, severity, value, expected, model_name)
+
+
+# ============================================================
+# STREAMING WINDOWS + BASELINES
+# ============================================================
+def _latency_bin(latency_ms):
+    if latency_ms <= 1:
+        return 0
+    return min(_NUM_BINS - 1, int(math.log(latency_ms) / _LOG_BASE) + 1)
+
+
+def _histogram_percentile(bins, count, q):
+    """Upper edge of the bin holding the q-th percentile (≤25% relative error)."""
+    target = math.ceil(q / 100 * count)
+    seen = 0
+    for i, c in enumerate(bins):
+        seen += c
+        if seen >= target:
+            return _BIN_BASE ** i
+    return _BIN_BASE ** (_NUM_BINS - 1)
+
+
+class Ewma:
+    """Exponentially weighted mean and variance."""
+
+    def __init__(self, alpha=EWMA_ALPHA):
+        self.alpha = alpha
+        self.mean = None
+        self.var = 0.0
+        self.samples = 0
+
+    def update(self, x):
+        self.samples += 1
+        if self.mean is None:
+            self.mean = x
+            return
+        diff = x - self.mean
+        incr = self.alpha * diff
+        self.mean += incr
+        self.var = (1 - self.alpha) * (self.var + diff * incr)
+
+    def warm(self):
+        return self.samples >= WARMUP_MINUTES
+
+    def upper(self, sigmas=BASELINE_SIGMAS):
+        return self.mean + sigmas * math.sqrt(self.var)
+
+
+class _Minute:
+    __slots__ = ("minute", "count", "errors", "cost", "bins")
+
+    def __init__(self, minute):
+        self.minute = minute
+        self.count = 0
+        self.errors = 0
+        self.cost = 0.0
+        self.bins = [0] * _NUM_BINS
+
+
+class ModelWindow:
+    """Ring of per-minute buckets for one model, plus EWMA baselines fed per completed minute."""
+
+    def __init__(self):
+        self.slots = [None] * WINDOW_SLOTS
+        self.current = None
+        self.latency_p95 = Ewma()
+        self.error_rate = Ewma()
+        self.spend = Ewma()
+
+    def add(self, minute, latency_ms, is_error, cost):
+        slot = self.slots[minute % WINDOW_SLOTS]
+        if slot is None or slot.minute < minute:
+            if self.current is not None and self.current.minute < minute:
+                self._fold(self.current)
+            slot = self.slots[minute % WINDOW_SLOTS] = _Minute(minute)
+            self.current = slot
+        elif slot.minute > minute:
+            return    # too old for the ring; ignore
+
+        slot.count += 1
+        slot.errors += is_error
+        slot.cost += cost
+        if not is_error and latency_ms is not None:
+            slot.bins[_latency_bin(latency_ms)] += 1
+
+    def _fold(self, m):
+        # Completed minute → baselines
+        ok = m.count - m.errors
+        if ok >= MIN_WINDOW_EVENTS:
+            self.latency_p95.update(_histogram_percentile(m.bins, ok, 95))
+        if m.count >= MIN_WINDOW_EVENTS:
+            self.error_rate.update(m.errors / m.count * 100)
+        self.spend.update(m.cost)
+
+    def window(self, minute, span):
+        """Aggregate the last `span` minutes (≤ WINDOW_SLOTS slots): count, errors, cost, bins."""
+        count = errors = 0
+        cost = 0.0
+        bins = [0] * _NUM_BINS
+        for s in self.slots:
+            if s is not None and minute - span < s.minute <= minute:
+                count += s.count
+                errors += s.errors
+                cost += s.cost
+                bins = [a + b for a, b in zip(bins, s.bins)]
+        return {"count": count, "errors": errors, "cost": cost, "bins": bins}
+
+
+# ============================================================
+# ALERT ENGINE
+# ============================================================
+class AlertEngine:
+    """
+    In-memory alert evaluation fed directly by log events (LLMLogger listener).
+    Work per event is bounded by WINDOW_SLOTS × _NUM_BINS; no DB reads.
+    Fired alerts go to `on_alert` (insert_alert by default, which deduplicates them).
+    """
+
+    def __init__(self, on_alert=insert_alert):
+        self.on_alert = on_alert
+        self.models = {}
+        self._lock = threading.Lock()
+
+    def observe(self, event):
+        model = event.get("model_name") or "unknown"
+        minute = event["ts_ms"] // 60_000
+        is_error = 1 if event.get("error_type") is not None else 0
+        latency = event.get("latency_ms")
+        ttft = event.get("ttft_ms")
+        cost = event.get("cost_usd") or 0.0
+
+        with self._lock:
+            w = self.models.get(model)
+            if w is None:
+                w = self.models[model] = ModelWindow()
+            w.add(minute, latency, is_error, cost)
+            alerts = self._evaluate(model, w, minute, latency, is_error, ttft)
+
+        for alert in alerts:
+            self.on_alert(**alert)
+        return alerts
+
+    def _evaluate(self, model, w, minute, latency, is_error, ttft=None):
+        alerts = []
+
+        # ---------------- LATENCY ALERT ----------------
+        # 1-min p95 when there is enough traffic, otherwise this request's latency
+        if not is_error and latency is not None:
+            threshold = LATENCY_STATIC
+            if w.latency_p95.warm():
+                threshold = max(LATENCY_FLOOR, w.latency_p95.upper())
+
+            last_min = w.window(minute, 1)
+            ok = last_min["count"] - last_min["errors"]
+            if ok >= MIN_WINDOW_EVENTS:
+                value, label = _histogram_percentile(last_min["bins"], ok, 95), "1-min p95 latency"
+            else:
+                value, label = latency, "Latency"
+
+            if value > threshold:
+                alerts.append(dict(
+                    alert_type="HIGH_LATENCY",
+                    model_name=model,
+                    message=f"[{model}] {label} {value:.0f}ms exceeded threshold {threshold:.0f}ms",
+                    severity="warning",
+                    value=value,
+                    expected=threshold
+                ))
+
+        # ---------------- TTFT ALERT ----------------
+        # Streamed calls only: how long the user waited before seeing any output
+        if not is_error and ttft is not None and ttft > TTFT_STATIC:
+            alerts.append(dict(
+                alert_type="HIGH_TTFT",
+                model_name=model,
+                message=f"[{model}] Time to first token {ttft:.0f}ms exceeded threshold {TTFT_STATIC:.0f}ms",
+                severity="warning",
+                value=ttft,
+                expected=TTFT_STATIC
+            ))
+
+        # ---------------- ERROR SPIKE ALERT ----------------
+        if is_error:
+            last5 = w.window(minute, 5)
+            if last5["count"] >= MIN_WINDOW_EVENTS:
+                error_rate = last5["errors"] / last5["count"] * 100
+                threshold = ERROR_RATE_STATIC
+                if w.error_rate.warm():
+                    threshold = max(ERROR_RATE_STATIC, w.error_rate.upper())
+                if error_rate > threshold:
+                    alerts.append(dict(
+                        alert_type="ERROR_SPIKE",
+                        model_name=model,
+                        message=f"[{model}] 5-min error rate {error_rate:.1f}% exceeded threshold {threshold:.1f}%",
+                        severity="critical",
+                        value=error_rate,
+                        expected=threshold
+                    ))
+
+        # ---------------- COST SPIKE ALERT ----------------
+        # Spend in the current minute vs. the model's usual per-minute spend
+        if w.spend.warm() and w.spend.mean > 0:
+            spend = w.window(minute, 1)["cost"]
+            threshold = max(w.spend.mean * COST_SPIKE_STATIC, w.spend.upper())
+            if spend > threshold:
+                alerts.append(dict(
+                    alert_type="COST_SPIKE",
+                    model_name=model,
+                    message=f"[{model}] Spend ${spend:.4f}/min exceeded {threshold:.4f} (baseline ${w.spend.mean:.4f}/min)",
+                    severity="warning",
+                    value=spend,
+                    expected=threshold
+                ))
+
+        return alerts
+
+    def snapshot(self, now_minute=None):
+        """Current 1/5/15-min stats and baselines per model (for dashboards / debugging)."""
+        with self._lock:
+            out = {}
+            for model, w in self.models.items():
+                minute = now_minute if now_minute is not None else (w.current.minute if w.current else 0)
+                windows = {}
+                for span in (1, 5, 15):
+                    agg = w.window(minute, span)
+                    ok = agg["count"] - agg["errors"]
+                    windows[f"{span}m"] = {
+                        "count": agg["count"],
+                        "error_rate": agg["errors"] / agg["count"] * 100 if agg["count"] else 0.0,
+                        "p50_ms": _histogram_percentile(agg["bins"], ok, 50) if ok else None,
+                        "p95_ms": _histogram_percentile(agg["bins"], ok, 95) if ok else None,
+                        "p99_ms": _histogram_percentile(agg["bins"], ok, 99) if ok else None,
+                        "spend_per_min": agg["cost"] / span
+                    }
+                out[model] = {
+                    "windows": windows,
+                    "baseline_p95_ms": w.latency_p95.mean,
+                    "baseline_error_rate": w.error_rate.mean,
+                    "baseline_spend_per_min": w.spend.mean
+                }
+            return out
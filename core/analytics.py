@@ -1,34 +1,282 @@
 # core/analytics.py
 
+import sys
+import math
 from core.db import get_connection
+from core.rollups import rebuild_rollups
+from core.sketch import rebuild_sketches
+from core.prompts import rebuild_prompt_templates
+from core.retention import retained_since
+from core.utils import day_start_ms
+
+# Columns compared by check_daily_metrics
+DAILY_COLUMNS = (
+    "total_requests", "error_count", "sum_latency_ms", "sum_tokens_in",
+    "sum_tokens_out", "total_cost_usd", "total_cost_inr",
+    "streamed_requests", "sum_ttft_ms", "sum_tokens_per_s"
+)
+
+# Variables whose per-day sums / sums of squares / cross-products are kept in
+# llm_moments_daily, enough to rebuild means, variances and correlations
+MOMENT_VARS = ("tokens_in", "tokens_out", "latency_ms", "cost_usd", "cost_inr")
+MOMENT_PAIRS = [
+    (a, b) for i, a in enumerate(MOMENT_VARS) for b in MOMENT_VARS[i:]
+]
+MOMENT_COLUMNS = (
+    ("n",)
+    + tuple(f"sum_{v}" for v in MOMENT_VARS)
+    + tuple(f"sum_{a}_x_{b}" for a, b in MOMENT_PAIRS)
+)
+
+
+def record_daily_metrics(conn, events):
+    """
+    Incrementally fold new log events into llm_metrics_daily.
+    Only the days touched by `events` are updated; the caller owns the transaction.
+    """
+    buckets = {}
+    for e in events:
+        day = e.get("day") or e["timestamp"][:10]
+        b = buckets.setdefault(day, [0, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0, 0.0, 0.0])
+        b[0] += 1
+        b[1] += 1 if e.get("error_type") is not None else 0
+        b[2] += e.get("latency_ms") or 0
+        b[3] += e.get("tokens_in") or 0
+        b[4] += e.get("tokens_out") or 0
+        b[5] += e.get("cost_usd") or 0
+        b[6] += e.get("cost_inr") or 0
+        # Streamed calls only (ttft_ms is NULL otherwise)
+        b[7] += 1 if e.get("ttft_ms") is not None else 0
+        b[8] += e.get("ttft_ms") or 0
+        b[9] += e.get("tokens_per_s") or 0
+
+    conn.executemany("""
+        INSERT INTO llm_metrics_daily
+        (date, total_requests, error_count, sum_latency_ms, sum_tokens_in, sum_tokens_out,
+         total_cost_usd, total_cost_inr, streamed_requests, sum_ttft_ms, sum_tokens_per_s,
+         avg_latency_ms, avg_tokens_in, avg_tokens_out)
+        VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?4 * 1.0 / ?2, ?5 * 1.0 / ?2, ?6 * 1.0 / ?2)
+        ON CONFLICT(date) DO UPDATE SET
+            total_requests = total_requests + excluded.total_requests,
+            error_count = error_count + excluded.error_count,
+            sum_latency_ms = sum_latency_ms + excluded.sum_latency_ms,
+            sum_tokens_in = sum_tokens_in + excluded.sum_tokens_in,
+            sum_tokens_out = sum_tokens_out + excluded.sum_tokens_out,
+            total_cost_usd = total_cost_usd + excluded.total_cost_usd,
+            total_cost_inr = total_cost_inr + excluded.total_cost_inr,
+            streamed_requests = streamed_requests + excluded.streamed_requests,
+            sum_ttft_ms = sum_ttft_ms + excluded.sum_ttft_ms,
+            sum_tokens_per_s = sum_tokens_per_s + excluded.sum_tokens_per_s,
+            avg_latency_ms = (sum_latency_ms + excluded.sum_latency_ms) / (total_requests + excluded.total_requests),
+            avg_tokens_in = (sum_tokens_in + excluded.sum_tokens_in) / (total_requests + excluded.total_requests),
+            avg_tokens_out = (sum_tokens_out + excluded.sum_tokens_out) / (total_requests + excluded.total_requests)
+    """, [(day, *b) for day, b in buckets.items()])
+
+
+# Same aggregation as record_daily_metrics, computed from raw logs (days from :since_day)
+DAILY_FROM_LOGS_SQL = """
+    SELECT
+        day AS date,
+        COUNT(*) AS total_requests,
+        SUM(CASE WHEN error_type IS NOT NULL THEN 1 ELSE 0 END) AS error_count,
+        TOTAL(latency_ms) AS sum_latency_ms,
+        TOTAL(tokens_in) AS sum_tokens_in,
+        TOTAL(tokens_out) AS sum_tokens_out,
+        TOTAL(cost_usd) AS total_cost_usd,
+        TOTAL(cost_inr) AS total_cost_inr,
+        TOTAL(ttft_ms IS NOT NULL) AS streamed_requests,
+        TOTAL(ttft_ms) AS sum_ttft_ms,
+        TOTAL(tokens_per_s) AS sum_tokens_per_s
+    FROM llm_logs
+    WHERE :since_day IS NULL OR day >= :since_day
+    GROUP BY day
+"""
+
+
+def rebuild_daily_metrics(conn=None):
+    """
+    Repair mode: recompute every rollup from llm_logs — daily metrics,
+    moments, time buckets, sketches and prompt-template aggregates.
+    Once retention has deleted old days, only days still in llm_logs are
+    recomputed; prompt templates (all-time totals) are then left as they are.
+    """
+    conn = conn or get_connection()
+    since_day = retained_since(conn)
+    since_ms = day_start_ms(since_day) if since_day else None
+
+    with conn:
+        conn.execute("DELETE FROM llm_metrics_daily WHERE :since_day IS NULL OR date >= :since_day",
+                     {"since_day": since_day})
+        conn.execute(f"""
+            INSERT INTO llm_metrics_daily
+            (date, total_requests, error_count, sum_latency_ms, sum_tokens_in, sum_tokens_out,
+             total_cost_usd, total_cost_inr, streamed_requests, sum_ttft_ms, sum_tokens_per_s,
+             avg_latency_ms, avg_tokens_in, avg_tokens_out)
+            SELECT
+                date, total_requests, error_count, sum_latency_ms, sum_tokens_in, sum_tokens_out,
+                total_cost_usd, total_cost_inr, streamed_requests, sum_ttft_ms, sum_tokens_per_s,
+                sum_latency_ms / total_requests,
+                sum_tokens_in / total_requests,
+                sum_tokens_out / total_requests
+            FROM ({DAILY_FROM_LOGS_SQL})
+        """, {"since_day": since_day})
+        rebuild_moments(conn, since_day)
+        rebuild_rollups(conn, since_ms)
+        rebuild_sketches(conn, since_ms)
+        if since_day is None:
+            rebuild_prompt_templates(conn)
 
-def update_daily_metrics():
-    conn = get_connection()
-
-    # Fetch aggregated metrics from raw logs
-    rows = conn.execute("""
-        SELECT
-            date(timestamp) AS date,
-            COUNT(*) AS total_requests,
-            AVG(latency_ms) AS avg_latency_ms,
-            AVG(tokens_in) AS avg_tokens_in,
-            AVG(tokens_out) AS avg_tokens_out,
-            SUM(cost_usd) AS total_cost_usd,
-            SUM(cost_inr) AS total_cost_inr,
-            SUM(CASE WHEN error_type IS NOT NULL THEN 1 ELSE 0 END) AS error_count
-        FROM llm_logs
-        GROUP BY date
-    """).fetchall()
-
-    # Insert aggregated values into llm_metrics_daily
-    for row in rows:
-        conn.execute("""
-            INSERT OR REPLACE INTO llm_metrics_daily
-            (date, total_requests, avg_latency_ms, error_count,
-             avg_tokens_in, avg_tokens_out, total_cost_usd, total_cost_inr)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, row)
-
-    conn.commit()
     return True
 
+
+# Kept for existing callers: a full recompute of the daily table
+update_daily_metrics = rebuild_daily_metrics
+
+
+def check_daily_metrics(conn=None, tolerance=1e-6):
+    """
+    Compare the incrementally maintained rollup with a fresh aggregation.
+    Days deleted by retention are skipped.
+    Returns a list of mismatches: {date, column, stored, expected}.
+    """
+    conn = conn or get_connection()
+    params = {"since_day": retained_since(conn)}
+
+    cols = ", ".join(DAILY_COLUMNS)
+    stored = {
+        row[0]: row[1:]
+        for row in conn.execute(
+            f"SELECT date, {cols} FROM llm_metrics_daily WHERE :since_day IS NULL OR date >= :since_day", params
+        )
+    }
+    expected = {
+        row[0]: row[1:]
+        for row in conn.execute(f"SELECT date, {cols} FROM ({DAILY_FROM_LOGS_SQL})", params)
+    }
+
+    mismatches = []
+    for day in sorted(set(stored) | set(expected)):
+        have = stored.get(day) or (None,) * len(DAILY_COLUMNS)
+        want = expected.get(day) or (None,) * len(DAILY_COLUMNS)
+        for col, a, b in zip(DAILY_COLUMNS, have, want):
+            if a is None or b is None:
+                if a != b:
+                    mismatches.append({"date": day, "column": col, "stored": a, "expected": b})
+            elif abs(a - b) > tolerance * max(1.0, abs(b)):
+                mismatches.append({"date": day, "column": col, "stored": a, "expected": b})
+    return mismatches
+
+
+# ============================================================
+# STREAMING MOMENTS (correlation without reading raw rows)
+# ============================================================
+MOMENTS_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS llm_moments_daily (
+        day TEXT PRIMARY KEY,
+        {", ".join(f"{c} REAL DEFAULT 0" for c in MOMENT_COLUMNS)}
+    )
+"""
+
+# Same sums as record_moments, computed from raw logs (NULL counts as 0, days from :since_day)
+MOMENTS_FROM_LOGS_SQL = f"""
+    SELECT
+        day,
+        COUNT(*),
+        {", ".join(f"TOTAL({v})" for v in MOMENT_VARS)},
+        {", ".join(f"TOTAL(COALESCE({a}, 0) * COALESCE({b}, 0))" for a, b in MOMENT_PAIRS)}
+    FROM llm_logs
+    WHERE day IS NOT NULL AND (:since_day IS NULL OR day >= :since_day)
+    GROUP BY day
+"""
+
+
+def record_moments(conn, events):
+    """Fold new log events into llm_moments_daily (caller owns the transaction)."""
+    buckets = {}
+    for e in events:
+        day = e.get("day") or e["timestamp"][:10]
+        x = [e.get(v) or 0 for v in MOMENT_VARS]
+        b = buckets.setdefault(day, [0.0] * len(MOMENT_COLUMNS))
+        b[0] += 1
+        for i, value in enumerate(x):
+            b[1 + i] += value
+        offset = 1 + len(MOMENT_VARS)
+        k = 0
+        for i in range(len(x)):
+            for j in range(i, len(x)):
+                b[offset + k] += x[i] * x[j]
+                k += 1
+
+    cols = ", ".join(MOMENT_COLUMNS)
+    marks = ", ".join("?" * (len(MOMENT_COLUMNS) + 1))
+    updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in MOMENT_COLUMNS)
+    conn.executemany(
+        f"INSERT INTO llm_moments_daily (day, {cols}) VALUES ({marks}) "
+        f"ON CONFLICT(day) DO UPDATE SET {updates}",
+        [(day, *b) for day, b in buckets.items()]
+    )
+
+
+def rebuild_moments(conn, since_day=None):
+    """Recompute llm_moments_daily (from since_day on) from llm_logs (caller owns the transaction)."""
+    params = {"since_day": since_day}
+    conn.execute("DELETE FROM llm_moments_daily WHERE :since_day IS NULL OR day >= :since_day", params)
+    conn.execute(
+        f"INSERT INTO llm_moments_daily (day, {', '.join(MOMENT_COLUMNS)}) {MOMENTS_FROM_LOGS_SQL}", params
+    )
+
+
+# Moments summed over a day range (:start_day / :end_day, NULL = open)
+SUM_MOMENTS_SQL = f"""
+    SELECT {", ".join(f"TOTAL({c}) AS {c}" for c in MOMENT_COLUMNS)}
+    FROM llm_moments_daily
+    WHERE (:start_day IS NULL OR day >= :start_day)
+      AND (:end_day IS NULL OR day <= :end_day)
+"""
+
+
+def sum_moments(conn, start_day=None, end_day=None):
+    """Add up llm_moments_daily over [start_day, end_day] → {column: total}."""
+    row = conn.execute(SUM_MOMENTS_SQL, {"start_day": start_day, "end_day": end_day}).fetchone()
+    return dict(zip(MOMENT_COLUMNS, row))
+
+
+def correlation_from_moments(m):
+    """
+    Pearson correlation matrix {a: {b: r}} from summed moments.
+    r is None where a variable has no variance (or there are < 2 rows).
+    """
+    n = m["n"]
+
+    def cross(a, b):
+        key = f"sum_{a}_x_{b}" if f"sum_{a}_x_{b}" in m else f"sum_{b}_x_{a}"
+        return n * m[key] - m[f"sum_{a}"] * m[f"sum_{b}"]
+
+    corr = {}
+    for a in MOMENT_VARS:
+        corr[a] = {}
+        for b in MOMENT_VARS:
+            if n < 2:
+                corr[a][b] = None
+                continue
+            var_a, var_b = cross(a, a), cross(b, b)
+            if var_a <= 0 or var_b <= 0:
+                corr[a][b] = None
+            else:
+                corr[a][b] = max(-1.0, min(1.0, cross(a, b) / math.sqrt(var_a * var_b)))
+    return corr
+
+
+if __name__ == "__main__":
+    # python -m core.analytics [check|rebuild]
+    command = sys.argv[1] if len(sys.argv) > 1 else "check"
+
+    if command == "rebuild":
+        rebuild_daily_metrics()
+        print("[METRICS] daily metrics, moments, rollups, sketches and prompt templates rebuilt from llm_logs")
+    else:
+        problems = check_daily_metrics()
+        for p in problems:
+            print(f"[METRICS MISMATCH] {p['date']} {p['column']}: stored={p['stored']} expected={p['expected']}")
+        print(f"[METRICS] {len(problems)} mismatch(es)")
+        sys.exit(1 if problems else 0)
@@ -0,0 +1,252 @@
+# core/batch.py
+# Concurrent batch runner: many prompts through one completion function on a
+# thread pool, under a concurrency cap and request/token rate limits, with
+# 429s retried after a jittered backoff. Results stream out as they finish.
+
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core.utils import percentile
+
+BATCH_CONCURRENCY = 8
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0               # s — first retry waits up to this long, doubling each time
+BACKOFF_MAX = 60.0               # s
+EST_OUTPUT_TOKENS = 256          # charged up front per call, corrected once usage is known
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `per_minute` tokens per minute,
+    holding at most `capacity` (default: one minute's worth). acquire()
+    blocks until the tokens are available; a request larger than the bucket
+    waits for a full bucket and leaves it in debt. per_minute=None never blocks.
+    """
+
+    def __init__(self, per_minute=None, capacity=None):
+        self.per_minute = per_minute
+        self.capacity = capacity or per_minute
+        self.rate = per_minute / 60.0 if per_minute else None
+        self.tokens = float(self.capacity or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, n=1):
+        """Take `n` tokens, sleeping as needed. Returns seconds waited."""
+        if self.rate is None:
+            return 0.0
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                self._refill()
+                need = min(n, self.capacity)
+                if self.tokens >= need:
+                    self.tokens -= n
+                    return time.monotonic() - start
+                delay = (need - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def adjust(self, n):
+        """Charge `n` more tokens (negative to refund) after the fact."""
+        if self.rate is None:
+            return
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - n)
+
+
+def estimate_tokens(prompt, output_tokens=EST_OUTPUT_TOKENS):
+    # ~4 characters per token for English text
+    return len(prompt or "") // 4 + 1 + output_tokens
+
+
+def is_rate_limited(exc):
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def retry_after(exc):
+    """Seconds from a Retry-After header on the error's response, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class BatchRunner:
+    """
+    Runs `call(prompt, **options)` for many jobs at once.
+
+    `call` must return a dict with at least "response" and, if known,
+    "tokens_in" / "tokens_out" (main.complete does, and logs every attempt
+    through LLMLogger). At most `concurrency` calls are in flight; each call
+    first takes one request from the requests/min bucket and its estimated
+    tokens from the tokens/min bucket, and the estimate is corrected with
+    the real usage afterwards. Only `concurrency * 2` jobs are queued at a
+    time, so an iterator of millions of prompts is fine.
+    """
+
+    def __init__(
+        self,
+        call,
+        concurrency=BATCH_CONCURRENCY,
+        requests_per_min=None,
+        tokens_per_min=None,
+        max_retries=MAX_RETRIES,
+        est_output_tokens=EST_OUTPUT_TOKENS
+    ):
+        self.call = call
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.est_output_tokens = est_output_tokens
+        self.requests = TokenBucket(requests_per_min)
+        self.tokens = TokenBucket(tokens_per_min)
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.stats = {
+            "submitted": 0, "succeeded": 0, "failed": 0, "retries": 0, "rate_limited": 0,
+            "tokens": 0, "queue_wait_ms": [], "limiter_wait_ms": [], "latency_ms": []
+        }
+        self._started = None
+        self._finished = None
+
+    # ---------------- ONE JOB ----------------
+    def _run_job(self, job, queued_at):
+        picked_at = time.monotonic()
+        prompt = job["prompt"]
+        options = {k: v for k, v in job.items() if k not in ("prompt", "id")}
+        result = {"id": job.get("id"), "prompt": prompt, "attempts": 0}
+
+        limiter_wait = 0.0
+        for attempt in range(self.max_retries + 1):
+            estimate = estimate_tokens(prompt, self.est_output_tokens)
+            limiter_wait += self.requests.acquire(1)
+            limiter_wait += self.tokens.acquire(estimate)
+
+            result["attempts"] = attempt + 1
+            start = time.monotonic()
+            try:
+                out = self.call(prompt, **options)
+            except Exception as e:
+                self.tokens.adjust(-estimate)
+                if is_rate_limited(e) and attempt < self.max_retries:
+                    with self._lock:
+                        self.stats["rate_limited"] += 1
+                        self.stats["retries"] += 1
+                    time.sleep(retry_after(e) or backoff_delay(attempt))
+                    continue
+                if is_rate_limited(e):
+                    with self._lock:
+                        self.stats["rate_limited"] += 1
+                result.update(ok=False, error=str(e), latency_ms=(time.monotonic() - start) * 1000)
+                break
+
+            used = (out.get("tokens_in") or 0) + (out.get("tokens_out") or 0)
+            if used:
+                self.tokens.adjust(used - estimate)
+            result.update(out)
+            result.update(ok=True, latency_ms=(time.monotonic() - start) * 1000)
+            break
+
+        result["queue_wait_ms"] = (picked_at - queued_at) * 1000
+        result["limiter_wait_ms"] = limiter_wait * 1000
+
+        with self._lock:
+            s = self.stats
+            s["succeeded" if result["ok"] else "failed"] += 1
+            s["tokens"] += (result.get("tokens_in") or 0) + (result.get("tokens_out") or 0)
+            s["queue_wait_ms"].append(result["queue_wait_ms"])
+            s["limiter_wait_ms"].append(result["limiter_wait_ms"])
+            if result["ok"]:
+                s["latency_ms"].append(result["latency_ms"])
+        return result
+
+    # ---------------- BATCH ----------------
+    def run(self, jobs):
+        """
+        Yield one result dict per job, in completion order. `jobs` is an
+        iterable of prompts (str) or dicts with "prompt" plus optional "id"
+        and keyword options for `call` (session_id, user_id, temperature, ...).
+        Failed jobs are yielded with ok=False and the error message.
+        """
+        self._reset_stats()
+        self._started = time.monotonic()
+        jobs = iter(jobs)
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="llm-batch") as pool:
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.concurrency * 2:
+                    job = next(jobs, None)
+                    if job is None:
+                        exhausted = True
+                        break
+                    if isinstance(job, str):
+                        job = {"prompt": job}
+                    self.stats["submitted"] += 1
+                    pending.add(pool.submit(self._run_job, job, time.monotonic()))
+
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        self._finished = time.monotonic()
+
+    def report(self):
+        """Throughput and p50/p95/p99 queue wait, limiter wait and call latency for the last run."""
+        with self._lock:
+            s = {k: (sorted(v) if isinstance(v, list) else v) for k, v in self.stats.items()}
+        end = self._finished or time.monotonic()
+        elapsed = end - self._started if self._started else 0.0
+        done = s["succeeded"] + s["failed"]
+
+        report = {
+            "jobs": done,
+            "succeeded": s["succeeded"],
+            "failed": s["failed"],
+            "retries": s["retries"],
+            "rate_limited": s["rate_limited"],
+            "elapsed_s": elapsed,
+            "calls_per_s": done / elapsed if elapsed else 0.0,
+            "tokens_per_s": s["tokens"] / elapsed if elapsed else 0.0,
+        }
+        for name in ("queue_wait_ms", "limiter_wait_ms", "latency_ms"):
+            for q in (50, 95, 99):
+                report[f"{name}_p{q}"] = percentile(s[name], q)
+        return report
+
+
+def format_report(r):
+    def ms(v):
+        return "-" if v is None else f"{v:.0f}"
+
+    return "\n".join([
+        f"[BATCH] {r['jobs']} job(s): {r['succeeded']} ok, {r['failed']} failed, "
+        f"{r['retries']} retr{'y' if r['retries'] == 1 else 'ies'} ({r['rate_limited']} rate-limited)",
+        f"[BATCH] {r['elapsed_s']:.1f} s → {r['calls_per_s']:.2f} calls/s, {r['tokens_per_s']:.0f} tokens/s",
+        *(
+            f"[BATCH] {label:<13} p50 {ms(r[f'{name}_p50'])} ms · p95 {ms(r[f'{name}_p95'])} ms · "
+            f"p99 {ms(r[f'{name}_p99'])} ms"
+            for label, name in (
+                ("queue wait", "queue_wait_ms"), ("limiter wait", "limiter_wait_ms"), ("call latency", "latency_ms")
+            )
+        )
+    ])
@@ -0,0 +1,372 @@
+# core/bench.py
+# Offline benchmarks, all against the fake LLM backend (core/fake_llm.py):
+#   calls      — call_llm from N concurrent callers: requests/s and the overhead
+#                logging, metrics and alerts add to each call (p50/p99)
+#   dashboard  — every dashboard page's queries on synthetic databases of
+#                10k / 1M / 10M rows (core/synth.py; cold and warm query cache)
+#   compare    — metric-by-metric diff of two result files
+# Results are saved as JSON under bench_results/ so versions can be compared.
+#
+# core.db reads LLM_OBS_DB_PATH when it is first imported, so the project
+# modules are imported inside the functions, after the benchmark has pointed
+# it at its own database.
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import threading
+import subprocess
+import contextlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BENCH_DIR = os.path.abspath(os.getenv("LLM_OBS_BENCH_DIR") or os.path.join(ROOT, "bench_results"))
+DASHBOARD_ROWS = (10_000, 1_000_000, 10_000_000)
+REGRESSION_THRESHOLD = 0.10      # compare flags changes worse than ±10%
+
+_local = threading.local()
+
+
+# ============================================================
+# RESULTS
+# ============================================================
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def save_results(kind, params, results, out=None):
+    """Write {kind, commit, schema, machine, params, results} as JSON; returns the path."""
+    from core.db import MIGRATIONS
+
+    doc = {
+        "kind": kind,
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "schema_version": MIGRATIONS[-1][0],
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+    path = out
+    if path is None:
+        stem = os.path.join(BENCH_DIR, f"{kind}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
+        path, n = f"{stem}.json", 1
+        while os.path.exists(path):
+            n += 1
+            path = f"{stem}_{n}.json"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    return path
+
+
+def _fresh_db(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _summary(values):
+    from core.utils import percentile
+    values = sorted(values)
+    return {
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": values[-1] if values else None,
+    }
+
+
+# ============================================================
+# CALLS — end-to-end call_llm throughput and overhead
+# ============================================================
+def _timed(fn, key):
+    """Wrap `fn` so its run time adds up in this thread's `key` counter (seconds)."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            setattr(_local, key, getattr(_local, key, 0.0) + time.perf_counter() - start)
+    return wrapper
+
+
+def bench_calls(calls=2000, concurrency=8, log_mode="sync", ttft_ms=0.0, itl_ms=0.0, tokens=50,
+                error_rate=0.0, warmup=20, db_path=None, seed=0):
+    """
+    Drive main.complete() from `concurrency` threads against a fake client.
+    Per call, overhead = wall time − time inside the client. It is split into:
+    - log: the LLMLogger write; in sync mode this includes the daily/rollup/sketch/template
+      updates, in async mode only the enqueue;
+    - alerts: the alert engine listener;
+    - other: routing, cost and FX.
+    """
+    db_path = db_path or os.path.join(BENCH_DIR, "bench_calls.db")
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    _fresh_db(db_path)
+    os.environ["LLM_OBS_DB_PATH"] = db_path
+    os.environ.setdefault("LLM_OBS_FX_PROVIDERS", "file")
+    os.environ.pop("LLM_OBS_COLLECTOR_URL", None)
+    os.environ.pop("LLM_LOG_ASYNC", None)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        import main
+        from core.logger import LLMLogger
+        from core.fake_llm import FakeLLMClient
+
+        fake = FakeLLMClient(ttft_ms=ttft_ms, itl_ms=itl_ms, tokens_out=tokens, error_rate=error_rate, seed=seed)
+        fake.chat.completions.create = _timed(fake.chat.completions.create, "llm")
+        main.set_client(fake)
+        if log_mode == "async":
+            LLMLogger.enable_async()
+
+        original_log = LLMLogger.log_text_interaction
+        LLMLogger.log_text_interaction = staticmethod(_timed(original_log, "log"))
+        LLMLogger.remove_listener(main.alert_engine.observe)
+        observe = _timed(main.alert_engine.observe, "alerts")
+        LLMLogger.add_listener(observe)
+
+        def one(i):
+            _local.llm = _local.log = _local.alerts = 0.0
+            start = time.perf_counter()
+            ok = True
+            try:
+                main.complete(f"Benchmark prompt {i}: summarize item {i % 97}", f"bench-{i % 50}", f"user-{i % 20}")
+            except Exception:
+                ok = False
+            total = time.perf_counter() - start
+            return ok, total, _local.llm, _local.log, _local.alerts
+
+        try:
+            for i in range(warmup):
+                one(-1 - i)
+            LLMLogger.flush()
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                rows = list(pool.map(one, range(calls)))
+            elapsed = time.perf_counter() - started
+            drain_start = time.perf_counter()
+            LLMLogger.flush()
+            drain = time.perf_counter() - drain_start
+        finally:
+            LLMLogger.log_text_interaction = original_log
+            LLMLogger.remove_listener(observe)
+            LLMLogger.add_listener(main.alert_engine.observe)
+            LLMLogger.shutdown()
+
+    ms = 1000
+    return {
+        "calls": calls,
+        "errors": sum(1 for ok, *_ in rows if not ok),
+        "elapsed_s": elapsed,
+        "drain_s": drain,
+        "requests_per_s": calls / (elapsed + drain),
+        "latency_ms": _summary([total * ms for _, total, *_ in rows]),
+        "llm_ms": _summary([llm * ms for _, _, llm, _, _ in rows]),
+        "overhead_ms": _summary([(total - llm) * ms for _, total, llm, _, _ in rows]),
+        "log_ms": _summary([(log - alerts) * ms for _, _, _, log, alerts in rows]),
+        "alerts_ms": _summary([alerts * ms for *_, alerts in rows]),
+        "other_ms": _summary([(total - llm - log) * ms for _, total, llm, log, _ in rows]),
+    }
+
+
+# ============================================================
+# DASHBOARD — page query timings at several database sizes
+# ============================================================
+def dashboard_pages():
+    pages = os.path.join(ROOT, "dashboard", "pages")
+    return ["dashboard/app.py"] + sorted(
+        f"dashboard/pages/{name}" for name in os.listdir(pages) if name.endswith(".py")
+    )
+
+
+def time_pages(timeout=600):
+    """
+    Run every page through Streamlit's AppTest on LLM_OBS_DB_PATH: once on an
+    empty query cache (cold) and once more on the same session (warm).
+    """
+    from streamlit.testing.v1 import AppTest
+    from dashboard.data import query_cache
+    from core.db import connection_stats
+
+    def query_totals():
+        stats = connection_stats().values()
+        return sum(s["queries"] for s in stats), sum(s["query_ms"] for s in stats)
+
+    results = {}
+    for page in dashboard_pages():
+        query_cache.clear()
+        at = AppTest.from_file(os.path.join(ROOT, page), default_timeout=timeout)
+        timings = {}
+        for run in ("cold", "warm"):
+            queries, query_ms = query_totals()
+            start = time.perf_counter()
+            at.run()
+            wall = (time.perf_counter() - start) * 1000
+            queries_after, query_ms_after = query_totals()
+            timings[run] = {
+                "wall_ms": wall,
+                "queries": queries_after - queries,
+                "query_ms": query_ms_after - query_ms,
+                "errors": [str(e.value)[:200] for e in at.exception],
+            }
+        results[os.path.splitext(os.path.basename(page))[0]] = timings
+    return results
+
+
+def bench_dashboard(rows=DASHBOARD_ROWS, days=30, rebuild=False, seed=0):
+    """Generate (or reuse) one database per size and time the pages on each in a fresh process."""
+    results = {}
+    for n in rows:
+        db_path = os.path.join(BENCH_DIR, f"bench_{n}.db")
+        gen_s = None
+        if rebuild or not os.path.exists(db_path):
+            print(f"[BENCH] generating {n:,} rows → {db_path}", file=sys.stderr)
+            os.makedirs(BENCH_DIR, exist_ok=True)
+            _fresh_db(db_path)
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-m", "core.synth", "--rows", str(n), "--days", str(days),
+                 "--seed", str(seed), "--db", db_path],
+                cwd=ROOT, check=True, stdout=subprocess.DEVNULL
+            )
+            gen_s = time.perf_counter() - start
+
+        out = db_path + ".pages.json"
+        subprocess.run(
+            [sys.executable, "-m", "core.bench", "pages", "--out", out],
+            cwd=ROOT, check=True, env={**os.environ, "LLM_OBS_DB_PATH": db_path}
+        )
+        with open(out, encoding="utf-8") as f:
+            results[str(n)] = {"generate_s": gen_s, "pages": json.load(f)}
+        os.remove(out)
+    return results
+
+
+# ============================================================
+# COMPARE
+# ============================================================
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            out.update(_flatten(v, f"{prefix}.{k}" if prefix else str(k)))
+        return out
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: value}
+    return {}
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_results(old_path, new_path, threshold=REGRESSION_THRESHOLD):
+    """[(metric, old, new, change)] for metrics that moved more than `threshold`."""
+    old = _flatten(load_results(old_path)["results"])
+    new = _flatten(load_results(new_path)["results"])
+
+    changes = []
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        if a and abs(b - a) / abs(a) > threshold:
+            changes.append((key, a, b, (b - a) / abs(a)))
+    return changes
+
+
+# ============================================================
+# CLI
+# ============================================================
+def _print_calls(r):
+    def line(name, s):
+        return f"[BENCH] {name:<9} p50 {s['p50']:.2f} ms · p99 {s['p99']:.2f} ms · mean {s['mean']:.2f} ms"
+
+    print(f"[BENCH] {r['calls']} calls ({r['errors']} errors) in {r['elapsed_s']:.2f} s "
+          f"+ {r['drain_s']:.2f} s drain → {r['requests_per_s']:.0f} req/s")
+    for name in ("latency", "llm", "overhead", "log", "alerts", "other"):
+        print(line(name, r[f"{name}_ms"]))
+
+
+def _print_dashboard(results):
+    for n, r in results.items():
+        print(f"[BENCH] {int(n):,} rows" + (f" (generated in {r['generate_s']:.0f} s)" if r["generate_s"] else ""))
+        for page, t in r["pages"].items():
+            cold, warm = t["cold"], t["warm"]
+            errors = f" · {len(cold['errors'])} error(s)" if cold["errors"] else ""
+            print(f"[BENCH]   {page:<10} cold {cold['wall_ms']:>8.0f} ms ({cold['queries']} queries, "
+                  f"{cold['query_ms']:.0f} ms in SQL) · warm {warm['wall_ms']:>6.0f} ms{errors}")
+
+
+if __name__ == "__main__":
+    # python -m core.bench calls --calls 2000 --concurrency 8
+    # python -m core.bench dashboard --rows 10000,1000000,10000000
+    # python -m core.bench compare bench_results/calls_A.json bench_results/calls_B.json
+    parser = argparse.ArgumentParser(prog="python -m core.bench", description="Offline benchmarks (fake LLM backend)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    calls = sub.add_parser("calls", help="call_llm throughput and per-call overhead")
+    calls.add_argument("--calls", type=int, default=2000)
+    calls.add_argument("--concurrency", type=int, default=8)
+    calls.add_argument("--log-mode", choices=["sync", "async"], default="sync")
+    calls.add_argument("--ttft-ms", type=float, default=0.0, help="fake time to first token")
+    calls.add_argument("--itl-ms", type=float, default=0.0, help="fake gap between tokens")
+    calls.add_argument("--tokens", type=int, default=50)
+    calls.add_argument("--error-rate", type=float, default=0.0)
+    calls.add_argument("--out")
+
+    dash = sub.add_parser("dashboard", help="dashboard page query timings per database size")
+    dash.add_argument("--rows", default=",".join(str(n) for n in DASHBOARD_ROWS))
+    dash.add_argument("--days", type=int, default=30)
+    dash.add_argument("--rebuild", action="store_true", help="regenerate databases that already exist")
+    dash.add_argument("--out")
+
+    pages = sub.add_parser("pages", help="time every page on LLM_OBS_DB_PATH (used by dashboard)")
+    pages.add_argument("--out", required=True)
+
+    cmp_ = sub.add_parser("compare", help="metrics that changed between two result files")
+    cmp_.add_argument("old")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "calls":
+        params = {k: v for k, v in vars(args).items() if k not in ("command", "out")}
+        r = bench_calls(args.calls, args.concurrency, args.log_mode, args.ttft_ms, args.itl_ms,
+                        args.tokens, args.error_rate)
+        _print_calls(r)
+        print(f"[BENCH] saved → {save_results('calls', params, r, args.out)}")
+
+    elif args.command == "dashboard":
+        rows = [int(n) for n in args.rows.split(",")]
+        results = bench_dashboard(rows, args.days, args.rebuild)
+        _print_dashboard(results)
+        params = {"rows": rows, "days": args.days}
+        print(f"[BENCH] saved → {save_results('dashboard', params, results, args.out)}")
+
+    elif args.command == "pages":
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results = time_pages()
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f)
+
+    else:
+        old_params, new_params = load_results(args.old)["params"], load_results(args.new)["params"]
+        if old_params != new_params:
+            print(f"[BENCH] note: runs used different params → {old_params} vs {new_params}")
+        changes = compare_results(args.old, args.new, args.threshold)
+        for key, a, b, change in changes:
+            print(f"[BENCH] {key:<45} {a:>12.3f} → {b:>12.3f}  ({change:+.0%})")
+        print(f"[BENCH] {len(changes)} metric(s) moved more than {args.threshold:.0%}")
@@ -0,0 +1,116 @@
+# core/cache.py
+
+import time
+import threading
+
+_EMPTY = object()
+
+
+class RefreshingCache:
+    """
+    In-memory value with a TTL and refresh-ahead.
+
+    - The first get() loads synchronously (single-flight: concurrent callers wait
+      for one load instead of each calling the loader).
+    - Once the value is older than `ttl * (1 - refresh_ahead)`, get() returns the
+      cached value immediately and reloads it on a background thread.
+    - If a background reload fails the old value is kept and retried after `retry_after`.
+
+    `ttl` is in seconds, or a callable returning seconds (evaluated at each load).
+    """
+
+    def __init__(self, loader, ttl, refresh_ahead=0.2, retry_after=10, name="cache"):
+        self.loader = loader
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.retry_after = retry_after
+        self.name = name
+
+        self._value = _EMPTY
+        self._loaded_at = 0.0
+        self._refresh_at = 0.0
+        self._cond = threading.Condition()
+        self._refreshing = False
+        self.stats = {"hits": 0, "loads": 0, "background_loads": 0, "errors": 0}
+
+    def get(self):
+        value = self._value
+        if value is _EMPTY:
+            return self._load_blocking()
+
+        self.stats["hits"] += 1
+        if time.monotonic() >= self._refresh_at:
+            self.refresh_async()
+        return value
+
+    def peek(self, default=None):
+        """Like get(), but never blocks: returns `default` and loads in the background if empty."""
+        value = self._value
+        if value is _EMPTY or time.monotonic() >= self._refresh_at:
+            self.refresh_async()
+        return default if value is _EMPTY else value
+
+    def age(self):
+        return None if self._value is _EMPTY else time.monotonic() - self._loaded_at
+
+    def invalidate(self):
+        self._refresh_at = 0.0
+
+    def clear(self):
+        """Drop the value: the next get() loads it again synchronously."""
+        with self._cond:
+            self._value = _EMPTY
+            self._refresh_at = 0.0
+
+    def prefetch(self):
+        """Warm the cache without blocking the caller."""
+        self.refresh_async()
+
+    def refresh_async(self):
+        with self._cond:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_load, name=f"{self.name}-refresh", daemon=True).start()
+
+    # ---------------- INTERNAL ----------------
+    def _store(self, value):
+        now = time.monotonic()
+        ttl = self.ttl() if callable(self.ttl) else self.ttl
+        self._value = value
+        self._loaded_at = now
+        self._refresh_at = now + ttl * (1 - self.refresh_ahead)
+
+    def _load_blocking(self):
+        # Wait for an in-flight load instead of starting a second one
+        with self._cond:
+            while self._value is _EMPTY and self._refreshing:
+                self._cond.wait()
+            if self._value is not _EMPTY:
+                return self._value
+            self._refreshing = True
+
+        try:
+            value = self.loader()
+            self._store(value)
+            self.stats["loads"] += 1
+            return value
+        finally:
+            self._done_loading()
+
+    def _background_load(self):
+        try:
+            value = self.loader()
+            self._store(value)
+            self.stats["background_loads"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            self._refresh_at = time.monotonic() + self.retry_after
+            print(f"[CACHE] {self.name} refresh failed → {e}")
+        finally:
+            self._done_loading()
+
+    def _done_loading(self):
+        with self._cond:
+            self._refreshing = False
+            self._cond.notify_all()
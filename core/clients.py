@@ -0,0 +1,36 @@
+# core/clients.py
+# LLM client backends. main.py only needs something shaped like groq.Groq:
+#   client.chat.completions.create(model=, messages=, temperature=, stream=)
+#     → response with .choices[0].message.content and .usage, or (stream=True)
+#       an iterator of chunks (see core/streaming.py)
+#   client.models.list().data → objects with .id
+#   client.with_options(max_retries=0) → the same kind of client
+# Backends are created lazily, so nothing is built (or imported) until a call needs it.
+
+import os
+
+LLM_BACKEND = os.getenv("LLM_OBS_LLM_BACKEND", "groq")
+
+
+def _groq_client():
+    from groq import Groq
+    return Groq(api_key=os.getenv("GROQ_API_KEY"))
+
+
+def _fake_client():
+    from core.fake_llm import fake_client_from_env
+    return fake_client_from_env()
+
+
+BACKENDS = {
+    "groq": _groq_client,
+    "fake": _fake_client,
+}
+
+
+def make_client(backend=None):
+    """New client for `backend` ("groq" / "fake"; default LLM_OBS_LLM_BACKEND)."""
+    backend = backend or LLM_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[backend]()
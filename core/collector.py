@@ -0,0 +1,522 @@
+# core/collector.py
+# Local ingestion collector: one daemon process owns llm_logs.db as its only
+# writer and group-commits the log events that app processes POST to it over
+# localhost HTTP. Clients (LLMLogger.enable_collector) batch events in the
+# background and spool them to disk while the collector is unreachable.
+# Their other writes (alert incidents, FX rates, overhead sketches) go through POST /write.
+# Both endpoints answer only once the data is committed.
+
+import os
+import sys
+import glob
+import json
+import time
+import signal
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from core.db import DB_PATH, connect
+from core.utils import ms_to_iso, ms_to_day
+from core.logger import LogWriter
+from core.alerts import upsert_incidents
+from core.currency import store_rates
+from core.overhead import merge_overhead_rows
+
+COLLECTOR_HOST = os.getenv("LLM_OBS_COLLECTOR_HOST", "127.0.0.1")
+COLLECTOR_PORT = int(os.getenv("LLM_OBS_COLLECTOR_PORT", "8765"))
+COLLECTOR_URL = os.getenv("LLM_OBS_COLLECTOR_URL") or f"http://{COLLECTOR_HOST}:{COLLECTOR_PORT}"
+SPOOL_DIR = os.path.abspath(
+    os.getenv("LLM_OBS_SPOOL_DIR") or os.path.join(os.path.dirname(DB_PATH), "llm_spool")
+)
+
+GROUP_COMMIT_SIZE = 1000         # events per transaction on the collector
+GROUP_COMMIT_INTERVAL = 0.05     # s — how long the collector waits to fill a transaction
+CLIENT_BATCH_SIZE = 200          # events per POST
+CLIENT_FLUSH_INTERVAL = 0.25     # s
+SEND_TIMEOUT = 5.0               # s
+RETRY_INTERVAL = 5.0             # s — while the collector is down, batches go straight to the spool
+SPOOL_SWEEP_INTERVAL = 60.0      # s — collector adopts spool files left by dead clients
+RATE_WINDOW = 60                 # s — window of the reported ingest rate
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Non-log writes clients send through POST /write: kind → fn(conn, rows)
+WRITE_HANDLERS = {
+    "alerts": upsert_incidents,
+    "fx_rates": store_rates,
+    "overhead": merge_overhead_rows,
+}
+
+
+# ============================================================
+# SPOOL FILES — one JSONL file per client process
+# ============================================================
+def spool_path(spool_dir=SPOOL_DIR, pid=None):
+    return os.path.join(spool_dir, f"spool-{pid or os.getpid()}.jsonl")
+
+
+def append_spool(path, events):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events))
+
+
+def read_spool(path, chunk):
+    """Events of a spool file in lists of `chunk`; a torn last line is skipped."""
+    batch = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                batch.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(batch) >= chunk:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def orphaned_spools(spool_dir=SPOOL_DIR):
+    """Spool files whose client process has exited (nobody else will replay them)."""
+    orphans = []
+    for path in glob.glob(os.path.join(spool_dir, "spool-*.jsonl*")):
+        try:
+            pid = int(os.path.basename(path).split("-", 1)[1].split(".", 1)[0])
+        except ValueError:
+            continue
+        if not _pid_alive(pid):
+            orphans.append(path)
+    return sorted(orphans)
+
+
+# ============================================================
+# CLIENT — LLMLogger's writer in collector mode
+# ============================================================
+class CollectorClient(LogWriter):
+    """
+    LogWriter that ships each batch to the collector instead of writing
+    SQLite. Events are queued and batched exactly like the async writer
+    (same backpressure policies and flush()). A batch the collector does not
+    accept is appended to this process's spool file. While the collector is
+    down, new batches go straight to the spool for RETRY_INTERVAL seconds.
+    The spool is replayed, oldest first, once a send succeeds again.
+    """
+
+    def __init__(
+        self,
+        url=COLLECTOR_URL,
+        spool_dir=SPOOL_DIR,
+        timeout=SEND_TIMEOUT,
+        retry_interval=RETRY_INTERVAL,
+        batch_size=CLIENT_BATCH_SIZE,
+        flush_interval=CLIENT_FLUSH_INTERVAL,
+        **writer_options
+    ):
+        super().__init__(batch_size=batch_size, flush_interval=flush_interval, **writer_options)
+        self.url = url.rstrip("/")
+        self.spool_path = spool_path(spool_dir)
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+        self.stats.update({"sent": 0, "spooled": 0, "replayed": 0, "send_failures": 0})
+
+    def _connect(self):
+        return None
+
+    def _disconnect(self, conn):
+        pass
+
+    def _post(self, events, replay=False):
+        body = json.dumps({"events": events, "replay": replay}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/ingest", data=body, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def write(self, kind, rows):
+        """
+        Have the collector run WRITE_HANDLERS[kind](conn, rows) and commit it.
+        Not spooled: False if the collector is unreachable or the write failed,
+        and the caller keeps (or drops) the rows itself.
+        """
+        body = json.dumps({"kind": kind, "rows": rows}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.url}/write", data=body, headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except (OSError, urllib.error.URLError) as e:
+            print(f"[COLLECTOR] {kind} write not delivered → {e}")
+            return False
+        return True
+
+    def _send(self, events, replay=False):
+        """True if the collector accepted the events; marks it down otherwise."""
+        try:
+            self._post(events, replay)
+        except (OSError, urllib.error.URLError) as e:
+            with self._lock:
+                self.stats["send_failures"] += 1
+            if self._down_until == 0.0:
+                print(f"[COLLECTOR] unreachable ({e}) → spooling to {self.spool_path}")
+            self._down_until = time.monotonic() + self.retry_interval
+            return False
+        self._down_until = 0.0
+        return True
+
+    def _spool(self, events):
+        append_spool(self.spool_path, events)
+        with self._lock:
+            self.stats["spooled"] += len(events)
+
+    def _replay(self):
+        """Resend this process's spool; whatever is not accepted goes back into it."""
+        replaying = self.spool_path + ".replay"
+        if not os.path.exists(replaying):
+            if not os.path.exists(self.spool_path):
+                return
+            os.replace(self.spool_path, replaying)
+
+        batches = read_spool(replaying, self.batch_size)
+        for batch in batches:
+            if not self._send(batch, replay=True):
+                self._spool(batch)
+                for rest in batches:
+                    self._spool(rest)
+                break
+            with self._lock:
+                self.stats["replayed"] += len(batch)
+        os.remove(replaying)
+
+    def _write_batch(self, conn, batch):
+        start = time.perf_counter()
+        if time.monotonic() < self._down_until or not self._send(batch):
+            self._spool(batch)
+            return False
+
+        with self._lock:
+            self.stats["sent"] += len(batch)
+        self._record_batch(batch, (time.perf_counter() - start) * 1000)
+        if os.path.exists(self.spool_path) or os.path.exists(self.spool_path + ".replay"):
+            self._replay()
+        return True
+
+
+# ============================================================
+# COLLECTOR DAEMON
+# ============================================================
+class RateMeter:
+    """Events per second over the last `window` seconds (per-second buckets)."""
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += n
+            else:
+                self._buckets.append([second, n])
+            self._trim(second)
+
+    def _trim(self, second):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+    def rate(self):
+        with self._lock:
+            self._trim(int(time.monotonic()))
+            return sum(n for _, n in self._buckets) / self.window
+
+
+class GroupCommitWriter(LogWriter):
+    """
+    The collector's LogWriter. One transaction holds events from many
+    clients, so if it fails (a duplicate id, a malformed event) the batch
+    is retried one event at a time and only the bad events are lost.
+    """
+
+    def _write_batch(self, conn, batch):
+        if super()._write_batch(conn, batch):
+            return True
+        if len(batch) == 1:
+            return False
+        ok = 0
+        for e in batch:
+            ok += super()._write_batch(conn, [e])
+        print(f"[COLLECTOR] retried batch one by one → {ok}/{len(batch)} committed")
+        return ok == len(batch)
+
+
+def normalize_event(e):
+    """The event ready for LLMLogger.write_events, or None if it is unusable."""
+    if not isinstance(e, dict) or not e.get("id") or not isinstance(e.get("ts_ms"), int):
+        return None
+    e.setdefault("timestamp", ms_to_iso(e["ts_ms"]))
+    e.setdefault("day", ms_to_day(e["ts_ms"]))
+    return e
+
+
+class Collector:
+    """
+    Sole writer of the database. Ingested events are queued on one LogWriter,
+    which group-commits up to GROUP_COMMIT_SIZE of them per transaction
+    whichever client they came from; ingest() returns once they are
+    committed, so a collector crash cannot lose events a client saw accepted.
+    Replayed (spooled) batches may contain events that were committed before
+    their client gave up waiting, so their ids are checked against llm_logs first.
+    """
+
+    def __init__(
+        self,
+        db_path=None,
+        spool_dir=SPOOL_DIR,
+        batch_size=GROUP_COMMIT_SIZE,
+        flush_interval=GROUP_COMMIT_INTERVAL,
+        max_queue=100_000
+    ):
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.writer = GroupCommitWriter(
+            db_path=db_path, batch_size=batch_size, flush_interval=flush_interval,
+            max_queue=max_queue, policy="block"
+        )
+        self.rate = RateMeter()
+        self.started = time.time()
+        self.stats = {
+            "requests": 0, "received": 0, "duplicates": 0, "rejected": 0, "spool_events": 0, "writes": 0
+        }
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        # The writer thread creates / migrates the schema on its connection
+        self.writer.start()
+        self.sweep_spools()
+        threading.Thread(target=self._sweeper, name="llm-collector-sweeper", daemon=True).start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self.writer.flush()
+        self.writer.close()
+
+    # ---------------- INGEST ----------------
+    def _committed_ids(self, ids):
+        conn = connect(db_path=self.db_path, readonly=True)
+        try:
+            found = set()
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                found.update(r[0] for r in conn.execute(
+                    f"SELECT id FROM llm_logs WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                ))
+            return found
+        finally:
+            conn.close()
+
+    def ingest(self, events, replay=False):
+        """Queue valid events for the writer. Returns the number accepted."""
+        valid = [e for e in map(normalize_event, events) if e is not None]
+        rejected = len(events) - len(valid)
+
+        duplicates = 0
+        if replay and valid:
+            # Serialized so two replays of the same events cannot both pass the check
+            with self._replay_lock:
+                self.writer.flush()
+                committed = self._committed_ids([e["id"] for e in valid])
+                duplicates = sum(1 for e in valid if e["id"] in committed)
+                valid = [e for e in valid if e["id"] not in committed]
+                for e in valid:
+                    self.writer.submit(e)
+                self.writer.flush()
+        else:
+            for e in valid:
+                self.writer.submit(e)
+            # Acknowledge only once committed, sharing the transaction with other clients
+            self.writer.barrier()
+
+        self.rate.add(len(valid))
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["received"] += len(valid)
+            self.stats["duplicates"] += duplicates
+            self.stats["rejected"] += rejected
+        return len(valid)
+
+    def write(self, kind, rows):
+        """Run WRITE_HANDLERS[kind] on the writer thread, after the events queued so far."""
+        handler = WRITE_HANDLERS[kind]
+        self.writer.barrier(lambda conn: handler(conn, rows))
+        with self._lock:
+            self.stats["writes"] += 1
+        return len(rows)
+
+    # ---------------- ORPHANED SPOOLS ----------------
+    def sweep_spools(self):
+        """Ingest spool files left behind by client processes that have exited."""
+        for path in orphaned_spools(self.spool_dir):
+            n = 0
+            for batch in read_spool(path, GROUP_COMMIT_SIZE):
+                n += self.ingest(batch, replay=True)
+            os.remove(path)
+            with self._lock:
+                self.stats["spool_events"] += n
+            print(f"[COLLECTOR] replayed {n} event(s) from {os.path.basename(path)}")
+
+    def _sweeper(self):
+        while not self._stop.wait(SPOOL_SWEEP_INTERVAL):
+            try:
+                self.sweep_spools()
+            except Exception as e:
+                print(f"[COLLECTOR] spool sweep failed → {e}")
+
+    # ---------------- STATS ----------------
+    def get_stats(self):
+        writer = self.writer.get_stats()
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            "uptime_s": time.time() - self.started,
+            "ingest_rate_per_s": self.rate.rate(),
+            "written": writer["written"],
+            "batches": writer["batches"],
+            "failed_batches": writer["failed_batches"],
+            "avg_batch_size": writer["avg_batch_size"],
+            "avg_batch_ms": writer["avg_batch_ms"],
+            "queue_depth": writer["queue_depth"],
+            "lag_ms": writer["last_lag_ms"],
+            "max_lag_ms": writer["max_lag_ms"],
+        })
+        return stats
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    """
+    POST /ingest {"events": [...], "replay": bool} · POST /write {"kind": ..., "rows": [...]}
+    · GET /stats · GET /health
+    """
+
+    collector = None
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, self.collector.get_stats())
+        elif self.path == "/health":
+            self._reply(200, {"ok": True})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/ingest", "/write"):
+            self._reply(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            self._reply(413, {"error": "batch too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length))
+            items = payload["events" if self.path == "/ingest" else "rows"]
+            if not isinstance(items, list):
+                raise TypeError("events / rows must be a list")
+            if self.path == "/write" and payload.get("kind") not in WRITE_HANDLERS:
+                raise ValueError(f"unknown write kind: {payload.get('kind')}")
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+
+        # Both reply once the data is committed
+        if self.path == "/ingest":
+            accepted = self.collector.ingest(items, replay=bool(payload.get("replay")))
+            self._reply(200, {"accepted": accepted})
+            return
+        try:
+            written = self.collector.write(payload["kind"], items)
+        except Exception as e:
+            self._reply(500, {"error": str(e)})
+            return
+        self._reply(200, {"written": written})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=COLLECTOR_HOST, port=COLLECTOR_PORT, db_path=None, spool_dir=SPOOL_DIR):
+    collector = Collector(db_path=db_path, spool_dir=spool_dir).start()
+    handler = type("BoundCollectorHandler", (CollectorHandler,), {"collector": collector})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"[COLLECTOR] writing {db_path or DB_PATH} · listening on http://{host}:{port}")
+
+    # SIGTERM stops the server like Ctrl-C: queued events are committed first
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        collector.close()
+        print("[COLLECTOR] stopped")
+
+
+def fetch_stats(url=COLLECTOR_URL, timeout=SEND_TIMEOUT):
+    with urllib.request.urlopen(f"{url.rstrip('/')}/stats", timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    # python -m core.collector serve --port 8765
+    # python -m core.collector stats
+    parser = argparse.ArgumentParser(prog="python -m core.collector", description="Local log ingestion collector")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("serve", help="run the collector (the database's only writer)")
+    run.add_argument("--host", default=COLLECTOR_HOST)
+    run.add_argument("--port", type=int, default=COLLECTOR_PORT)
+    run.add_argument("--spool-dir", default=SPOOL_DIR)
+    stats = sub.add_parser("stats", help="ingest rate, batch size and lag of a running collector")
+    stats.add_argument("--url", default=COLLECTOR_URL)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.host, args.port, spool_dir=args.spool_dir)
+    else:
+        try:
+            s = fetch_stats(args.url)
+        except OSError as e:
+            sys.exit(f"[COLLECTOR] not reachable at {args.url} → {e}")
+        print(f"[COLLECTOR] up {s['uptime_s']:.0f} s · {s['ingest_rate_per_s']:.1f} events/s (1 min)")
+        print(f"[COLLECTOR] {s['received']} received, {s['written']} written in {s['batches']} batch(es) "
+              f"· avg {s['avg_batch_size']:.0f} events / {s['avg_batch_ms']:.1f} ms")
+        print(f"[COLLECTOR] queue {s['queue_depth']} · lag {s['lag_ms']:.0f} ms (max {s['max_lag_ms']:.0f} ms) "
+              f"· {s['duplicates']} duplicate(s), {s['rejected']} rejected, {s['spool_events']} from spools "
+              f"· {s['writes']} other write(s)")
@@ -1,37 +1,201 @@
-# core/currency.py 
+# core/currency.py
 
+import os
+import json
+import time
 import sqlite3
+import threading
 import requests
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from core.cache import RefreshingCache
+from core.db import init_db, get_connection
+from core.logger import LLMLogger
+
+# Display currency for llm_logs.cost_display (any code the providers return, e.g. EUR)
+DISPLAY_CURRENCY = os.getenv("LLM_OBS_CURRENCY", "INR").upper()
+
+# Comma-separated provider order, e.g. "http,file" or "file" for offline deployments
+FX_PROVIDERS = os.getenv("LLM_OBS_FX_PROVIDERS", "http,file")
+FX_RATES_FILE = os.getenv("LLM_OBS_FX_FILE")
+FX_HTTP_URL = "https://api.exchangerate-api.com/v4/latest/USD"
+FX_HTTP_TIMEOUT = 3              # s
+FX_RETRY_AFTER = 300             # s — retry providers this soon after falling back
+
+# Last-resort USD → X rates when every provider fails
+FALLBACK_RATES = {"USD": 1.0, "INR": 83.0, "EUR": 0.92, "GBP": 0.79, "JPY": 150.0}
+
+
+# ============================================================
+# PROVIDERS — fetch() returns {currency: units per 1 USD}
+# ============================================================
+class HttpRateProvider:
+    name = "http"
+
+    def __init__(self, url=FX_HTTP_URL, timeout=FX_HTTP_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self):
+        r = requests.get(self.url, timeout=self.timeout)
+        r.raise_for_status()
+        return {k.upper(): float(v) for k, v in r.json()["rates"].items()}
+
+
+class StaticRateProvider:
+    """Fixed rates, or a JSON file ({"INR": 83.1, ...} or {"rates": {...}}) for offline use."""
+    name = "file"
+
+    def __init__(self, rates=None, path=None):
+        self.rates = rates
+        self.path = path
+
+    def fetch(self):
+        rates = self.rates
+        if self.path:
+            with open(self.path) as f:
+                data = json.load(f)
+            rates = data.get("rates", data)
+        if not rates:
+            # FALLBACK_RATES are only served unpersisted by RateService, never as a provider result
+            raise ValueError("no rates or rates file configured")
+        rates = dict(rates)
+        rates.setdefault("USD", 1.0)
+        return {k.upper(): float(v) for k, v in rates.items()}
+
+
+def default_providers():
+    """Providers named in LLM_OBS_FX_PROVIDERS; "file" is skipped unless LLM_OBS_FX_FILE is set."""
+    providers = []
+    for name in FX_PROVIDERS.split(","):
+        name = name.strip()
+        if name == "http":
+            providers.append(HttpRateProvider())
+        elif name in ("file", "static") and FX_RATES_FILE:
+            providers.append(StaticRateProvider(path=FX_RATES_FILE))
+    return providers
+
+
+# ============================================================
+# STORAGE — fx_rates
+# ============================================================
+def store_rates(conn, rows):
+    """Save [(date, currency, rate, source), ...] (caller owns the transaction; also run by the collector)."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO fx_rates (date, currency, rate, source) VALUES (?, ?, ?, ?)", rows
+    )
+
+
+# ============================================================
+# RATE SERVICE
+# ============================================================
+def _seconds_until_midnight():
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1.0, (midnight - now).total_seconds())
+
+
+class RateService:
+    """
+    Today's USD → X rates, held in memory until the day rolls over.
+    Loads come from fx_rates, then the providers in order; concurrent callers
+    share one load, and a background thread refreshes just after midnight.
+    """
+
+    def __init__(self, providers=None):
+        self.providers = providers if providers is not None else default_providers()
+        self.cache = RefreshingCache(self._load_today, ttl=self._ttl, refresh_ahead=0, name="fx-rates")
+        self._prefetcher = None
+        self._degraded = False
+
+    def get_rate(self, currency="INR"):
+        currency = currency.upper()
+        rates = self.cache.get()
+        rate = rates.get(currency)
+        if rate is None:
+            rate = FALLBACK_RATES.get(currency)
+        if rate is None:
+            raise KeyError(f"No USD rate available for {currency}")
+        return rate
+
+    def convert(self, amount_usd, currency):
+        return amount_usd * self.get_rate(currency)
+
+    def start_prefetch(self, lead_seconds=5):
+        """Warm the cache now, then refresh a few seconds after each local midnight."""
+        if self._prefetcher is not None:
+            return
+        self.cache.prefetch()
+
+        def loop():
+            while True:
+                time.sleep(_seconds_until_midnight() + lead_seconds)
+                self.cache.refresh_async()
+
+        self._prefetcher = threading.Thread(target=loop, name="fx-prefetch", daemon=True)
+        self._prefetcher.start()
+
+    def _ttl(self):
+        return FX_RETRY_AFTER if self._degraded else _seconds_until_midnight()
+
+    def _load_today(self):
+        # Collector mode: read-only here, and the fetched rates are saved by the collector
+        collector = LLMLogger.collector()
+        if collector is None:
+            init_db()
+        today = datetime.now().strftime("%Y-%m-%d")
+
+        try:
+            conn = get_connection(readonly=collector is not None)
+            rows = conn.execute("SELECT currency, rate FROM fx_rates WHERE date = ?", (today,)).fetchall()
+        except sqlite3.Error:
+            # The collector has not created the database yet
+            rows = []
+        if rows:
+            self._degraded = False
+            return dict(rows)
+
+        rates, source = None, "fallback"
+        for provider in self.providers:
+            try:
+                rates = provider.fetch()
+                source = provider.name
+                break
+            except Exception as e:
+                print(f"[FX] provider {provider.name} failed → {e}")
+
+        self._degraded = rates is None
+        if rates is None:
+            # Not persisted; providers are retried after FX_RETRY_AFTER
+            return dict(FALLBACK_RATES)
+
+        rows = [(today, cur, rate, source) for cur, rate in rates.items()]
+        if collector is not None:
+            # Best effort: if it is unreachable the rates are only cached, and fetched again next run
+            collector.write("fx_rates", rows)
+        else:
+            conn = get_connection()
+            with conn:
+                store_rates(conn, rows)
+        return rates
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_rate_service():
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = RateService()
+    return _service
+
+
+def get_rate(currency=DISPLAY_CURRENCY):
+    return get_rate_service().get_rate(currency)
 
-DB_PATH = "llm_logs.db"
 
 def get_inr_rate():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS currency_rates (
-            date TEXT PRIMARY KEY,
-            usd_to_inr REAL
-        )
-    """)
-    conn.commit()
-
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    # Check if rate already saved today
-    row = conn.execute("SELECT usd_to_inr FROM currency_rates WHERE date = ?", (today,)).fetchone()
-    if row:
-        conn.close()
-        return row[0]
-
-    # Fetch from API (if not saved yet)
-    try:
-        r = requests.get("https://api.exchangerate-api.com/v4/latest/USD").json()
-        rate = float(r["rates"]["INR"])
-    except Exception:
-        rate = 83.0  # fallback safe default INR rate
-
-    conn.execute("INSERT OR REPLACE INTO currency_rates (date, usd_to_inr) VALUES (?, ?)", (today, rate))
-    conn.commit()
-    conn.close()
-    return rate
+    return get_rate_service().get_rate("INR")
@@ -2,21 +2,200 @@
 
 import sqlite3
 import os
+import sys
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 
-# Always create DB in project root
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm_logs.db")
-DB_PATH = os.path.abspath(DB_PATH)
+from core.payloads import decode_payload
 
+# Single DB location for core, main.py and the dashboard.
+# Defaults to the project root; override with LLM_OBS_DB_PATH.
+DEFAULT_DB_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "llm_logs.db"))
+DB_PATH = os.path.abspath(os.getenv("LLM_OBS_DB_PATH") or DEFAULT_DB_PATH)
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL;")
+# Applied to every connection (journal_mode only on writers; it is persistent)
+PRAGMAS = {
+    "synchronous": "NORMAL",        # safe with WAL, avoids an fsync per commit
+    "cache_size": -64000,           # ~64 MB page cache
+    "mmap_size": 268435456,         # 256 MB memory-mapped reads
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000            # ms to wait on a locked DB before failing
+}
+
+READ_POOL_SIZE = 4               # idle read-only connections kept for short-lived threads
+
+_local = threading.local()
+_read_pools = {}
+_stats = {}
+_stats_lock = threading.Lock()
+_initialized = set()
+
+
+# ============================================================
+# CONNECTIONS
+# ============================================================
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.Connection that attributes execute() time to the calling module."""
+
+    def execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            record_query(caller_name(2), (time.perf_counter() - start) * 1000)
+
+    def executemany(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args, **kwargs)
+        finally:
+            record_query(caller_name(2), (time.perf_counter() - start) * 1000)
+
+
+def caller_name(depth):
+    """Module name of the frame `depth` levels up (script file name for __main__)."""
+    try:
+        g = sys._getframe(depth).f_globals
+    except ValueError:
+        return "unknown"
+    name = g.get("__name__", "unknown")
+    if name == "__main__" and g.get("__file__"):
+        return os.path.splitext(os.path.basename(g["__file__"]))[0]
+    return name
+
+
+def connect(readonly=False, db_path=None):
+    """
+    Open a new tuned connection. Use this for threads that own their
+    connection (e.g. the background log writer); otherwise prefer get_connection().
+    """
+    path = db_path or DB_PATH
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, factory=TimedConnection,
+                               check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path, factory=TimedConnection, check_same_thread=False)
+        # Only takes effect on a new file (before WAL is set); lets retention
+        # hand freed pages back with incremental_vacuum
+        sqlite3.Connection.execute(conn, "PRAGMA auto_vacuum=INCREMENTAL")
+        sqlite3.Connection.execute(conn, "PRAGMA journal_mode=WAL")
+
+    for pragma, value in PRAGMAS.items():
+        sqlite3.Connection.execute(conn, f"PRAGMA {pragma}={value}")
+
+    # Used by the llm_logs_text view (search snippets, log bodies, index maintenance)
+    conn.create_function("payload_decode", 2, decode_payload, deterministic=True)
+    return conn
+
+
+def get_connection(readonly=False, caller=None):
+    """
+    Reusable per-thread connection to DB_PATH. Callers must not close it.
+    Read-only connections are used by the dashboard.
+    """
+    key = (DB_PATH, readonly)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(key)
+    if conn is not None:
+        try:
+            conn.total_changes        # raises if someone closed it
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+
+    start = time.perf_counter()
+    conn = connect(readonly=readonly)
+    record_open(caller or caller_name(2), (time.perf_counter() - start) * 1000)
+    conns[key] = conn
     return conn
 
 
+@contextmanager
+def pooled_read_connection(caller=None):
+    """
+    Borrow a read-only connection from a process-wide pool. For callers whose
+    threads are short-lived (Streamlit starts a new script thread per rerun),
+    where per-thread connections would be reopened every time.
+    """
+    pool = _read_pools.setdefault(DB_PATH, queue.LifoQueue())
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        start = time.perf_counter()
+        conn = connect(readonly=True)
+        record_open(caller or caller_name(3), (time.perf_counter() - start) * 1000)
+
+    try:
+        yield conn
+    finally:
+        if pool.qsize() < READ_POOL_SIZE:
+            pool.put(conn)
+        else:
+            conn.close()
+
+
+def close_thread_connections():
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+
+# ============================================================
+# CONNECTION / QUERY STATS
+# ============================================================
+def _caller_stats(caller):
+    stats = _stats.get(caller)
+    if stats is None:
+        stats = _stats[caller] = {"opens": 0, "open_ms": 0.0, "queries": 0, "query_ms": 0.0}
+    return stats
+
+
+def record_open(caller, elapsed_ms):
+    with _stats_lock:
+        stats = _caller_stats(caller)
+        stats["opens"] += 1
+        stats["open_ms"] += elapsed_ms
+
+
+def record_query(caller, elapsed_ms):
+    with _stats_lock:
+        stats = _caller_stats(caller)
+        stats["queries"] += 1
+        stats["query_ms"] += elapsed_ms
+
+
+def connection_stats():
+    """{caller: {opens, open_ms, queries, query_ms}} since process start."""
+    with _stats_lock:
+        return {caller: dict(stats) for caller, stats in _stats.items()}
+
+
+def add_missing_columns(conn, table, columns):
+    """Add any of `columns` ({name: type}) missing from `table`. Returns the added names."""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    added = []
+    for col, col_type in columns.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_type}")
+            added.append(col)
+    return added
+
+
 def init_db():
-    conn = get_connection()
+    """Create tables and run migrations (once per process and DB path)."""
+    if DB_PATH in _initialized:
+        return
+    init_schema(get_connection())
+    _initialized.add(DB_PATH)
+
 
+def init_schema(conn, target=None):
     # ----------- MAIN LOGS TABLE ----------- #
     conn.execute("""
     CREATE TABLE IF NOT EXISTS llm_logs (
@@ -90,5 +269,307 @@ def init_db():
     );
     """)
 
+    # ----------- CURRENCY RATES ----------- #
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS currency_rates (
+        date TEXT PRIMARY KEY,
+        usd_to_inr REAL
+    );
+    """)
+
+    # ----------- SCHEMA VERSIONS ----------- #
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TEXT
+    );
+    """)
+
+    conn.commit()
+    migrate(conn, target)
+
+
+# ============================================================
+# MIGRATIONS
+# ============================================================
+# Each migration is (version, name, fn(conn)). They run once, in order,
+# and must be safe to re-run if interrupted (chunked backfills commit as they go).
+
+BACKFILL_CHUNK = 5000
+
+
+def _m001_cost_and_running_sums(conn):
+    # Previously probed on every insert by LLMLogger.ensure_columns
+    add_missing_columns(conn, "llm_logs", {"cost_inr": "REAL", "cost_usd": "REAL"})
+
+    # Running sums keep the daily averages exact under incremental updates.
+    # The old full-table update_daily_metrics inserted its columns out of order,
+    # so existing rows are recomputed from llm_logs rather than trusted.
+    add_missing_columns(conn, "llm_metrics_daily", {
+        "sum_latency_ms": "REAL DEFAULT 0",
+        "sum_tokens_in": "REAL DEFAULT 0",
+        "sum_tokens_out": "REAL DEFAULT 0"
+    })
+    conn.execute("DELETE FROM llm_metrics_daily")
+    conn.execute("""
+    INSERT INTO llm_metrics_daily
+    (date, total_requests, error_count, sum_latency_ms, sum_tokens_in, sum_tokens_out,
+     total_cost_usd, total_cost_inr, avg_latency_ms, avg_tokens_in, avg_tokens_out)
+    SELECT
+        date(timestamp), COUNT(*),
+        SUM(CASE WHEN error_type IS NOT NULL THEN 1 ELSE 0 END),
+        TOTAL(latency_ms), TOTAL(tokens_in), TOTAL(tokens_out),
+        TOTAL(cost_usd), TOTAL(cost_inr),
+        TOTAL(latency_ms) / COUNT(*), TOTAL(tokens_in) / COUNT(*), TOTAL(tokens_out) / COUNT(*)
+    FROM llm_logs
+    GROUP BY date(timestamp)
+    """)
+
+
+def _m002_epoch_timestamps(conn):
+    # ts_ms: epoch milliseconds (UTC), day: 'YYYY-MM-DD' — both written by LLMLogger
+    add_missing_columns(conn, "llm_logs", {"ts_ms": "INTEGER", "day": "TEXT"})
+    conn.commit()
+
+    while True:
+        cur = conn.execute("""
+            UPDATE llm_logs SET
+                ts_ms = CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER),
+                day = date(timestamp)
+            WHERE rowid IN (
+                SELECT rowid FROM llm_logs WHERE ts_ms IS NULL AND timestamp IS NOT NULL LIMIT ?
+            )
+        """, (BACKFILL_CHUNK,))
+        conn.commit()
+        if cur.rowcount < BACKFILL_CHUNK:
+            break
+
+
+def _m003_filter_indexes(conn):
+    # Range scans for the dashboard's time filters and per-dimension filters.
+    # (dimension, ts_ms) also covers the sidebar SELECT DISTINCT queries.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON llm_logs (ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_day ON llm_logs (day)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_model_ts ON llm_logs (model_name, ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_user_ts ON llm_logs (user_id, ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_session_ts ON llm_logs (session_id, ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_error_ts ON llm_logs (error_type, ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_status_ts ON llm_alerts (resolved, timestamp)")
+    conn.execute("ANALYZE")
+
+
+def _m004_fx_rates_and_display_cost(conn):
+    # Multi-currency rates (USD base), replacing the INR-only currency_rates table
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS fx_rates (
+        date TEXT,
+        currency TEXT,
+        rate REAL,
+        source TEXT,
+        PRIMARY KEY (date, currency)
+    )
+    """)
+    conn.execute("""
+    INSERT OR IGNORE INTO fx_rates (date, currency, rate, source)
+    SELECT date, 'INR', usd_to_inr, 'currency_rates' FROM currency_rates
+    """)
+
+    # Cost in the configured display currency (LLM_OBS_CURRENCY)
+    add_missing_columns(conn, "llm_logs", {"cost_display": "REAL", "display_currency": "TEXT"})
+
+
+def _m005_alert_incidents(conn):
+    # Repeated alerts collapse into one incident row (see core.alerts.AlertStore)
+    add_missing_columns(conn, "llm_alerts", {
+        "fingerprint": "TEXT",
+        "model_name": "TEXT",
+        "count": "INTEGER DEFAULT 1",
+        "first_seen": "TEXT",
+        "last_seen": "TEXT",
+        "peak_value": "REAL"
+    })
+    conn.execute("""
+    UPDATE llm_alerts SET
+        fingerprint = alert_type || '|-|' || severity,
+        count = COALESCE(count, 1),
+        first_seen = COALESCE(first_seen, timestamp),
+        last_seen = COALESCE(last_seen, timestamp),
+        peak_value = COALESCE(peak_value, value)
+    WHERE fingerprint IS NULL
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_last_seen ON llm_alerts (resolved, last_seen)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_fingerprint ON llm_alerts (fingerprint, last_seen)")
+
+
+def _m006_moments_daily(conn):
+    # Per-day sums / squares / cross-products for the Deep Analytics correlation
+    from core.analytics import MOMENTS_TABLE_SQL, rebuild_moments
+    conn.execute(MOMENTS_TABLE_SQL)
+    rebuild_moments(conn)
+
+
+def _m007_time_rollups(conn):
+    # Minute / hour / day rollups by model, user and error flag (see core.rollups).
+    # Filled from llm_logs by v14, once the streaming columns they sum exist
+    from core.rollups import create_rollup_tables
+    create_rollup_tables(conn)
+
+
+def _m008_latency_sketches(conn):
+    # Mergeable latency sketches per bucket and model (see core.sketch).
+    # Filled from llm_logs by v14, once the ttft_ms column exists
+    from core.sketch import SKETCH_TABLE_SQL
+    conn.execute(SKETCH_TABLE_SQL)
+
+
+def _m009_full_text_search(conn):
+    # The FTS5 index reads bodies through llm_logs_text, which only exists
+    # once payloads are split out; it is created by v12
+    pass
+
+
+def _m010_keyset_index(conn):
+    # (ts_ms, id) gives the Log Explorer a total order to seek on; it also
+    # serves every plain ts_ms range scan, so the single-column index goes
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts_id ON llm_logs (ts_ms, id)")
+    conn.execute("DROP INDEX IF EXISTS idx_logs_ts")
+
+
+def _m011_prompt_templates(conn):
+    # Prompt fingerprint dimension (see core.prompts)
+    from core.prompts import PROMPT_TEMPLATES_SQL, backfill_prompt_fingerprints
+    add_missing_columns(conn, "llm_logs", {"prompt_fp": "INTEGER"})
+    conn.execute(PROMPT_TEMPLATES_SQL)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_prompt_fp ON llm_logs (prompt_fp, ts_ms)")
+    conn.commit()
+    backfill_prompt_fingerprints(conn, BACKFILL_CHUNK)
+
+
+def _m012_payload_store(conn):
+    # prompt/response → content-addressed, compressed llm_payloads (see core.payloads)
+    from core.payloads import PAYLOADS_TABLE_SQL, LOGS_TEXT_VIEW_SQL, migrate_inline_payloads, print_report
+    from core.search import create_fts, drop_fts, backfill_fts
+
+    add_missing_columns(conn, "llm_logs", {
+        "prompt_hash": "BLOB",
+        "response_hash": "BLOB",
+        "prompt_preview": "TEXT",
+        "response_preview": "TEXT"
+    })
+    conn.execute(PAYLOADS_TABLE_SQL)
+    conn.execute(LOGS_TEXT_VIEW_SQL)
+
+    # Re-index from scratch afterwards rather than once per moved row
+    drop_fts(conn)
     conn.commit()
-    conn.close()
+    report = migrate_inline_payloads(conn, BACKFILL_CHUNK)
+    if report["rows"]:
+        print_report(report)
+
+    create_fts(conn)
+    conn.commit()
+    backfill_fts(conn)
+
+
+def _m013_retention_archive(conn):
+    # Per-day progress of retention runs (see core.retention)
+    from core.retention import ARCHIVE_TABLE_SQL
+    conn.execute(ARCHIVE_TABLE_SQL)
+
+
+def _m014_streaming_metrics(conn):
+    # TTFT / generation time / tokens per second / inter-token gaps of streamed
+    # calls (see core.streaming), and their sums in the daily and time rollups
+    from core.rollups import RESOLUTIONS, rollup_table, rebuild_rollups
+    from core.sketch import rebuild_sketches
+    add_missing_columns(conn, "llm_logs", {
+        "ttft_ms": "REAL",
+        "gen_ms": "REAL",
+        "tokens_per_s": "REAL",
+        "itl_p50_ms": "REAL",
+        "itl_p95_ms": "REAL",
+        "itl_p99_ms": "REAL"
+    })
+    add_missing_columns(conn, "llm_metrics_daily", {
+        "streamed_requests": "INTEGER DEFAULT 0",
+        "sum_ttft_ms": "REAL DEFAULT 0",
+        "sum_tokens_per_s": "REAL DEFAULT 0"
+    })
+    for name, _ in RESOLUTIONS:
+        add_missing_columns(conn, rollup_table(name), {
+            "streamed": "INTEGER DEFAULT 0",
+            "sum_ttft_ms": "REAL DEFAULT 0",
+            "sum_tokens_per_s": "REAL DEFAULT 0"
+        })
+
+    # Tables just created by v7 / v8 in this run are still empty. Filled ones
+    # are left alone: no logged call was streamed yet, and a full rebuild would
+    # drop the buckets of days retention has already deleted from llm_logs
+    if conn.execute("SELECT EXISTS (SELECT 1 FROM llm_logs)").fetchone()[0]:
+        if not conn.execute(f"SELECT EXISTS (SELECT 1 FROM {rollup_table('day')})").fetchone()[0]:
+            rebuild_rollups(conn)
+        if not conn.execute("SELECT EXISTS (SELECT 1 FROM llm_sketches)").fetchone()[0]:
+            rebuild_sketches(conn)
+
+
+def _m015_pipeline_overhead(conn):
+    # Per-stage timings of the logging pipeline itself (see core.overhead)
+    from core.overhead import OVERHEAD_TABLE_SQL
+    conn.execute(OVERHEAD_TABLE_SQL)
+
+
+def _m016_search_without_triggers(conn):
+    # The index triggers called payload_decode, which only connect() registers,
+    # so any other writer failed on llm_logs; writers now index from Python (see core.search)
+    from core.search import drop_fts_triggers
+    drop_fts_triggers(conn)
+
+
+MIGRATIONS = [
+    (1, "cost columns + daily running sums", _m001_cost_and_running_sums),
+    (2, "epoch ms + day columns on llm_logs", _m002_epoch_timestamps),
+    (3, "dashboard filter indexes", _m003_filter_indexes),
+    (4, "fx_rates + display currency cost", _m004_fx_rates_and_display_cost),
+    (5, "alert incidents", _m005_alert_incidents),
+    (6, "daily moments for correlations", _m006_moments_daily),
+    (7, "minute/hour/day rollups", _m007_time_rollups),
+    (8, "latency sketches", _m008_latency_sketches),
+    (9, "full-text search index (moved to v12)", _m009_full_text_search),
+    (10, "keyset pagination index", _m010_keyset_index),
+    (11, "prompt fingerprints + templates", _m011_prompt_templates),
+    (12, "compressed payload store", _m012_payload_store),
+    (13, "retention archive log", _m013_retention_archive),
+    (14, "streaming latency metrics", _m014_streaming_metrics),
+    (15, "pipeline overhead", _m015_pipeline_overhead),
+    (16, "search indexed by writers, not triggers", _m016_search_without_triggers),
+]
+
+
+def schema_version(conn):
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn, target=None):
+    """
+    Apply pending migrations in order, up to `target` (default: all).
+    Returns the resulting schema version.
+    """
+    current = schema_version(conn)
+
+    for version, name, fn in MIGRATIONS:
+        if version <= current:
+            continue
+        if target is not None and version > target:
+            break
+        fn(conn)
+        conn.execute(
+            "INSERT OR IGNORE INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+            (version, name, datetime.utcnow().isoformat())
+        )
+        conn.commit()
+        print(f"[DB MIGRATION] → v{version} {name}")
+        current = version
+
+    return current
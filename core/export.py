@@ -0,0 +1,213 @@
+# core/export.py
+# Streaming export of filtered llm_logs to CSV, JSONL or Parquet. Rows are
+# read with fetchmany and written chunk by chunk, so memory stays bounded
+# by the chunk size however many rows match.
+
+import os
+import sys
+import csv
+import json
+import argparse
+from datetime import date, datetime
+
+from core.db import DB_PATH, init_db, connect
+from core.utils import now_ms, time_range_bounds
+from core.retention import ARCHIVE_COLUMNS
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+EXPORT_CHUNK = 5000
+EXPORT_DIR = os.path.abspath(
+    os.getenv("LLM_OBS_EXPORT_DIR") or os.path.join(os.path.dirname(DB_PATH), "exports")
+)
+
+# Same typed columns as the retention archive, plus the day
+EXPORT_COLUMNS = ARCHIVE_COLUMNS + (("day", "string"),)
+BODY_COLUMNS = ("prompt", "response")
+
+_SQL_TYPES = {"string": "TEXT", "int64": "INTEGER", "float64": "REAL"}
+
+
+# ============================================================
+# FILTER MODEL (shared with the Overview page)
+# ============================================================
+def logs_where(start_ms=None, end_ms=None, model=None, user=None, session=None, errors="All", prefix=""):
+    """
+    WHERE clause + params over llm_logs for the Overview filters.
+    None means "any"; errors is "All" / "Only errors" / "Only successful".
+    `prefix` qualifies the columns (e.g. "l.") when llm_logs is aliased.
+    """
+    where, params = [], {}
+    if start_ms is not None:
+        where.append(f"{prefix}ts_ms >= :start_ms")
+        params["start_ms"] = start_ms
+    if end_ms is not None:
+        where.append(f"{prefix}ts_ms < :end_ms")
+        params["end_ms"] = end_ms
+    if model is not None:
+        where.append(f"{prefix}model_name = :model")
+        params["model"] = model
+    if user is not None:
+        where.append(f"{prefix}user_id = :user")
+        params["user"] = user
+    if session is not None:
+        where.append(f"{prefix}session_id = :session")
+        params["session"] = session
+    if errors == "Only errors":
+        where.append(f"{prefix}error_type IS NOT NULL")
+    elif errors == "Only successful":
+        where.append(f"{prefix}error_type IS NULL")
+    return ("WHERE " + " AND ".join(where)) if where else "", params
+
+
+def export_columns(bodies=True):
+    return [(col, kind) for col, kind in EXPORT_COLUMNS if bodies or col not in BODY_COLUMNS]
+
+
+def export_sql(where, bodies=True):
+    """
+    Filtered rows in (ts_ms, id) order, typed like the archive. `where` must
+    qualify llm_logs columns with `l.`. Bodies are decompressed through
+    llm_logs_text only when asked for.
+    """
+    select = ", ".join(
+        f"CAST({'t' if col in BODY_COLUMNS else 'l'}.{col} AS {_SQL_TYPES[kind]}) AS {col}"
+        for col, kind in export_columns(bodies)
+    )
+    join = "JOIN llm_logs_text t ON t.rid = l.rowid" if bodies else ""
+    return f"""
+        SELECT {select}
+        FROM llm_logs l
+        {join}
+        {where}
+        ORDER BY l.ts_ms, l.id
+    """
+
+
+# ============================================================
+# WRITERS — each takes (out, columns, batches) and returns rows written
+# ============================================================
+def _write_csv(out, columns, batches):
+    writer = csv.writer(out)
+    writer.writerow([col for col, _ in columns])
+    rows = 0
+    for batch in batches:
+        writer.writerows(batch)
+        rows += len(batch)
+    return rows
+
+
+def _write_jsonl(out, columns, batches):
+    names = [col for col, _ in columns]
+    rows = 0
+    for batch in batches:
+        out.write("".join(json.dumps(dict(zip(names, row)), ensure_ascii=False) + "\n" for row in batch))
+        rows += len(batch)
+    return rows
+
+
+def _write_parquet(out, columns, batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(col, getattr(pa, kind)()) for col, kind in columns])
+    rows = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for batch in batches:
+            values = list(zip(*batch))
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(v, type=field.type) for v, field in zip(values, schema)], schema=schema
+            ))
+            rows += len(batch)
+    return rows
+
+
+_WRITERS = {"csv": _write_csv, "jsonl": _write_jsonl, "parquet": _write_parquet}
+
+
+def iter_batches(cur, chunk=EXPORT_CHUNK, progress=None):
+    """fetchmany() batches from an executed cursor; progress(rows_so_far) after each one."""
+    done = 0
+    while True:
+        batch = cur.fetchmany(chunk)
+        if not batch:
+            return
+        yield batch
+        done += len(batch)
+        if progress is not None:
+            progress(done)
+
+
+def export_logs(path, fmt="csv", where="", params=None, bodies=True, chunk=EXPORT_CHUNK,
+                progress=None, conn=None):
+    """
+    Stream the rows matched by `where` (from logs_where(prefix="l.")) to
+    `path` ("-" = stdout for csv/jsonl). The file is written under a
+    temporary name and renamed when complete. Returns the number of rows.
+    """
+    if fmt not in _WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    columns = export_columns(bodies)
+    own_conn = conn is None
+    conn = conn or connect(readonly=True)
+    try:
+        cur = conn.execute(export_sql(where, bodies), params or {})
+        batches = iter_batches(cur, chunk, progress)
+
+        if path == "-":
+            if fmt == "parquet":
+                raise ValueError("Parquet export needs a file path")
+            return _WRITERS[fmt](sys.stdout, columns, batches)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.part"
+        if fmt == "parquet":
+            rows = _write_parquet(tmp, columns, batches)
+        else:
+            with open(tmp, "w", encoding="utf-8", newline="") as out:
+                rows = _WRITERS[fmt](out, columns, batches)
+        os.replace(tmp, path)
+        return rows
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def export_path(fmt, export_dir=EXPORT_DIR):
+    """exports/llm_logs_<UTC timestamp>.<fmt>"""
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(export_dir, f"llm_logs_{stamp}.{fmt}")
+
+
+if __name__ == "__main__":
+    # python -m core.export --format parquet --range "Last 30 days" --model llama3-8b-8192 --out logs.parquet
+    parser = argparse.ArgumentParser(prog="python -m core.export", description="Export filtered llm_logs")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--out", help='output file ("-" for stdout); default exports/llm_logs_<time>.<format>')
+    parser.add_argument("--range", default="All time",
+                        choices=["Last 7 days", "Last 30 days", "All time", "Custom range"])
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, help="YYYY-MM-DD (Custom range)")
+    parser.add_argument("--to", dest="to_date", type=date.fromisoformat, help="YYYY-MM-DD, inclusive (Custom range)")
+    parser.add_argument("--model")
+    parser.add_argument("--user")
+    parser.add_argument("--session")
+    parser.add_argument("--errors", default="All", choices=["All", "Only errors", "Only successful"])
+    parser.add_argument("--no-bodies", action="store_true", help="leave out prompt/response")
+    parser.add_argument("--chunk", type=int, default=EXPORT_CHUNK)
+    args = parser.parse_args()
+
+    if args.from_date or args.to_date:
+        if not (args.from_date and args.to_date):
+            parser.error("--from and --to go together")
+        args.range = "Custom range"
+    start_ms, end_ms = time_range_bounds(args.range, args.from_date, args.to_date)
+    where, params = logs_where(
+        start_ms, end_ms, args.model, args.user, args.session, args.errors, prefix="l."
+    )
+
+    init_db()
+    out = args.out or export_path(args.format)
+    started = now_ms()
+    n = export_logs(out, args.format, where, params, bodies=not args.no_bodies, chunk=args.chunk)
+    if out != "-":
+        print(f"[EXPORT] {n} row(s) → {out} in {(now_ms() - started) / 1000:.1f} s", file=sys.stderr)
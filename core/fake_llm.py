@@ -0,0 +1,159 @@
+# core/fake_llm.py
+# Local stand-in for the Groq client: same chat.completions.create() and
+# models.list() shapes, with simulated time to first token, per-token gaps,
+# token counts and injected errors, so streaming, logging and the benchmarks
+# can be exercised without API calls.
+
+import os
+import time
+import random
+from types import SimpleNamespace
+
+FAKE_MODELS = ("fake-llama-8b", "fake-mixtral-8x7b")
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+
+class FakeAPIError(Exception):
+    """Injected server error (shaped like groq.APIStatusError)."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={})
+
+
+class RateLimitError(FakeAPIError):
+    """Injected 429; core.batch retries it like groq.RateLimitError."""
+
+    def __init__(self, message="Rate limit reached (fake)", retry_after=None):
+        super().__init__(message, status_code=429)
+        if retry_after is not None:
+            self.response.headers["retry-after"] = str(retry_after)
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens
+    )
+
+
+class FakeLLMClient:
+    """
+    `ttft_ms` before the first token, then `itl_ms` between tokens, drawn
+    from `distribution`:
+      fixed     — exactly the configured value
+      uniform   — ±`jitter` (fraction) around it
+      lognormal — median at the value, sigma `jitter` (long right tail)
+    `tokens_out` is an int or a (low, high) range per call. `error_rate` /
+    `rate_limit_rate` are the fractions of calls that fail with FakeAPIError
+    (500) / RateLimitError (429) before the first token.
+    Streams end with a chunk carrying Groq's `x_groq.usage`.
+    """
+
+    def __init__(
+        self,
+        ttft_ms=200,
+        itl_ms=20,
+        tokens_out=50,
+        jitter=0.2,
+        distribution="uniform",
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        models=FAKE_MODELS,
+        seed=None
+    ):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.ttft_ms = ttft_ms
+        self.itl_ms = itl_ms
+        self.tokens_out = tokens_out
+        self.jitter = jitter
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.model_ids = list(models)
+        self._random = random.Random(seed)
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = SimpleNamespace(list=self.list_models)
+
+    def with_options(self, **options):
+        # groq.Groq.with_options(max_retries=...) — nothing to configure here
+        return self
+
+    def list_models(self):
+        return SimpleNamespace(data=[SimpleNamespace(id=m) for m in self.model_ids])
+
+    def _draw(self, ms):
+        if ms <= 0 or self.distribution == "fixed":
+            return max(0.0, ms)
+        if self.distribution == "lognormal":
+            return ms * self._random.lognormvariate(0.0, self.jitter)
+        return max(0.0, ms * (1 + self._random.uniform(-self.jitter, self.jitter)))
+
+    def _sleep(self, ms):
+        ms = self._draw(ms)
+        if ms:
+            time.sleep(ms / 1000)
+
+    def _tokens(self, messages):
+        prompt = " ".join(m.get("content") or "" for m in messages)
+        n = self.tokens_out
+        if isinstance(n, (tuple, list)):
+            n = self._random.randint(n[0], n[1])
+        words = [f"tok{i}" for i in range(n)]
+        return len(prompt.split()), words
+
+    def _maybe_fail(self, model):
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise RateLimitError()
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise FakeAPIError(f"Internal server error (fake) from {model}")
+
+    def create(self, model, messages, temperature=None, stream=False, **kwargs):
+        prompt_tokens, words = self._tokens(messages)
+        self._maybe_fail(model)
+        if stream:
+            return self._stream(model, prompt_tokens, words)
+
+        self._sleep(self.ttft_ms)
+        for _ in range(len(words) - 1):
+            self._sleep(self.itl_ms)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(role="assistant", content=" ".join(words)))],
+            usage=_usage(prompt_tokens, len(words))
+        )
+
+    def _stream(self, model, prompt_tokens, words):
+        for i, word in enumerate(words):
+            self._sleep(self.ttft_ms if i == 0 else self.itl_ms)
+            yield SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=word if i == 0 else " " + word))],
+                x_groq=None
+            )
+        yield SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=None), finish_reason="stop")],
+            x_groq=SimpleNamespace(usage=_usage(prompt_tokens, len(words)))
+        )
+
+
+def fake_client_from_env():
+    """FakeLLMClient configured from LLM_OBS_FAKE_* (see README, Fake Backend)."""
+    tokens = os.getenv("LLM_OBS_FAKE_TOKENS", "50")
+    low, _, high = tokens.partition("-")
+    return FakeLLMClient(
+        ttft_ms=float(os.getenv("LLM_OBS_FAKE_TTFT_MS", "200")),
+        itl_ms=float(os.getenv("LLM_OBS_FAKE_ITL_MS", "20")),
+        tokens_out=(int(low), int(high)) if high else int(low),
+        jitter=float(os.getenv("LLM_OBS_FAKE_JITTER", "0.2")),
+        distribution=os.getenv("LLM_OBS_FAKE_DISTRIBUTION", "uniform"),
+        error_rate=float(os.getenv("LLM_OBS_FAKE_ERROR_RATE", "0")),
+        rate_limit_rate=float(os.getenv("LLM_OBS_FAKE_RATE_LIMIT_RATE", "0")),
+        seed=int(os.environ["LLM_OBS_FAKE_SEED"]) if os.getenv("LLM_OBS_FAKE_SEED") else None
+    )
@@ -2,30 +2,395 @@
 
 import sqlite3
 import uuid
-from datetime import datetime
+import time
+import queue
+import atexit
+import threading
 
-DB_PATH = "llm_logs.db"
+from core.db import init_db, init_schema, get_connection, connect
+from core.utils import now_ms, ms_to_iso, ms_to_day
+from core.analytics import record_daily_metrics, record_moments
+from core.rollups import record_rollups
+from core.sketch import record_sketches
+from core.prompts import fingerprint_events, record_prompt_templates
+from core.payloads import store_payloads, LOG_WITH_BODIES_SQL
+from core.search import index_events
+from core.streaming import STREAM_COLUMNS
+from core.overhead import span
+
+# prompt/response go to llm_payloads; the row keeps their hashes and previews
+LOG_COLUMNS = (
+    "id", "timestamp", "session_id", "user_id", "model_name",
+    "tokens_in", "tokens_out", "latency_ms", "cost_usd", "cost_inr",
+    "temperature", "error_type", "rating", "metadata", "ts_ms", "day",
+    "cost_display", "display_currency", "prompt_fp",
+    "prompt_hash", "response_hash", "prompt_preview", "response_preview"
+) + STREAM_COLUMNS
+
+INSERT_LOG_SQL = f"""
+    INSERT INTO llm_logs ({", ".join(LOG_COLUMNS)})
+    VALUES ({", ".join("?" for _ in LOG_COLUMNS)})
+"""
+
+# Queue sentinels understood by the writer thread
+_FLUSH = object()
+_STOP = object()
+
+
+class _Barrier:
+    """Queue marker released once the batch it was collected into is committed."""
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LogWriter:
+    """
+    Background writer for LLMLogger.
+    Events are queued by the caller and a daemon thread commits them
+    with executemany, one transaction per batch.
+    """
+
+    def __init__(
+        self,
+        db_path=None,
+        batch_size=200,
+        flush_interval=1.0,
+        max_queue=10_000,
+        policy="block",
+        put_timeout=None
+    ):
+        if policy not in ("block", "drop"):
+            raise ValueError(f"Unknown queue policy: {policy}")
+
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.put_timeout = put_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "last_batch_ms": 0.0,
+            "max_batch_ms": 0.0,
+            "total_batch_ms": 0.0,
+            "max_queue_depth": 0,
+            "last_lag_ms": 0.0,
+            "max_lag_ms": 0.0
+        }
+
+    # ---------------- LIFECYCLE ----------------
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="llm-log-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, timeout=None):
+        """Block until every row queued so far is committed. Returns False on timeout."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.unfinished_tasks == 0
+
+        self._queue.put(_FLUSH)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def barrier(self, fn=None, timeout=None):
+        """
+        Block until every event queued so far is committed, then run fn(conn)
+        (if given) in its own transaction on the writer thread and return its
+        result. Unlike flush(), the batch being collected is not cut short, so
+        concurrent callers still share one commit. Raises TimeoutError on
+        timeout, and fn's exception if it failed.
+        """
+        item = _Barrier(fn)
+        self._queue.put(item)
+        if not item.done.wait(timeout):
+            raise TimeoutError("log writer did not reach the barrier in time")
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def close(self, timeout=None):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    # ---------------- PRODUCER SIDE ----------------
+    def submit(self, event):
+        """Queue one event. Returns False if it was dropped by backpressure."""
+        try:
+            if self.policy == "drop":
+                self._queue.put_nowait(event)
+            else:
+                self._queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return False
+
+        with self._lock:
+            self.stats["enqueued"] += 1
+            depth = self._queue.qsize()
+            if depth > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = depth
+        return True
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue_depth()
+        stats["avg_batch_ms"] = (
+            stats["total_batch_ms"] / stats["batches"] if stats["batches"] else 0.0
+        )
+        stats["avg_batch_size"] = stats["written"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+    def _record_batch(self, batch, elapsed):
+        # Lag: how long the oldest event of the batch waited between being logged and landing
+        lag = max(0, now_ms() - min(e.get("ts_ms") or now_ms() for e in batch))
+        with self._lock:
+            self.stats["written"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["last_batch_ms"] = elapsed
+            self.stats["total_batch_ms"] += elapsed
+            self.stats["max_batch_ms"] = max(self.stats["max_batch_ms"], elapsed)
+            self.stats["last_lag_ms"] = lag
+            self.stats["max_lag_ms"] = max(self.stats["max_lag_ms"], lag)
+
+    # ---------------- WRITER THREAD ----------------
+    def _connect(self):
+        # The writer thread owns a dedicated connection for its lifetime
+        conn = connect(db_path=self.db_path)
+        init_schema(conn)
+        return conn
+
+    def _disconnect(self, conn):
+        conn.close()
+
+    def _run(self):
+        conn = self._connect()
+        running = True
+
+        while running:
+            item = self._queue.get()
+            batch, barriers, taken = [], [], 1
+
+            if item is _STOP:
+                running = False
+            elif isinstance(item, _Barrier):
+                barriers.append(item)
+            elif item is not _FLUSH:
+                batch.append(item)
+                deadline = time.monotonic() + self.flush_interval
+
+                # Keep collecting until the batch is full, the interval elapses,
+                # or someone asks for a flush / shutdown
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    taken += 1
+                    if item is _STOP:
+                        running = False
+                        break
+                    if item is _FLUSH:
+                        break
+                    if isinstance(item, _Barrier):
+                        barriers.append(item)
+                    else:
+                        batch.append(item)
+
+            if batch:
+                self._write_batch(conn, batch)
+            for item in barriers:
+                self._release(conn, item)
+
+            for _ in range(taken):
+                self._queue.task_done()
+
+        self._disconnect(conn)
+
+    def _release(self, conn, barrier):
+        if barrier.fn is not None:
+            try:
+                with conn:
+                    barrier.result = barrier.fn(conn)
+            except Exception as e:
+                barrier.error = e
+        barrier.done.set()
+
+    def _write_batch(self, conn, batch):
+        """Commit one batch; False (and rolled back) if it failed."""
+        start = time.perf_counter()
+        try:
+            with conn:
+                LLMLogger.write_events(conn, batch)
+        except (sqlite3.Error, KeyError, TypeError, ValueError) as e:
+            # A malformed event must not take the writer thread (and every later flush) down with it
+            with self._lock:
+                self.stats["failed_batches"] += 1
+            print(f"[LOG WRITER] batch of {len(batch)} failed → {e!r}")
+            return False
+
+        self._record_batch(batch, (time.perf_counter() - start) * 1000)
+        return True
 
 
 class LLMLogger:
 
+    # Opt-in background writer (see enable_async / enable_collector)
+    _writer = None
+
+    # The CollectorClient while in collector mode (see collector())
+    _collector = None
+
+    # Callables invoked with every logged event dict (e.g. the streaming alert engine)
+    _listeners = []
+
     @staticmethod
-    def ensure_columns(conn):
-        """Add missing columns without breaking existing DB."""
-        existing_cols = [
-            row[1] for row in conn.execute("PRAGMA table_info(llm_logs)").fetchall()
-        ]
-
-        required_cols = {
-            "cost_inr": "ALTER TABLE llm_logs ADD COLUMN cost_inr REAL",
-            "cost_usd": "ALTER TABLE llm_logs ADD COLUMN cost_usd REAL"
-        }
+    def add_listener(fn):
+        if fn not in LLMLogger._listeners:
+            LLMLogger._listeners.append(fn)
 
-        for col, query in required_cols.items():
-            if col not in existing_cols:
-                conn.execute(query)
-                conn.commit()
+    @staticmethod
+    def remove_listener(fn):
+        if fn in LLMLogger._listeners:
+            LLMLogger._listeners.remove(fn)
 
+    @staticmethod
+    def _notify(event):
+        for fn in LLMLogger._listeners:
+            try:
+                fn(event)
+            except Exception as e:
+                print(f"[LOGGER] listener {getattr(fn, '__qualname__', fn)} failed → {e}")
+
+    @staticmethod
+    def write_events(conn, events):
+        """
+        Insert log events, index their text for search and fold them into
+        the daily, time-bucketed and prompt-template rollups (caller commits). Prompts are fingerprinted
+        and bodies compressed here so the async writer thread, not the
+        caller, pays for it.
+        """
+        with span("write.payloads"):
+            templates = fingerprint_events(events)
+            store_payloads(conn, events)
+        with span("write.insert"):
+            conn.executemany(INSERT_LOG_SQL, [
+                tuple(e.get(col) for col in LOG_COLUMNS) for e in events
+            ])
+        with span("write.search"):
+            index_events(conn, events)
+        with span("write.metrics"):
+            record_daily_metrics(conn, events)
+            record_moments(conn, events)
+        with span("write.rollups"):
+            record_rollups(conn, events)
+        with span("write.sketches"):
+            record_sketches(conn, events)
+        with span("write.templates"):
+            record_prompt_templates(conn, events, templates)
+
+    @staticmethod
+    def get_log(log_id):
+        """One logged row as a dict with prompt/response decompressed, or None."""
+        init_db()
+        conn = get_connection()
+        cur = conn.execute(LOG_WITH_BODIES_SQL, {"id": log_id})
+        row = cur.fetchone()
+        if row is None:
+            return None
+        log = dict(zip([c[0] for c in cur.description], row))
+        log["prompt"] = log.pop("prompt_text")
+        log["response"] = log.pop("response_text")
+        return log
+
+    # ---------------- ASYNC WRITER ----------------
+    @staticmethod
+    def enable_async(**writer_options):
+        """
+        Route log_text_interaction through a background LogWriter.
+        Options are passed to LogWriter (batch_size, flush_interval,
+        max_queue, policy, put_timeout).
+        """
+        if LLMLogger._writer is None:
+            LLMLogger._writer = LogWriter(**writer_options).start()
+            atexit.register(LLMLogger.shutdown)
+        return LLMLogger._writer
+
+    @staticmethod
+    def enable_collector(**client_options):
+        """
+        Client mode: send events to the collector daemon (core/collector.py)
+        in background batches instead of writing SQLite from this process,
+        spooling them to disk while it is unreachable. Options are passed to
+        CollectorClient (url, spool_dir, timeout, batch_size, flush_interval, ...).
+
+        The process then writes nothing to SQLite itself: alert incidents, FX
+        rates and overhead sketches are sent through LLMLogger.collector() as
+        well, and schema creation / migrations are left to the collector.
+        """
+        from core.collector import CollectorClient
+        if LLMLogger._writer is None:
+            LLMLogger._writer = LLMLogger._collector = CollectorClient(**client_options).start()
+            atexit.register(LLMLogger.shutdown)
+        return LLMLogger._writer
+
+    @staticmethod
+    def collector():
+        """The CollectorClient in collector mode, else None (write SQLite directly)."""
+        return LLMLogger._collector
+
+    @staticmethod
+    def flush(timeout=None):
+        if LLMLogger._writer is None:
+            return True
+        return LLMLogger._writer.flush(timeout)
+
+    @staticmethod
+    def shutdown(timeout=None):
+        writer = LLMLogger._writer
+        if writer is None:
+            return
+        writer.flush(timeout)
+        writer.close(timeout)
+        LLMLogger._writer = LLMLogger._collector = None
+
+    @staticmethod
+    def writer_stats():
+        if LLMLogger._writer is None:
+            return None
+        return LLMLogger._writer.get_stats()
+
+    # ---------------- LOGGING ----------------
     @staticmethod
     def log_text_interaction(
         session_id,
@@ -41,54 +406,51 @@ class LLMLogger:
         temperature,
         error_type=None,
         rating=None,
-        metadata=None
+        metadata=None,
+        cost_display=None,
+        display_currency=None,
+        stream_metrics=None
     ):
-        conn = sqlite3.connect(DB_PATH)
-
-        # Create table if not exists
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS llm_logs (
-                id TEXT PRIMARY KEY,
-                timestamp TEXT,
-                session_id TEXT,
-                user_id TEXT,
-                model_name TEXT,
-                prompt TEXT,
-                response TEXT,
-                tokens_in INTEGER,
-                tokens_out INTEGER,
-                latency_ms INTEGER,
-                cost_usd REAL,
-                cost_inr REAL,
-                temperature REAL,
-                error_type TEXT,
-                rating INTEGER,
-                metadata TEXT
-            )
-        """)
-
-        # Ensure new columns exist
-        LLMLogger.ensure_columns(conn)
-
-        # Insert log row
+        """`stream_metrics` is StreamTimer.metrics() for streamed calls."""
         log_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
-
-        conn.execute("""
-            INSERT INTO llm_logs (
-                id, timestamp, session_id, user_id, model_name, prompt, response,
-                tokens_in, tokens_out, latency_ms, cost_usd, cost_inr,
-                temperature, error_type, rating, metadata
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            log_id, timestamp, session_id, user_id, model_name, prompt, response,
-            tokens_in, tokens_out, latency_ms, cost_usd, cost_inr,
-            temperature, error_type, rating, metadata
-        ))
-
-        conn.commit()
-        conn.close()
-        return log_id
+        ts_ms = now_ms()
 
+        event = {
+            "id": log_id,
+            "timestamp": ms_to_iso(ts_ms),
+            "session_id": session_id,
+            "user_id": user_id,
+            "model_name": model_name,
+            "prompt": prompt,
+            "response": response,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "latency_ms": latency_ms,
+            "cost_usd": cost_usd,
+            "cost_inr": cost_inr,
+            "temperature": temperature,
+            "error_type": error_type,
+            "rating": rating,
+            "metadata": metadata,
+            "ts_ms": ts_ms,
+            "day": ms_to_day(ts_ms),
+            "cost_display": cost_display,
+            "display_currency": display_currency
+        }
+        event.update(stream_metrics or {})
+
+        with span("log.submit"):
+            # Async mode: hand the event to the background writer
+            if LLMLogger._writer is not None:
+                LLMLogger._writer.submit(event)
+            else:
+                init_db()
+                conn = get_connection()
 
+                # Insert log row + update today's metrics in one transaction
+                with conn:
+                    LLMLogger.write_events(conn, [event])
+
+        with span("log.listeners"):
+            LLMLogger._notify(event)
+        return log_id
@@ -0,0 +1,432 @@
+# core/metrics.py
+# Prometheus metrics for scrapers: counters and histograms kept in memory,
+# updated by an LLMLogger listener on every logged call and served as
+# text exposition on GET /metrics. Nothing here reads or writes the database.
+#
+# Several processes (app workers, batch runs) can share one view: with
+# LLM_OBS_METRICS_DIR set, each process keeps its values in its own
+# memory-mapped file in that directory and /metrics sums all of them.
+#   python -m core.metrics serve --port 9464     # standalone scrape target over LLM_OBS_METRICS_DIR
+#   python -m core.metrics show                  # print the current exposition
+
+import os
+import re
+import sys
+import json
+import glob
+import mmap
+import struct
+import bisect
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+METRICS_HOST = os.getenv("LLM_OBS_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("LLM_OBS_METRICS_PORT") or "9464")
+METRICS_DIR = os.getenv("LLM_OBS_METRICS_DIR")
+
+# Label cardinality bounds: models beyond the first MAX_MODEL_LABELS seen
+# are reported as "other"; error messages are reduced to ERROR_CLASSES
+MAX_MODEL_LABELS = int(os.getenv("LLM_OBS_METRICS_MAX_MODELS", "20"))
+OTHER_LABEL = "other"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)     # s
+TTFT_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)         # s
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+MMAP_INITIAL_SIZE = 64 * 1024    # bytes; a file doubles when it fills up
+
+
+# ============================================================
+# ERROR CLASSES
+# ============================================================
+# (class, pattern) — first match wins; error_type is the logged str(exception)
+ERROR_CLASSES = (
+    ("cancelled", re.compile(r"^cancelled", re.I)),
+    ("rate_limit", re.compile(r"\b429\b|rate.?limit", re.I)),
+    ("timeout", re.compile(r"timed? ?out", re.I)),
+    ("auth", re.compile(r"\b40[13]\b|api.?key|authenticat|permission", re.I)),
+    ("connection", re.compile(r"connect", re.I)),
+    ("server", re.compile(r"\b5\d\d\b|server error|unavailable|overloaded", re.I)),
+    ("client", re.compile(r"\b4\d\d\b", re.I)),
+)
+
+
+def error_class(error_type):
+    """Fixed, low-cardinality class of a logged error message ("other" if nothing matches)."""
+    for name, pattern in ERROR_CLASSES:
+        if pattern.search(error_type):
+            return name
+    return OTHER_LABEL
+
+
+# ============================================================
+# VALUE STORES
+# ============================================================
+# Values are keyed by json [sample name, [[label, value], ...]]. Histogram
+# buckets are stored per bucket (not cumulative) and summed up when rendered.
+def sample_key(name, labels):
+    return json.dumps([name, labels], separators=(",", ":"))
+
+
+class MemoryValues:
+    """Values of this process only."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, key, amount):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+
+# File layout: an 8-byte header holding the bytes in use, then entries of
+# <uint32 key length><key, padded to 8 bytes><float64 value>. Only the owning
+# process writes; an entry is complete before the header counts it, so readers
+# in other processes never see a partial one.
+_HEADER = struct.Struct("<I4x")
+_KEY_LEN = struct.Struct("<I")
+_VALUE = struct.Struct("<d")
+
+
+def _entry_size(key_bytes):
+    return (_KEY_LEN.size + len(key_bytes) + 7) // 8 * 8 + _VALUE.size
+
+
+def _read_entries(buf):
+    """(key, value, value offset) for every entry of a store file's bytes."""
+    used = _HEADER.unpack_from(buf, 0)[0] if len(buf) >= _HEADER.size else 0
+    pos = _HEADER.size
+    while pos < min(used, len(buf)):
+        length = _KEY_LEN.unpack_from(buf, pos)[0]
+        offset = pos + (_KEY_LEN.size + length + 7) // 8 * 8
+        if offset + _VALUE.size > len(buf):
+            break
+        key = bytes(buf[pos + _KEY_LEN.size:pos + _KEY_LEN.size + length]).decode("utf-8")
+        yield key, _VALUE.unpack_from(buf, offset)[0], offset
+        pos = offset + _VALUE.size
+
+
+class MmapValues:
+    """
+    This process's values in `metrics_dir`/values_<pid>.db, memory-mapped so
+    increments cost no system calls. A forked child opens a file of its own.
+    """
+
+    def __init__(self, metrics_dir, initial_size=MMAP_INITIAL_SIZE):
+        self.metrics_dir = metrics_dir
+        self.initial_size = initial_size
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _open(self):
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        self._pid = os.getpid()
+        self.path = os.path.join(self.metrics_dir, f"values_{self._pid}.db")
+        # A reused pid picks up the old file: its totals stay counted
+        self._file = open(self.path, "a+b")
+        size = max(os.fstat(self._file.fileno()).st_size, self.initial_size)
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _HEADER.unpack_from(self._map, 0)[0] or _HEADER.size
+        self._offsets = {key: offset for key, _, offset in _read_entries(self._map)}
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+
+    def _add_entry(self, key):
+        key_bytes = key.encode("utf-8")
+        size = _entry_size(key_bytes)
+        if self._used + size > len(self._map):
+            self._grow(self._used + size)
+        pos = self._used
+        _KEY_LEN.pack_into(self._map, pos, len(key_bytes))
+        self._map[pos + _KEY_LEN.size:pos + _KEY_LEN.size + len(key_bytes)] = key_bytes
+        offset = pos + size - _VALUE.size
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+    def inc(self, key, amount):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            offset = self._offsets.get(key)
+            if offset is None:
+                offset = self._add_entry(key)
+            _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def snapshot(self):
+        return read_dir(self.metrics_dir)
+
+
+def read_dir(metrics_dir):
+    """Values summed over every process's store file in `metrics_dir`."""
+    totals = {}
+    for path in sorted(glob.glob(os.path.join(metrics_dir, "values_*.db"))):
+        try:
+            with open(path, "rb") as f:
+                buf = f.read()
+        except OSError:
+            continue
+        for key, value, _ in _read_entries(buf):
+            totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+# ============================================================
+# METRICS
+# ============================================================
+class Counter:
+    def __init__(self, registry, name, doc, labels):
+        self.registry = registry
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.kind = "counter"
+        self._keys = {}
+
+    def inc(self, amount=1, **labels):
+        values = tuple(str(labels[k]) for k in self.labels)
+        key = self._keys.get(values)
+        if key is None:
+            key = self._keys[values] = sample_key(self.name, [list(p) for p in zip(self.labels, values)])
+        self.registry.values.inc(key, amount)
+
+    def render(self, values):
+        lines = []
+        for (sample, labels), value in values:
+            if sample == self.name:
+                lines.append(f"{self.name}{_labels(labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, registry, name, doc, labels, buckets):
+        self.registry = registry
+        self.name = name
+        self.doc = doc
+        self.labels = labels
+        self.bounds = tuple(float(b) for b in buckets)
+        self.kind = "histogram"
+        self._le = [_number(b) for b in self.bounds] + ["+Inf"]
+        self._keys = {}
+
+    def _series_keys(self, values):
+        # (bucket keys by bucket index, sum key, count key) of one label set
+        pairs = [list(p) for p in zip(self.labels, values)]
+        return (
+            [sample_key(f"{self.name}_bucket", pairs + [["le", le]]) for le in self._le],
+            sample_key(f"{self.name}_sum", pairs),
+            sample_key(f"{self.name}_count", pairs),
+        )
+
+    def observe(self, value, **labels):
+        values = tuple(str(labels[k]) for k in self.labels)
+        keys = self._keys.get(values)
+        if keys is None:
+            keys = self._keys[values] = self._series_keys(values)
+        buckets, sum_key, count_key = keys
+        store = self.registry.values
+        store.inc(buckets[bisect.bisect_left(self.bounds, value)], 1)
+        store.inc(sum_key, value)
+        store.inc(count_key, 1)
+
+    def render(self, values):
+        series = {}
+        for (sample, labels), value in values:
+            if sample == f"{self.name}_bucket":
+                le = labels[-1][1]
+                series.setdefault(_freeze(labels[:-1]), {})[le] = value
+            elif sample in (f"{self.name}_sum", f"{self.name}_count"):
+                series.setdefault(_freeze(labels), {})[sample] = value
+
+        lines = []
+        for labels, data in series.items():
+            labels = [list(p) for p in labels]
+            seen = 0.0
+            for le in self._le:
+                seen += data.get(le, 0.0)
+                lines.append(f"{self.name}_bucket{_labels(labels + [['le', le]])} {_number(seen)}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {_number(data.get(f'{self.name}_sum', 0.0))}")
+            lines.append(f"{self.name}_count{_labels(labels)} {_number(data.get(f'{self.name}_count', 0.0))}")
+        return lines
+
+
+def _freeze(labels):
+    return tuple(tuple(p) for p in labels)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    value = float(value)
+    if value == int(value) and abs(value) < 2 ** 53:
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsRegistry:
+    """
+    The project's metrics over one value store: MemoryValues, or MmapValues
+    (shared across processes) when `metrics_dir` is given. observe(event)
+    is the LLMLogger listener; render() is the /metrics body.
+    """
+
+    def __init__(self, metrics_dir=None, max_models=MAX_MODEL_LABELS):
+        self.values = MmapValues(metrics_dir) if metrics_dir else MemoryValues()
+        self.max_models = max_models
+        self._models = set()
+        self._lock = threading.Lock()
+
+        self.requests = Counter(self, "llm_requests_total", "Logged LLM calls.", ("model",))
+        self.errors = Counter(
+            self, "llm_errors_total", "Logged LLM calls that failed, by error class.", ("model", "error_class")
+        )
+        self.tokens = Counter(self, "llm_tokens_total", "Tokens of logged LLM calls.", ("model", "direction"))
+        self.cost = Counter(self, "llm_cost_usd_total", "Cost of logged LLM calls in USD.", ("model",))
+        self.latency = Histogram(
+            self, "llm_request_duration_seconds", "Latency of successful LLM calls.", ("model",), LATENCY_BUCKETS
+        )
+        self.ttft = Histogram(
+            self, "llm_time_to_first_token_seconds", "Time to first token of successful streamed LLM calls.",
+            ("model",), TTFT_BUCKETS
+        )
+        self.metrics = [self.requests, self.errors, self.tokens, self.cost, self.latency, self.ttft]
+
+    def model_label(self, model):
+        model = model or "unknown"
+        if model in self._models:
+            return model
+        with self._lock:
+            if len(self._models) < self.max_models:
+                self._models.add(model)
+                return model
+        return OTHER_LABEL
+
+    def observe(self, event):
+        model = self.model_label(event.get("model_name"))
+        self.requests.inc(model=model)
+        self.tokens.inc(event.get("tokens_in") or 0, model=model, direction="input")
+        self.tokens.inc(event.get("tokens_out") or 0, model=model, direction="output")
+        self.cost.inc(event.get("cost_usd") or 0, model=model)
+
+        if event.get("error_type") is not None:
+            self.errors.inc(model=model, error_class=error_class(event["error_type"]))
+            return
+        if event.get("latency_ms") is not None:
+            self.latency.observe(event["latency_ms"] / 1000, model=model)
+        if event.get("ttft_ms") is not None:
+            self.ttft.observe(event["ttft_ms"] / 1000, model=model)
+
+    def render(self, values=None):
+        """Prometheus text exposition of `values` (default: this registry's store)."""
+        values = self.values.snapshot() if values is None else values
+        parsed = sorted((json.loads(k), v) for k, v in values.items())
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(parsed))
+        return "\n".join(lines) + "\n"
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide registry (shared through LLM_OBS_METRICS_DIR when set)."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry(METRICS_DIR)
+    return _registry
+
+
+# ============================================================
+# HTTP
+# ============================================================
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics · GET /health"""
+
+    registry = None
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type, status = self.registry.render().encode("utf-8"), CONTENT_TYPE, 200
+        elif path == "/health":
+            body, content_type, status = b'{"ok": true}', "application/json", 200
+        else:
+            body, content_type, status = b'{"error": "not found"}', "application/json", 404
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST, registry=None):
+    """Serve /metrics from a daemon thread of this process; returns the server (None if the port is taken)."""
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"registry": registry or get_registry()})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        print(f"[METRICS] cannot listen on {host}:{port} → {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[METRICS] serving http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+if __name__ == "__main__":
+    # LLM_OBS_METRICS_DIR=/tmp/llm_metrics python -m core.metrics serve --port 9464
+    parser = argparse.ArgumentParser(prog="python -m core.metrics", description="Prometheus metrics endpoint")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("serve", help="serve /metrics summed over every process writing to --dir")
+    run.add_argument("--host", default=METRICS_HOST)
+    run.add_argument("--port", type=int, default=METRICS_PORT)
+    run.add_argument("--dir", default=METRICS_DIR)
+    show = sub.add_parser("show", help="print the exposition of --dir")
+    show.add_argument("--dir", default=METRICS_DIR)
+    args = parser.parse_args()
+
+    if not args.dir:
+        sys.exit("[METRICS] set LLM_OBS_METRICS_DIR (or --dir) to the directory the app processes write to")
+    registry = MetricsRegistry(args.dir)
+    if args.command == "show":
+        print(registry.render(), end="")
+    else:
+        server = start_metrics_server(args.port, args.host, registry)
+        if server is None:
+            sys.exit(1)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,359 @@
+# core/overhead.py
+# Self-instrumentation: what the observability pipeline itself costs each call.
+# Stages are timed with span("name") into per-minute DDSketches held in memory;
+# a background thread merges them into llm_overhead (minute / hour / day buckets,
+# like llm_sketches) every few seconds, through the collector in collector mode. Optionally, a sampled share of calls is
+# run under cProfile or pyinstrument and the profiles are kept on disk.
+#
+# Stages recorded by main.py and core/logger.py:
+#   route, cost, log      — the steps around each LLM call, in the caller
+#   log.submit            — sync write (or, buffered / collector mode, the enqueue)
+#   log.listeners         — alert engine and other LLMLogger listeners
+#   write.*               — LLMLogger.write_events, one sample per written batch; in the
+#                           caller in sync mode, in the writer thread (or collector) otherwise
+#   llm                   — time inside the LLM client, for scale
+#   pipeline              — route + cost + log of one call: what the project adds to it
+
+import os
+import glob
+import time
+import atexit
+import base64
+import random
+import itertools
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from core.db import DB_PATH, init_db, get_connection
+from core.rollups import RESOLUTIONS
+from core.sketch import DDSketch
+from core.utils import now_ms
+
+OVERHEAD_ENABLED = os.getenv("LLM_OBS_OVERHEAD", "1") != "0"
+OVERHEAD_FLUSH_INTERVAL = 10.0   # s — pending sketches are merged into llm_overhead on this interval
+
+# Sampling profiler: share of calls (0–1) profiled, with "cprofile" or "pyinstrument"
+PROFILE_RATE = float(os.getenv("LLM_OBS_PROFILE_RATE", "0"))
+PROFILER = os.getenv("LLM_OBS_PROFILER", "cprofile")
+PROFILE_DIR = os.path.abspath(
+    os.getenv("LLM_OBS_PROFILE_DIR") or os.path.join(os.path.dirname(DB_PATH), "llm_profiles")
+)
+PROFILE_KEEP = 100               # newest profile files kept in PROFILE_DIR
+
+_BUCKET_MS = RESOLUTIONS[0][1]
+
+
+# ============================================================
+# STORAGE — llm_overhead
+# ============================================================
+OVERHEAD_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_overhead (
+        resolution TEXT NOT NULL,
+        bucket_ms INTEGER NOT NULL,
+        stage TEXT NOT NULL,
+        calls INTEGER NOT NULL,
+        sum_ms REAL NOT NULL,
+        max_ms REAL,
+        sketch BLOB NOT NULL,
+        PRIMARY KEY (resolution, bucket_ms, stage)
+    ) WITHOUT ROWID
+"""
+
+UPSERT_OVERHEAD_SQL = """
+    INSERT INTO llm_overhead (resolution, bucket_ms, stage, calls, sum_ms, max_ms, sketch)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (resolution, bucket_ms, stage) DO UPDATE SET
+        calls = excluded.calls,
+        sum_ms = excluded.sum_ms,
+        max_ms = excluded.max_ms,
+        sketch = excluded.sketch
+"""
+
+
+def overhead_where(resolution, start_ms=None, end_ms=None):
+    """Dashboard range → (WHERE clause, params) over llm_overhead; open bounds are left out."""
+    where, params = ["resolution = :resolution"], {"resolution": resolution}
+    if start_ms is not None:
+        where.append("bucket_ms >= :start_ms")
+        params["start_ms"] = start_ms
+    if end_ms is not None:
+        where.append("bucket_ms < :end_ms")
+        params["end_ms"] = end_ms
+    return "WHERE " + " AND ".join(where), params
+
+
+def merge_overhead(conn, pending):
+    """
+    Merge per-minute stage sketches {(minute_ms, stage): DDSketch} into every
+    resolution of llm_overhead (caller owns the transaction).
+    """
+    # Several processes (or the collector and its own flusher) merge into the
+    # same rows: hold the write lock across the read-merge-write
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+    buckets = {}
+    for name, width in RESOLUTIONS:
+        for (minute, stage), sketch in pending.items():
+            key = (name, minute - minute % width, stage)
+            if key in buckets:
+                buckets[key].merge(sketch)
+            else:
+                buckets[key] = DDSketch().merge(sketch)
+
+    rows = []
+    for key, sketch in buckets.items():
+        row = conn.execute(
+            "SELECT sketch FROM llm_overhead WHERE resolution = ? AND bucket_ms = ? AND stage = ?", key
+        ).fetchone()
+        if row is not None:
+            sketch.merge(DDSketch.from_bytes(row[0]))
+        rows.append((*key, sketch.count, sketch.sum, sketch.max, sketch.to_bytes()))
+    conn.executemany(UPSERT_OVERHEAD_SQL, rows)
+    return len(rows)
+
+
+def overhead_rows(pending):
+    """Pending sketches as JSON-safe [minute_ms, stage, base64 sketch] rows for the collector."""
+    return [
+        [minute, stage, base64.b64encode(sketch.to_bytes()).decode("ascii")]
+        for (minute, stage), sketch in pending.items()
+    ]
+
+
+def merge_overhead_rows(conn, rows):
+    """merge_overhead for rows from overhead_rows (run by the collector on its writer thread)."""
+    return merge_overhead(conn, {
+        (minute, stage): DDSketch.from_bytes(base64.b64decode(data)) for minute, stage, data in rows
+    })
+
+
+class OverheadRecorder:
+    """
+    In-memory per-minute sketches of stage durations, merged into
+    llm_overhead by a background thread every `flush_interval` seconds.
+    In collector mode they are sent to the collector instead, and kept for
+    the next flush if it is unreachable.
+    """
+
+    def __init__(self, flush_interval=OVERHEAD_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, stage, ms):
+        ts = now_ms()
+        key = (ts - ts % _BUCKET_MS, stage)
+        with self._lock:
+            sketch = self._pending.get(key)
+            if sketch is None:
+                sketch = self._pending[key] = DDSketch()
+            sketch.add(ms)
+        self._ensure_flusher()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        # Imported here: core.logger records its own stages through this module
+        from core.logger import LLMLogger
+        collector = LLMLogger.collector()
+        if collector is not None:
+            if not collector.write("overhead", overhead_rows(pending)):
+                self._restore(pending)
+                return 0
+            return len(pending)
+
+        init_db()
+        conn = get_connection()
+        with conn:
+            return merge_overhead(conn, pending)
+
+    def _restore(self, pending):
+        # Sketches merge exactly, so unsent minutes simply fold into what was recorded since
+        with self._lock:
+            for key, sketch in pending.items():
+                current = self._pending.get(key)
+                self._pending[key] = sketch if current is None else sketch.merge(current)
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="overhead-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self._flush_at_exit)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[OVERHEAD] flush failed → {e}")
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            print(f"[OVERHEAD] flush failed → {e}")
+
+
+recorder = OverheadRecorder()
+
+
+# ============================================================
+# SPANS
+# ============================================================
+class Span:
+    """Times a `with` block as one sample of `stage`; adds it to `call` (a CallOverhead) if given."""
+
+    __slots__ = ("stage", "call", "start", "ms")
+
+    def __init__(self, stage, call=None):
+        self.stage = stage
+        self.call = call
+        self.ms = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self.start) * 1000
+        if OVERHEAD_ENABLED:
+            recorder.record(self.stage, self.ms)
+        if self.call is not None:
+            self.call.ms += self.ms
+        return False
+
+
+def span(stage):
+    return Span(stage)
+
+
+class CallOverhead:
+    """
+    The stages of one LLM call: stage(name) times a block, finish(llm_ms)
+    records the call's time in the client as "llm" and its stages' total as "pipeline".
+    """
+
+    def __init__(self):
+        self.ms = 0.0
+
+    def stage(self, name):
+        return Span(name, self)
+
+    def finish(self, llm_ms):
+        if OVERHEAD_ENABLED:
+            recorder.record("llm", llm_ms)
+            recorder.record("pipeline", self.ms)
+
+
+# ============================================================
+# SAMPLING PROFILER
+# ============================================================
+# One profile at a time per process: a call that is already being profiled
+# (or that overlaps one in another thread) is just run normally
+_profile_lock = threading.Lock()
+_profile_seq = itertools.count()
+
+
+class _CProfile:
+    suffix = ".prof"
+
+    def __init__(self):
+        import cProfile
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def save(self, path):
+        self.profiler.dump_stats(path)
+
+
+class _PyInstrument:
+    suffix = ".html"
+
+    def __init__(self):
+        from pyinstrument import Profiler
+        self.profiler = Profiler()
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.profiler.output_html())
+
+
+PROFILERS = {
+    "cprofile": _CProfile,
+    "pyinstrument": _PyInstrument,
+}
+
+
+def _make_profiler():
+    global PROFILER
+    try:
+        return PROFILERS.get(PROFILER, _CProfile)()
+    except ImportError:
+        print(f"[PROFILE] {PROFILER} is not installed, using cProfile (pip install {PROFILER})")
+        PROFILER = "cprofile"
+        return _CProfile()
+
+
+def _prune_profiles(keep=PROFILE_KEEP):
+    try:
+        paths = sorted(glob.glob(os.path.join(PROFILE_DIR, "*")), key=os.path.getmtime)
+    except OSError:
+        return          # another process pruned a file mid-listing; the next profile retries
+    for path in paths[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def maybe_profile(name, rate=None):
+    """
+    Profile the block for a sampled `rate` share of calls (default
+    LLM_OBS_PROFILE_RATE) and save it as PROFILE_DIR/<name>_<ts>_<pid>_<n>.prof
+    (.html for pyinstrument). Only the calling thread is profiled.
+    """
+    rate = PROFILE_RATE if rate is None else rate
+    if rate <= 0 or random.random() >= rate or not _profile_lock.acquire(blocking=False):
+        yield
+        return
+
+    try:
+        profiler = _make_profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path = os.path.join(PROFILE_DIR, f"{name}_{now_ms()}_{os.getpid()}_{next(_profile_seq)}{profiler.suffix}")
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profiler.save(path)
+                _prune_profiles()
+                print(f"[PROFILE] {name} → {path}")
+            except OSError as e:
+                print(f"[PROFILE] could not save {path} → {e}")
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,237 @@
+# core/payloads.py
+# Prompt/response bodies live in llm_payloads, keyed by a content hash (a
+# repeated system prompt is stored once) and zlib-compressed above a size
+# threshold. llm_logs keeps only the hashes and short previews, so the hot
+# table stays narrow for the aggregate queries.
+
+import sys
+import zlib
+import hashlib
+
+COMPRESS_THRESHOLD = 512         # bytes — smaller payloads are stored as-is
+ZLIB_LEVEL = 6
+PREVIEW_CHARS = 120
+
+# llm_payloads.encoding
+RAW = 0
+ZLIB = 1
+
+PAYLOADS_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_payloads (
+        hash BLOB PRIMARY KEY,
+        encoding INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        refs INTEGER NOT NULL DEFAULT 0,
+        data BLOB
+    )
+"""
+
+UPSERT_PAYLOAD_SQL = """
+    INSERT INTO llm_payloads (hash, encoding, size, refs, data)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (hash) DO UPDATE SET refs = refs + excluded.refs
+"""
+
+
+def encode_payload(text):
+    """text → (16-byte blake2b hash, encoding, size, data)."""
+    raw = text.encode("utf-8")
+    digest = hashlib.blake2b(raw, digest_size=16).digest()
+    if len(raw) >= COMPRESS_THRESHOLD:
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+        if len(packed) < len(raw):
+            return digest, ZLIB, len(raw), packed
+    return digest, RAW, len(raw), raw
+
+
+def decode_payload(data, encoding):
+    """Inverse of encode_payload; also registered as SQL payload_decode(data, encoding)."""
+    if data is None:
+        return None
+    if encoding == ZLIB:
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+
+def preview(text):
+    if text is None:
+        return None
+    return text[:PREVIEW_CHARS]
+
+
+# ============================================================
+# WRITE PATH
+# ============================================================
+def store_payloads(conn, events):
+    """
+    Store each event's prompt/response in llm_payloads and set
+    prompt_hash / response_hash / *_preview on the event for the log insert.
+    Bodies already stored only get their reference count bumped.
+    """
+    pending = {}
+    for e in events:
+        for field in ("prompt", "response"):
+            text = e.get(field)
+            if text is None:
+                e[f"{field}_hash"] = None
+                e[f"{field}_preview"] = None
+                continue
+            digest, encoding, size, data = encode_payload(text)
+            e[f"{field}_hash"] = digest
+            e[f"{field}_preview"] = preview(text)
+            entry = pending.get(digest)
+            if entry is None:
+                pending[digest] = [encoding, size, 1, data]
+            else:
+                entry[2] += 1
+
+    conn.executemany(UPSERT_PAYLOAD_SQL, [
+        (digest, encoding, size, refs, data)
+        for digest, (encoding, size, refs, data) in pending.items()
+    ])
+
+
+def release_payloads(conn, hashes):
+    """Drop one reference per hash; bodies nobody references any more are deleted."""
+    counts = {}
+    for h in hashes:
+        if h is not None:
+            counts[h] = counts.get(h, 0) + 1
+    conn.executemany("UPDATE llm_payloads SET refs = refs - ? WHERE hash = ?", [
+        (n, h) for h, n in counts.items()
+    ])
+    conn.executemany("DELETE FROM llm_payloads WHERE hash = ? AND refs <= 0", [
+        (h,) for h in counts
+    ])
+
+
+# ============================================================
+# READ PATH
+# ============================================================
+def load_payloads(conn, hashes):
+    """{hash: text} for the given hashes (missing / None hashes are skipped)."""
+    wanted = list({h for h in hashes if h is not None})
+    found = {}
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        rows = conn.execute(
+            f"SELECT hash, data, encoding FROM llm_payloads WHERE hash IN ({', '.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+        for digest, data, encoding in rows:
+            found[bytes(digest)] = decode_payload(data, encoding)
+    return found
+
+
+# One log row with its bodies decompressed (by :id), via the llm_logs_text view
+LOG_WITH_BODIES_SQL = """
+    SELECT l.*, t.prompt AS prompt_text, t.response AS response_text
+    FROM llm_logs l
+    JOIN llm_logs_text t ON t.rid = l.rowid
+    WHERE l.id = :id
+"""
+
+# Every log row with its bodies: legacy inline text wins until the row is migrated
+LOGS_TEXT_VIEW_SQL = """
+    CREATE VIEW IF NOT EXISTS llm_logs_text AS
+    SELECT
+        l.rowid AS rid,
+        COALESCE(l.prompt, payload_decode(p.data, p.encoding)) AS prompt,
+        COALESCE(l.response, payload_decode(r.data, r.encoding)) AS response,
+        l.error_type AS error_type
+    FROM llm_logs l
+    LEFT JOIN llm_payloads p ON p.hash = l.prompt_hash
+    LEFT JOIN llm_payloads r ON r.hash = l.response_hash
+"""
+
+
+# ============================================================
+# MIGRATION — inline TEXT → llm_payloads
+# ============================================================
+def migrate_inline_payloads(conn, chunk=5000):
+    """
+    Move prompt/response text still stored inline in llm_logs into
+    llm_payloads, one committed rowid chunk at a time (resumable).
+    Returns {rows, inline_bytes, stored_bytes, free_bytes}.
+    """
+    stored_before = conn.execute("SELECT TOTAL(length(data)) FROM llm_payloads").fetchone()[0]
+    report = {"rows": 0, "inline_bytes": 0}
+
+    last = 0
+    while True:
+        rows = conn.execute("""
+            SELECT rowid, prompt, response
+            FROM llm_logs
+            WHERE rowid > ? AND (prompt IS NOT NULL OR response IS NOT NULL)
+            ORDER BY rowid
+            LIMIT ?
+        """, (last, chunk)).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+
+        events = [{"prompt": p, "response": r} for _, p, r in rows]
+        with conn:
+            store_payloads(conn, events)
+            conn.executemany("""
+                UPDATE llm_logs SET
+                    prompt_hash = ?, response_hash = ?,
+                    prompt_preview = ?, response_preview = ?,
+                    prompt = NULL, response = NULL
+                WHERE rowid = ?
+            """, [
+                (e["prompt_hash"], e["response_hash"], e["prompt_preview"], e["response_preview"], row[0])
+                for e, row in zip(events, rows)
+            ])
+
+        report["rows"] += len(rows)
+        report["inline_bytes"] += sum(
+            len((p or "").encode("utf-8")) + len((r or "").encode("utf-8")) for _, p, r in rows
+        )
+
+    stored_after = conn.execute("SELECT TOTAL(length(data)) FROM llm_payloads").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    report["stored_bytes"] = int(stored_after - stored_before)
+    report["free_bytes"] = free_pages * page_size
+    return report
+
+
+def print_report(report):
+    mb = 1024 * 1024
+    saved = report["inline_bytes"] - report["stored_bytes"]
+    print(
+        f"[PAYLOADS] moved {report['rows']} row(s): {report['inline_bytes'] / mb:.1f} MB inline → "
+        f"{report['stored_bytes'] / mb:.1f} MB stored ({saved / mb:.1f} MB saved); "
+        f"{report['free_bytes'] / mb:.1f} MB of free pages reusable by SQLite"
+    )
+
+
+def payload_stats(conn):
+    row = conn.execute("""
+        SELECT COUNT(*), TOTAL(refs), TOTAL(size), TOTAL(length(data)),
+               TOTAL(encoding = 1)
+        FROM llm_payloads
+    """).fetchone()
+    return {
+        "payloads": row[0], "references": int(row[1]), "raw_bytes": int(row[2]),
+        "stored_bytes": int(row[3]), "compressed": int(row[4])
+    }
+
+
+if __name__ == "__main__":
+    # python -m core.payloads [migrate|stats]
+    from core.db import init_db, get_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    init_db()
+    conn = get_connection()
+
+    if command == "migrate":
+        print_report(migrate_inline_payloads(conn))
+    else:
+        s = payload_stats(conn)
+        print(
+            f"[PAYLOADS] {s['payloads']} bodies ({s['compressed']} compressed) for {s['references']} references: "
+            f"{s['raw_bytes']} bytes raw → {s['stored_bytes']} bytes stored"
+        )
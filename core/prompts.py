@@ -0,0 +1,203 @@
+# core/prompts.py
+# Prompt templates: each prompt is normalized (user data masked), hashed to a
+# 64-bit fingerprint stored on llm_logs.prompt_fp, and aggregated per
+# fingerprint in the prompt_templates dimension table.
+
+import re
+import hashlib
+
+TEMPLATE_MAX_CHARS = 2000        # templates / examples are stored truncated
+EXAMPLE_MAX_CHARS = 500
+
+# Applied in order; earlier patterns win over later ones
+_MASKS = [
+    (re.compile(r"https?://\S+"), "<URL>"),
+    (re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"), "<EMAIL>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<ID>"),
+    (re.compile(r'"[^"\n]{0,500}"|`[^`\n]{0,500}`'), '"<STR>"'),
+    (re.compile(r"(?<!\w)'[^'\n]{0,500}'(?!\w)"), '"<STR>"'),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?\b"), "<DATE>"),
+    # Tokens with 2+ digits mixed with letters: order ids, hashes, user123abc
+    (re.compile(r"\b(?=(?:[\w-]*\d){2})(?=[\w-]*[A-Za-z])[\w-]{6,}\b"), "<ID>"),
+    (re.compile(r"\b\d+(?:[.,:]\d+)*\b"), "<N>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def normalize_prompt(prompt):
+    """Mask numbers, ids, quoted values, emails and URLs so prompts from one template match."""
+    text = prompt or ""
+    for pattern, replacement in _MASKS:
+        text = pattern.sub(replacement, text)
+    return text.strip()[:TEMPLATE_MAX_CHARS]
+
+
+def template_fingerprint(template):
+    """Signed 64-bit integer (fits SQLite INTEGER) from blake2b of the template."""
+    digest = hashlib.blake2b(template.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def prompt_fingerprint(prompt):
+    """(fingerprint, template) for a raw prompt."""
+    template = normalize_prompt(prompt)
+    return template_fingerprint(template), template
+
+
+# ============================================================
+# STORAGE — prompt_templates
+# ============================================================
+PROMPT_TEMPLATES_SQL = """
+    CREATE TABLE IF NOT EXISTS prompt_templates (
+        fingerprint INTEGER PRIMARY KEY,
+        template TEXT,
+        example_prompt TEXT,
+        first_seen_ms INTEGER,
+        last_seen_ms INTEGER,
+        calls INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        sum_latency_ms REAL DEFAULT 0,
+        sum_tokens_in REAL DEFAULT 0,
+        sum_tokens_out REAL DEFAULT 0,
+        sum_cost_usd REAL DEFAULT 0,
+        sum_cost_inr REAL DEFAULT 0
+    )
+"""
+
+UPSERT_TEMPLATE_SQL = """
+    INSERT INTO prompt_templates
+    (fingerprint, template, example_prompt, first_seen_ms, last_seen_ms, calls, errors,
+     sum_latency_ms, sum_tokens_in, sum_tokens_out, sum_cost_usd, sum_cost_inr)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (fingerprint) DO UPDATE SET
+        first_seen_ms = MIN(first_seen_ms, excluded.first_seen_ms),
+        last_seen_ms = MAX(last_seen_ms, excluded.last_seen_ms),
+        calls = calls + excluded.calls,
+        errors = errors + excluded.errors,
+        sum_latency_ms = sum_latency_ms + excluded.sum_latency_ms,
+        sum_tokens_in = sum_tokens_in + excluded.sum_tokens_in,
+        sum_tokens_out = sum_tokens_out + excluded.sum_tokens_out,
+        sum_cost_usd = sum_cost_usd + excluded.sum_cost_usd,
+        sum_cost_inr = sum_cost_inr + excluded.sum_cost_inr
+"""
+
+
+def fingerprint_events(events):
+    """Set prompt_fp on each event that lacks one; returns {fingerprint: template}."""
+    templates = {}
+    for e in events:
+        if e.get("prompt_fp") is None:
+            fp, template = prompt_fingerprint(e.get("prompt"))
+            e["prompt_fp"] = fp
+            templates[fp] = template
+    return templates
+
+
+def _aggregate(rows, templates):
+    """rows: (fp, prompt, ts_ms, is_error, latency, tokens_in, tokens_out, cost_usd, cost_inr)."""
+    buckets = {}
+    for fp, prompt, ts, is_error, latency, t_in, t_out, usd, inr in rows:
+        b = buckets.get(fp)
+        if b is None:
+            template = templates.get(fp)
+            if template is None:
+                template = templates[fp] = normalize_prompt(prompt)
+            b = buckets[fp] = [
+                template, (prompt or "")[:EXAMPLE_MAX_CHARS], ts, ts, 0, 0, 0.0, 0.0, 0.0, 0.0, 0.0
+            ]
+        b[2] = min(b[2], ts)
+        b[3] = max(b[3], ts)
+        b[4] += 1
+        b[5] += 1 if is_error else 0
+        b[6] += latency or 0
+        b[7] += t_in or 0
+        b[8] += t_out or 0
+        b[9] += usd or 0
+        b[10] += inr or 0
+    return [(fp, *b) for fp, b in buckets.items()]
+
+
+def record_prompt_templates(conn, events, templates=None):
+    """Fold fingerprinted events into prompt_templates (caller owns the transaction)."""
+    templates = dict(templates or {})
+    rows = [
+        (e["prompt_fp"], e.get("prompt"), e["ts_ms"], e.get("error_type") is not None,
+         e.get("latency_ms"), e.get("tokens_in"), e.get("tokens_out"),
+         e.get("cost_usd"), e.get("cost_inr"))
+        for e in events
+    ]
+    conn.executemany(UPSERT_TEMPLATE_SQL, _aggregate(rows, templates))
+
+
+def backfill_prompt_fingerprints(conn, chunk=5000):
+    """
+    Fingerprint rows logged before prompt_fp existed, one committed rowid
+    chunk at a time, folding each chunk into prompt_templates.
+    """
+    last = 0
+    while True:
+        rows = conn.execute("""
+            SELECT rowid, prompt, ts_ms, error_type IS NOT NULL, latency_ms,
+                   tokens_in, tokens_out, cost_usd, cost_inr
+            FROM llm_logs
+            WHERE rowid > ? AND prompt_fp IS NULL
+            ORDER BY rowid
+            LIMIT ?
+        """, (last, chunk)).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+
+        templates, updates, agg_rows = {}, [], []
+        for rowid, prompt, *rest in rows:
+            fp, template = prompt_fingerprint(prompt)
+            templates[fp] = template
+            updates.append((fp, rowid))
+            agg_rows.append((fp, prompt, *rest))
+
+        with conn:
+            conn.executemany("UPDATE llm_logs SET prompt_fp = ? WHERE rowid = ?", updates)
+            conn.executemany(UPSERT_TEMPLATE_SQL, _aggregate(agg_rows, templates))
+
+
+def rebuild_prompt_templates(conn):
+    """Recompute the running aggregates of prompt_templates from llm_logs (caller owns the transaction)."""
+    conn.execute("""
+        UPDATE prompt_templates SET
+            calls = 0, errors = 0, sum_latency_ms = 0, sum_tokens_in = 0,
+            sum_tokens_out = 0, sum_cost_usd = 0, sum_cost_inr = 0
+    """)
+    conn.execute("""
+        UPDATE prompt_templates SET
+            first_seen_ms = agg.first_seen_ms, last_seen_ms = agg.last_seen_ms,
+            calls = agg.calls, errors = agg.errors,
+            sum_latency_ms = agg.sum_latency_ms, sum_tokens_in = agg.sum_tokens_in,
+            sum_tokens_out = agg.sum_tokens_out, sum_cost_usd = agg.sum_cost_usd,
+            sum_cost_inr = agg.sum_cost_inr
+        FROM (
+            SELECT prompt_fp, MIN(ts_ms) AS first_seen_ms, MAX(ts_ms) AS last_seen_ms,
+                   COUNT(*) AS calls, TOTAL(error_type IS NOT NULL) AS errors,
+                   TOTAL(latency_ms) AS sum_latency_ms, TOTAL(tokens_in) AS sum_tokens_in,
+                   TOTAL(tokens_out) AS sum_tokens_out, TOTAL(cost_usd) AS sum_cost_usd,
+                   TOTAL(cost_inr) AS sum_cost_inr
+            FROM llm_logs
+            WHERE prompt_fp IS NOT NULL
+            GROUP BY prompt_fp
+        ) AS agg
+        WHERE prompt_templates.fingerprint = agg.prompt_fp
+    """)
+
+
+# Per-template stats for the dashboard, straight from the dimension table
+TEMPLATE_STATS_SQL = """
+    SELECT
+        fingerprint, template, example_prompt, calls, errors,
+        100.0 * errors / NULLIF(calls, 0) AS "error_rate(%)",
+        sum_latency_ms / NULLIF(calls, 0) AS avg_latency,
+        sum_cost_usd AS total_cost_usd,
+        sum_cost_inr AS total_cost_inr,
+        sum_cost_inr / NULLIF(calls, 0) AS avg_cost_inr,
+        last_seen_ms
+    FROM prompt_templates
+    WHERE calls > 0
+"""
@@ -0,0 +1,434 @@
+# core/retention.py
+# Tiered retention for llm_logs:
+#   full     — rows younger than full_days keep their prompt/response bodies
+#   metadata — rows younger than meta_days keep every column except the bodies
+#   rollups  — older rows are deleted; rollups, sketches and templates remain
+#
+# A day leaving the full tier is first exported, bodies included, to
+# <archive_dir>/day=YYYY-MM-DD/part-0.parquet, so nothing is lost: the
+# dashboard's archive mode reads those files. Every step works in committed
+# chunks and its progress is recorded in llm_archive, so a run can be
+# interrupted and resumed, and LLMLogger never waits long on the write lock.
+
+import os
+import sys
+from datetime import datetime, timezone, timedelta
+
+from core.db import DB_PATH, init_db, get_connection
+from core.payloads import release_payloads, PREVIEW_CHARS
+from core.search import index_rows, unindex_rows
+from core.streaming import STREAM_COLUMNS
+
+RETAIN_FULL_DAYS = int(os.getenv("LLM_OBS_RETAIN_FULL_DAYS", "30"))
+RETAIN_META_DAYS = int(os.getenv("LLM_OBS_RETAIN_META_DAYS", "180"))
+ARCHIVE_DIR = os.path.abspath(
+    os.getenv("LLM_OBS_ARCHIVE_DIR") or os.path.join(os.path.dirname(DB_PATH), "llm_archive")
+)
+
+RETENTION_CHUNK = 2000           # rows per committed transaction
+VACUUM_PAGES = 500               # free pages returned to the OS after each chunk
+
+ARCHIVE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_archive (
+        day TEXT PRIMARY KEY,
+        path TEXT,
+        rows INTEGER,
+        bytes INTEGER,
+        archived_at TEXT,
+        bodies_dropped_at TEXT,
+        deleted_at TEXT
+    )
+"""
+
+# (column, Parquet type) of an archived row; `day` is the partition key.
+# Partitions written before a column was added read it back as null.
+ARCHIVE_COLUMNS = (
+    ("id", "string"), ("timestamp", "string"), ("ts_ms", "int64"),
+    ("session_id", "string"), ("user_id", "string"), ("model_name", "string"),
+    ("prompt", "string"), ("response", "string"),
+    ("tokens_in", "int64"), ("tokens_out", "int64"), ("latency_ms", "float64"),
+    ("cost_usd", "float64"), ("cost_inr", "float64"),
+    ("cost_display", "float64"), ("display_currency", "string"),
+    ("temperature", "float64"), ("error_type", "string"), ("rating", "int64"),
+    ("metadata", "string"), ("prompt_fp", "int64"),
+) + tuple((col, "float64") for col in STREAM_COLUMNS)
+
+_SQL_TYPES = {"string": "TEXT", "int64": "INTEGER", "float64": "REAL"}
+
+# One day of llm_logs with bodies, typed for Parquet (SQLite columns are loosely typed)
+ARCHIVE_DAY_SQL = f"""
+    SELECT {", ".join(
+        f"CAST({'t' if col in ('prompt', 'response') else 'l'}.{col} AS {_SQL_TYPES[kind]})"
+        for col, kind in ARCHIVE_COLUMNS
+    )}
+    FROM llm_logs l
+    JOIN llm_logs_text t ON t.rid = l.rowid
+    WHERE l.day = ?
+    ORDER BY l.ts_ms, l.id
+"""
+
+_HAS_BODY = """(
+    prompt_hash IS NOT NULL OR response_hash IS NOT NULL
+    OR prompt_preview IS NOT NULL OR response_preview IS NOT NULL
+    OR prompt IS NOT NULL OR response IS NOT NULL
+)"""
+
+
+class RetentionPolicy:
+    """Days of full rows and of metadata-only rows; older rows live only in rollups and the archive."""
+
+    def __init__(self, full_days=RETAIN_FULL_DAYS, meta_days=RETAIN_META_DAYS, archive_dir=ARCHIVE_DIR):
+        if full_days < 1 or meta_days < full_days:
+            raise ValueError("Retention needs 1 <= full_days <= meta_days")
+        self.full_days = full_days
+        self.meta_days = meta_days
+        self.archive_dir = archive_dir
+
+    def cutoffs(self, today=None):
+        """(full_cutoff, meta_cutoff) days: rows of earlier days lose bodies / are deleted."""
+        today = today or datetime.now(timezone.utc).date()
+        return (
+            (today - timedelta(days=self.full_days)).isoformat(),
+            (today - timedelta(days=self.meta_days)).isoformat()
+        )
+
+
+def retained_since(conn):
+    """
+    First day still (fully) present in llm_logs, or None if retention never
+    deleted anything. Rebuilds and checks must not reach before it.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'llm_archive'"
+    ).fetchone()
+    if not exists:
+        return None
+    row = conn.execute("SELECT MAX(day) FROM llm_archive WHERE deleted_at IS NOT NULL").fetchone()
+    if row[0] is None:
+        return None
+    return (datetime.fromisoformat(row[0]).date() + timedelta(days=1)).isoformat()
+
+
+def _stamp():
+    return datetime.utcnow().isoformat()
+
+
+# ============================================================
+# ARCHIVE (Parquet, one partition per day)
+# ============================================================
+def archive_schema():
+    import pyarrow as pa
+    return pa.schema([(col, getattr(pa, kind)()) for col, kind in ARCHIVE_COLUMNS])
+
+
+def partition_path(archive_dir, day):
+    return os.path.join(archive_dir, f"day={day}", "part-0.parquet")
+
+
+def export_day(conn, day, archive_dir, chunk=RETENTION_CHUNK):
+    """
+    Write every row of `day` (bodies decompressed) to its Parquet partition,
+    one row group per chunk. The file appears atomically, so a partial
+    export is never mistaken for a finished one. Returns (path, rows, bytes).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = archive_schema()
+    path = partition_path(archive_dir, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = os.path.join(os.path.dirname(path), "_part-0.parquet.tmp")       # '_' files are skipped by readers
+
+    rows = 0
+    cur = conn.execute(ARCHIVE_DAY_SQL, (day,))
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+        while True:
+            batch = cur.fetchmany(chunk)
+            if not batch:
+                break
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            ))
+            rows += len(batch)
+
+    os.replace(tmp, path)
+    return path, rows, os.path.getsize(path)
+
+
+def _archive_dataset(archive_dir):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    # An explicit schema: partitions archived before the stream columns existed read them as null
+    return ds.dataset(
+        archive_dir, format="parquet", schema=archive_schema().append(pa.field("day", pa.string())),
+        partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive")
+    )
+
+
+def read_archive(start_day, end_day, text=None, limit=None, archive_dir=ARCHIVE_DIR):
+    """
+    Archived rows for days in [start_day, end_day] as a DataFrame, newest
+    first, with prompt/response cut to previews. `text` keeps rows whose
+    prompt, response or error contains it (case-insensitive). Only the
+    partitions of the requested days are opened.
+    """
+    import pandas as pd
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    if not os.path.isdir(archive_dir):
+        return pd.DataFrame(columns=["day"] + [col for col, _ in ARCHIVE_COLUMNS])
+
+    where = (ds.field("day") >= start_day) & (ds.field("day") <= end_day)
+    if text:
+        where = where & (
+            pc.match_substring(ds.field("prompt"), text, ignore_case=True)
+            | pc.match_substring(ds.field("response"), text, ignore_case=True)
+            | pc.match_substring(ds.field("error_type"), text, ignore_case=True)
+        )
+
+    columns = {"day": ds.field("day")}
+    for col, _ in ARCHIVE_COLUMNS:
+        if col in ("prompt", "response"):
+            columns[col] = pc.utf8_slice_codeunits(ds.field(col), 0, PREVIEW_CHARS)
+        else:
+            columns[col] = ds.field(col)
+
+    table = _archive_dataset(archive_dir).to_table(columns=columns, filter=where)
+    df = table.to_pandas().sort_values(["ts_ms", "id"], ascending=False)
+    return df.head(limit) if limit else df
+
+
+def load_archived_log(day, log_id, archive_dir=ARCHIVE_DIR):
+    """One archived row with full bodies, or None."""
+    import pyarrow.dataset as ds
+
+    path = partition_path(archive_dir, day)
+    if not os.path.exists(path):
+        return None
+    # The full schema fills columns that older partitions lack with nulls
+    rows = ds.dataset(path, format="parquet", schema=archive_schema()).to_table(
+        filter=ds.field("id") == log_id
+    ).to_pylist()
+    if not rows:
+        return None
+    rows[0]["day"] = day
+    return rows[0]
+
+
+# ============================================================
+# RETENTION RUN
+# ============================================================
+def vacuum_step(conn, pages=VACUUM_PAGES):
+    """
+    Return up to `pages` free pages to the OS. Needs auto_vacuum=INCREMENTAL
+    (new databases; older ones after `python -m core.retention compact`);
+    otherwise free pages are simply reused by later inserts. Returns pages freed.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # execute() would stop after the first page; executescript() runs it to the end
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def drop_bodies(conn, day, chunk=RETENTION_CHUNK, vacuum_pages=VACUUM_PAGES):
+    """
+    Null out prompt/response (hashes, previews, legacy inline text) of one
+    day, chunk by chunk, releasing the payloads nobody else references.
+    Rows are re-indexed for search without their bodies. Returns (rows, pages freed).
+    """
+    last, rows, freed = 0, 0, 0
+    while True:
+        batch = conn.execute(f"""
+            SELECT rowid, prompt_hash, response_hash
+            FROM llm_logs
+            WHERE day = ? AND rowid > ? AND {_HAS_BODY}
+            ORDER BY rowid
+            LIMIT ?
+        """, (day, last, chunk)).fetchall()
+        if not batch:
+            break
+        last = batch[-1][0]
+
+        # Un-index first (it reads the old text), release payloads last
+        rowids = [rowid for rowid, _, _ in batch]
+        with conn:
+            unindex_rows(conn, rowids)
+            conn.executemany("""
+                UPDATE llm_logs SET
+                    prompt = NULL, response = NULL, prompt_hash = NULL, response_hash = NULL,
+                    prompt_preview = NULL, response_preview = NULL
+                WHERE rowid = ?
+            """, [(rowid,) for rowid in rowids])
+            index_rows(conn, rowids)
+            release_payloads(conn, [h for _, p, r in batch for h in (p, r)])
+        rows += len(batch)
+        freed += vacuum_step(conn, vacuum_pages)
+    return rows, freed
+
+
+def delete_day(conn, day, chunk=RETENTION_CHUNK, vacuum_pages=VACUUM_PAGES):
+    """Delete one day of llm_logs (and its multimodal rows) chunk by chunk. Returns (rows, pages freed)."""
+    with conn:
+        for table in ("llm_multimodal_inputs", "llm_multimodal_outputs"):
+            conn.execute(f"DELETE FROM {table} WHERE log_id IN (SELECT id FROM llm_logs WHERE day = ?)", (day,))
+
+    rows, freed = 0, 0
+    while True:
+        batch = conn.execute(
+            "SELECT rowid, prompt_hash, response_hash FROM llm_logs WHERE day = ? LIMIT ?",
+            (day, chunk)
+        ).fetchall()
+        if not batch:
+            break
+
+        rowids = [rowid for rowid, *_ in batch]
+        with conn:
+            unindex_rows(conn, rowids)
+            conn.executemany("DELETE FROM llm_logs WHERE rowid = ?", [(rowid,) for rowid in rowids])
+            release_payloads(conn, [h for _, p, r in batch for h in (p, r)])
+        rows += len(batch)
+        freed += vacuum_step(conn, vacuum_pages)
+    return rows, freed
+
+
+def run_retention(conn=None, policy=None, chunk=RETENTION_CHUNK, vacuum_pages=VACUUM_PAGES, today=None):
+    """
+    Apply `policy` oldest day first:
+      1. days older than full_days are exported to Parquet, then lose their bodies;
+      2. days older than meta_days are deleted (only once archived).
+    Resumable: finished steps are recorded per day in llm_archive.
+    Returns {archived_days, archived_rows, bodies_dropped, rows_deleted, pages_freed}.
+    """
+    conn = conn or get_connection()
+    policy = policy or RetentionPolicy()
+    full_cutoff, meta_cutoff = policy.cutoffs(today)
+    report = {"archived_days": 0, "archived_rows": 0, "bodies_dropped": 0, "rows_deleted": 0, "pages_freed": 0}
+
+    done = {
+        day: (archived, dropped)
+        for day, archived, dropped in conn.execute(
+            "SELECT day, archived_at, bodies_dropped_at FROM llm_archive"
+        )
+    }
+    days = [
+        row[0] for row in conn.execute(
+            "SELECT DISTINCT day FROM llm_logs WHERE day < ? ORDER BY day", (full_cutoff,)
+        )
+    ]
+
+    for day in days:
+        archived, dropped = done.get(day, (None, None))
+        if archived is None:
+            path, rows, size = export_day(conn, day, policy.archive_dir, chunk)
+            with conn:
+                conn.execute("""
+                    INSERT INTO llm_archive (day, path, rows, bytes, archived_at) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (day) DO UPDATE SET
+                        path = excluded.path, rows = excluded.rows,
+                        bytes = excluded.bytes, archived_at = excluded.archived_at
+                """, (day, path, rows, size, _stamp()))
+            report["archived_days"] += 1
+            report["archived_rows"] += rows
+
+        # Days about to be deleted skip the body pass; delete_day releases their payloads
+        if dropped is None and day >= meta_cutoff:
+            rows, freed = drop_bodies(conn, day, chunk, vacuum_pages)
+            with conn:
+                conn.execute("UPDATE llm_archive SET bodies_dropped_at = ? WHERE day = ?", (_stamp(), day))
+            report["bodies_dropped"] += rows
+            report["pages_freed"] += freed
+
+        if day < meta_cutoff:
+            rows, freed = delete_day(conn, day, chunk, vacuum_pages)
+            with conn:
+                conn.execute("UPDATE llm_archive SET deleted_at = ? WHERE day = ?", (_stamp(), day))
+            report["rows_deleted"] += rows
+            report["pages_freed"] += freed
+
+    return report
+
+
+def retention_status(conn=None, policy=None, today=None):
+    """Rows per tier under `policy`, archive size and reclaimable space."""
+    conn = conn or get_connection()
+    policy = policy or RetentionPolicy()
+    full_cutoff, meta_cutoff = policy.cutoffs(today)
+
+    row = conn.execute("""
+        SELECT
+            TOTAL(day >= :full),
+            TOTAL(day < :full AND day >= :meta),
+            TOTAL(day < :meta)
+        FROM llm_logs
+    """, {"full": full_cutoff, "meta": meta_cutoff}).fetchone()
+    archive = conn.execute("SELECT COUNT(*), TOTAL(rows), TOTAL(bytes) FROM llm_archive").fetchone()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+
+    return {
+        "full_cutoff": full_cutoff,
+        "meta_cutoff": meta_cutoff,
+        "full_rows": int(row[0]),
+        "metadata_rows": int(row[1]),
+        "expired_rows": int(row[2]),
+        "archived_days": archive[0],
+        "archived_rows": int(archive[1]),
+        "archive_bytes": int(archive[2]),
+        "retained_since": retained_since(conn),
+        "free_bytes": conn.execute("PRAGMA freelist_count").fetchone()[0] * page_size,
+        "incremental_vacuum": conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    }
+
+
+def compact(conn=None):
+    """
+    One-off full VACUUM that also switches an older database to
+    auto_vacuum=INCREMENTAL. Blocks writers while it runs; the search index
+    is rebuilt afterwards because VACUUM may renumber llm_logs rowids.
+    """
+    from core.search import rebuild_fts
+
+    conn = conn or get_connection()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    rebuild_fts(conn)
+
+
+if __name__ == "__main__":
+    # python -m core.retention [status|run|compact]
+    command = sys.argv[1] if len(sys.argv) > 1 else "status"
+    init_db()
+    conn = get_connection()
+    policy = RetentionPolicy()
+    mb = 1024 * 1024
+
+    if command == "run":
+        r = run_retention(conn, policy)
+        print(
+            f"[RETENTION] archived {r['archived_days']} day(s) / {r['archived_rows']} row(s), "
+            f"dropped bodies of {r['bodies_dropped']} row(s), deleted {r['rows_deleted']} row(s), "
+            f"freed {r['pages_freed']} page(s)"
+        )
+    elif command == "compact":
+        compact(conn)
+        print("[RETENTION] database vacuumed (auto_vacuum=INCREMENTAL) and search index rebuilt")
+    else:
+        s = retention_status(conn, policy)
+        print(
+            f"[RETENTION] full ≥ {s['full_cutoff']}: {s['full_rows']} row(s) · "
+            f"metadata ≥ {s['meta_cutoff']}: {s['metadata_rows']} row(s) · "
+            f"expired: {s['expired_rows']} row(s)"
+        )
+        print(
+            f"[RETENTION] archive: {s['archived_days']} day(s), {s['archived_rows']} row(s), "
+            f"{s['archive_bytes'] / mb:.1f} MB in {policy.archive_dir}"
+        )
+        print(
+            f"[RETENTION] {s['free_bytes'] / mb:.1f} MB free pages; incremental vacuum "
+            f"{'on' if s['incremental_vacuum'] else 'off (run `python -m core.retention compact` once)'}"
+        )
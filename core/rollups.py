@@ -0,0 +1,193 @@
+# core/rollups.py
+# Minute / hour / day pre-aggregates of llm_logs, keyed by
+# (bucket_ms, model_name, user_id, is_error) and maintained at write time.
+
+from core.utils import DAY_MS, now_ms
+
+# (name, bucket width in ms) — finest first
+RESOLUTIONS = [
+    ("minute", 60_000),
+    ("hour", 3_600_000),
+    ("day", DAY_MS),
+]
+RESOLUTION_MS = dict(RESOLUTIONS)
+
+# Charts ask for at least this many buckets before settling on a resolution
+MIN_CHART_POINTS = 24
+
+ROLLUP_SUMS = (
+    "requests", "sum_latency_ms", "sum_tokens_in", "sum_tokens_out", "sum_cost_usd", "sum_cost_inr",
+    "streamed", "sum_ttft_ms", "sum_tokens_per_s"
+)
+
+
+def rollup_table(resolution):
+    return f"llm_rollup_{resolution}"
+
+
+def create_rollup_tables(conn):
+    # NULL model/user are stored as '' so they take part in the primary key
+    for name, _ in RESOLUTIONS:
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {rollup_table(name)} (
+            bucket_ms INTEGER NOT NULL,
+            model_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            is_error INTEGER NOT NULL,
+            requests INTEGER DEFAULT 0,
+            sum_latency_ms REAL DEFAULT 0,
+            sum_tokens_in REAL DEFAULT 0,
+            sum_tokens_out REAL DEFAULT 0,
+            sum_cost_usd REAL DEFAULT 0,
+            sum_cost_inr REAL DEFAULT 0,
+            max_latency_ms REAL,
+            streamed INTEGER DEFAULT 0,
+            sum_ttft_ms REAL DEFAULT 0,
+            sum_tokens_per_s REAL DEFAULT 0,
+            PRIMARY KEY (bucket_ms, model_name, user_id, is_error)
+        ) WITHOUT ROWID
+        """)
+
+
+# ============================================================
+# WRITE PATH
+# ============================================================
+def record_rollups(conn, events):
+    """Fold new log events into every resolution (caller owns the transaction)."""
+    for name, width in RESOLUTIONS:
+        buckets = {}
+        for e in events:
+            key = (
+                e["ts_ms"] - e["ts_ms"] % width,
+                e.get("model_name") or "",
+                e.get("user_id") or "",
+                1 if e.get("error_type") is not None else 0
+            )
+            latency = e.get("latency_ms") or 0
+            b = buckets.setdefault(key, [0, 0.0, 0.0, 0.0, 0.0, 0.0, None, 0, 0.0, 0.0])
+            b[0] += 1
+            b[1] += latency
+            b[2] += e.get("tokens_in") or 0
+            b[3] += e.get("tokens_out") or 0
+            b[4] += e.get("cost_usd") or 0
+            b[5] += e.get("cost_inr") or 0
+            b[6] = latency if b[6] is None else max(b[6], latency)
+            b[7] += 1 if e.get("ttft_ms") is not None else 0
+            b[8] += e.get("ttft_ms") or 0
+            b[9] += e.get("tokens_per_s") or 0
+
+        conn.executemany(f"""
+            INSERT INTO {rollup_table(name)}
+            (bucket_ms, model_name, user_id, is_error, requests, sum_latency_ms, sum_tokens_in,
+             sum_tokens_out, sum_cost_usd, sum_cost_inr, max_latency_ms,
+             streamed, sum_ttft_ms, sum_tokens_per_s)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (bucket_ms, model_name, user_id, is_error) DO UPDATE SET
+                requests = requests + excluded.requests,
+                sum_latency_ms = sum_latency_ms + excluded.sum_latency_ms,
+                sum_tokens_in = sum_tokens_in + excluded.sum_tokens_in,
+                sum_tokens_out = sum_tokens_out + excluded.sum_tokens_out,
+                sum_cost_usd = sum_cost_usd + excluded.sum_cost_usd,
+                sum_cost_inr = sum_cost_inr + excluded.sum_cost_inr,
+                max_latency_ms = MAX(max_latency_ms, excluded.max_latency_ms),
+                streamed = streamed + excluded.streamed,
+                sum_ttft_ms = sum_ttft_ms + excluded.sum_ttft_ms,
+                sum_tokens_per_s = sum_tokens_per_s + excluded.sum_tokens_per_s
+        """, [(*key, *b) for key, b in buckets.items()])
+
+
+def rebuild_rollups(conn, since_ms=None):
+    """Recompute every resolution (buckets from since_ms on) from llm_logs (caller owns the transaction)."""
+    params = {"since_ms": since_ms}
+    for name, width in RESOLUTIONS:
+        table = rollup_table(name)
+        conn.execute(f"DELETE FROM {table} WHERE :since_ms IS NULL OR bucket_ms >= :since_ms", params)
+        conn.execute(f"""
+            INSERT INTO {table}
+            (bucket_ms, model_name, user_id, is_error, requests, sum_latency_ms, sum_tokens_in,
+             sum_tokens_out, sum_cost_usd, sum_cost_inr, max_latency_ms,
+             streamed, sum_ttft_ms, sum_tokens_per_s)
+            SELECT
+                ts_ms - ts_ms % {width}, COALESCE(model_name, ''), COALESCE(user_id, ''),
+                error_type IS NOT NULL,
+                COUNT(*), TOTAL(latency_ms), TOTAL(tokens_in), TOTAL(tokens_out),
+                TOTAL(cost_usd), TOTAL(cost_inr), MAX(COALESCE(latency_ms, 0)),
+                TOTAL(ttft_ms IS NOT NULL), TOTAL(ttft_ms), TOTAL(tokens_per_s)
+            FROM llm_logs
+            WHERE ts_ms IS NOT NULL AND (:since_ms IS NULL OR ts_ms >= :since_ms)
+            GROUP BY 1, 2, 3, 4
+        """, params)
+
+
+# ============================================================
+# READ PATH
+# ============================================================
+def pick_resolution(start_ms=None, end_ms=None, min_buckets=1):
+    """
+    Coarsest resolution that fits [start_ms, end_ms): both bounds fall on a
+    bucket edge (so totals are exact) and the range spans at least
+    `min_buckets` buckets. Falls back to the finest resolution.
+    """
+    span = None
+    if start_ms is not None:
+        span = (end_ms if end_ms is not None else now_ms()) - start_ms
+
+    for name, width in reversed(RESOLUTIONS):
+        if start_ms is not None and start_ms % width:
+            continue
+        if end_ms is not None and end_ms % width:
+            continue
+        if span is not None and span / width < min_buckets:
+            continue
+        return name
+    return RESOLUTIONS[0][0]
+
+
+def rollup_where(start_ms=None, end_ms=None, model=None, user=None, errors="All"):
+    """Dashboard filters → (WHERE clause, params) over a rollup table."""
+    where, params = [], {}
+    if start_ms is not None:
+        where.append("bucket_ms >= :start_ms")
+        params["start_ms"] = start_ms
+    if end_ms is not None:
+        where.append("bucket_ms < :end_ms")
+        params["end_ms"] = end_ms
+    if model is not None:
+        where.append("model_name = :model")
+        params["model"] = model
+    if user is not None:
+        where.append("user_id = :user")
+        params["user"] = user
+    if errors == "Only errors":
+        where.append("is_error = 1")
+    elif errors == "Only successful":
+        where.append("is_error = 0")
+    return ("WHERE " + " AND ".join(where)) if where else "", params
+
+
+# Shared by the KPI and time-series queries
+ROLLUP_AGGREGATES = """
+    TOTAL(requests) AS total_requests,
+    TOTAL(CASE WHEN is_error = 1 THEN requests ELSE 0 END) AS error_count,
+    TOTAL(sum_latency_ms) / NULLIF(TOTAL(requests), 0) AS avg_latency_ms,
+    MAX(max_latency_ms) AS max_latency_ms,
+    TOTAL(sum_tokens_in) AS total_tokens_in,
+    TOTAL(sum_tokens_out) AS total_tokens_out,
+    TOTAL(sum_cost_usd) AS total_cost_usd,
+    TOTAL(sum_cost_inr) AS total_cost_inr,
+    TOTAL(sum_ttft_ms) / NULLIF(TOTAL(streamed), 0) AS avg_ttft_ms,
+    TOTAL(sum_tokens_per_s) / NULLIF(TOTAL(streamed), 0) AS avg_tokens_per_s
+"""
+
+
+def kpi_sql(resolution, where):
+    return f"SELECT {ROLLUP_AGGREGATES} FROM {rollup_table(resolution)} {where}"
+
+
+def series_sql(resolution, where):
+    return f"""
+        SELECT bucket_ms, {ROLLUP_AGGREGATES}
+        FROM {rollup_table(resolution)} {where}
+        GROUP BY bucket_ms
+        ORDER BY bucket_ms
+    """
@@ -0,0 +1,140 @@
+# core/router.py
+
+from core.cache import RefreshingCache
+from core.db import connect
+from core.utils import now_ms, percentile
+
+# ------- Routing defaults -------
+PREFERRED_FAMILIES = ["llama", "mixtral", "gemma"]
+MODEL_CATALOG_TTL = 600          # s — models.list() is refreshed in the background
+STATS_TTL = 30                   # s — recent latency/error stats per model
+STATS_WINDOW_MIN = 15            # only look at the last N minutes of llm_logs
+MIN_SAMPLES = 5                  # below this a model's stats are not trusted
+MAX_ERROR_RATE = 0.25            # fail over when a model's recent error rate exceeds this
+
+
+def load_model_stats(window_min=STATS_WINDOW_MIN):
+    """
+    Recent per-model stats from llm_logs: {model: {calls, errors, error_rate, p95_ms}}.
+    Range-scans idx_logs_ts_id over the window only.
+    """
+    conn = connect(readonly=True)
+    try:
+        rows = conn.execute("""
+            SELECT model_name, latency_ms, error_type IS NOT NULL
+            FROM llm_logs
+            WHERE ts_ms >= ?
+        """, (now_ms() - window_min * 60_000,)).fetchall()
+    finally:
+        conn.close()
+
+    grouped = {}
+    for model, latency, is_error in rows:
+        g = grouped.setdefault(model, {"latencies": [], "errors": 0})
+        g["errors"] += is_error
+        if not is_error and latency is not None:
+            g["latencies"].append(latency)
+
+    stats = {}
+    for model, g in grouped.items():
+        calls = len(g["latencies"]) + g["errors"]
+        stats[model] = {
+            "calls": calls,
+            "errors": g["errors"],
+            "error_rate": g["errors"] / calls,
+            "p95_ms": percentile(sorted(g["latencies"]), 95)
+        }
+    return stats
+
+
+class ModelRouter:
+    """
+    Picks a model per request from the cached catalog using recent stats:
+    lowest recent p95 latency within the preferred family, skipping models
+    whose error rate spiked, and failing over to the next family if needed.
+    """
+
+    def __init__(
+        self,
+        list_models,
+        families=None,
+        catalog_ttl=MODEL_CATALOG_TTL,
+        stats_ttl=STATS_TTL,
+        min_samples=MIN_SAMPLES,
+        max_error_rate=MAX_ERROR_RATE
+    ):
+        self.families = families or PREFERRED_FAMILIES
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.catalog = RefreshingCache(list_models, ttl=catalog_ttl, name="model-catalog")
+        self.stats = RefreshingCache(load_model_stats, ttl=stats_ttl, name="model-stats")
+
+    def warm_up(self):
+        """Fetch catalog and stats in the background so the first request does not wait."""
+        self.catalog.prefetch()
+        self.stats.prefetch()
+
+    def _healthy(self, stat):
+        if stat is None or stat["calls"] < self.min_samples:
+            return True
+        return stat["error_rate"] <= self.max_error_rate
+
+    def choose(self):
+        """Returns (model_id, decision) — decision is a dict suitable for log metadata."""
+        model_ids = self.catalog.get()
+        if not model_ids:
+            raise RuntimeError("Model catalog is empty")
+
+        # Stats never block a request; until the first load lands we route by catalog order
+        stats = self.stats.peek({})
+
+        families = [
+            (fam, [m for m in model_ids if fam in m.lower()]) for fam in self.families
+        ]
+        families.append(("other", list(model_ids)))
+
+        skipped = []
+        for fam, candidates in families:
+            if not candidates:
+                continue
+
+            healthy = [m for m in candidates if self._healthy(stats.get(m))]
+            skipped += [m for m in candidates if m not in healthy and m not in skipped]
+            if not healthy:
+                continue
+
+            # Lowest recent p95 among models with enough samples; otherwise keep
+            # catalog order (the previous "first match in family" behaviour)
+            measured = [
+                m for m in healthy
+                if stats.get(m) and stats[m]["calls"] >= self.min_samples and stats[m]["p95_ms"] is not None
+            ]
+            if measured:
+                model = min(measured, key=lambda m: stats[m]["p95_ms"])
+                policy = "lowest_p95"
+            else:
+                model = healthy[0]
+                policy = "catalog_order"
+
+            stat = stats.get(model) or {}
+            return model, {
+                "model": model,
+                "family": fam,
+                "policy": policy,
+                "p95_ms": stat.get("p95_ms"),
+                "error_rate": stat.get("error_rate"),
+                "candidates": len(healthy),
+                "failed_over": skipped
+            }
+
+        # Every model is unhealthy: pick the least failing one
+        model = min(model_ids, key=lambda m: (stats.get(m) or {}).get("error_rate", 0))
+        return model, {
+            "model": model,
+            "family": None,
+            "policy": "least_errors",
+            "p95_ms": (stats.get(model) or {}).get("p95_ms"),
+            "error_rate": (stats.get(model) or {}).get("error_rate"),
+            "candidates": 0,
+            "failed_over": skipped
+        }
@@ -0,0 +1,175 @@
+# core/search.py
+# Full-text search over llm_logs (prompt, response, error_type) with FTS5.
+#
+# llm_logs_fts is an external-content index over the llm_logs_text view
+# (bodies decompressed from llm_payloads, see core.payloads). It is kept in
+# step from Python, not by triggers: LLMLogger.write_events indexes new rows
+# with the text it already holds, and retention un-indexes rows before it
+# drops their bodies or deletes them. Other writers (the sqlite3 CLI, scripts)
+# therefore never need the payload_decode UDF; rows they insert, at any rowid,
+# are picked up by `backfill`. snippet() reads the matched text back through
+# the view by rowid.
+
+import sys
+
+from core.db import init_db, get_connection
+
+FTS_TABLE = "llm_logs_fts"
+FTS_BACKFILL_CHUNK = 20_000
+SNIPPET_TOKENS = 16
+
+FTS_SCHEMA_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        prompt, response, error_type,
+        content='llm_logs_text',
+        content_rowid='rid',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+]
+
+# Triggers that kept the index in step up to schema v15 (dropped by v16)
+_FTS_TRIGGERS = (
+    "llm_logs_fts_insert", "llm_logs_fts_delete", "llm_logs_fts_update",
+    "llm_logs_fts_update_old", "llm_logs_fts_update_new"
+)
+
+
+def create_fts(conn):
+    for sql in FTS_SCHEMA_SQL:
+        conn.execute(sql)
+
+
+def drop_fts_triggers(conn):
+    """Drop the pre-v16 index triggers (migration, and bulk loads into older schemas)."""
+    for name in _FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def drop_fts(conn):
+    drop_fts_triggers(conn)
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+# ============================================================
+# INDEXING — run by the writers, inside their transaction
+# ============================================================
+INDEX_EVENT_SQL = f"""
+    INSERT INTO {FTS_TABLE} (rowid, prompt, response, error_type)
+    SELECT rowid, ?, ?, ? FROM llm_logs WHERE id = ?
+"""
+
+
+def index_events(conn, events):
+    """Index just-inserted log events from their in-memory text (caller owns the transaction)."""
+    conn.executemany(INDEX_EVENT_SQL, [
+        (e.get("prompt"), e.get("response"), e.get("error_type"), e["id"]) for e in events
+    ])
+
+
+def index_rows(conn, rowids):
+    """Index llm_logs rows by rowid, reading their text through llm_logs_text."""
+    conn.executemany(f"""
+        INSERT INTO {FTS_TABLE} (rowid, prompt, response, error_type)
+        SELECT rid, prompt, response, error_type FROM llm_logs_text WHERE rid = ?
+    """, [(rowid,) for rowid in rowids])
+
+
+def unindex_rows(conn, rowids):
+    """
+    Remove llm_logs rows from the index. 'delete' needs the indexed text, so
+    this must run while the rows and their payloads still exist. Rows never
+    indexed (written by another writer, not yet backfilled) are skipped.
+    """
+    conn.executemany(f"""
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, prompt, response, error_type)
+        SELECT 'delete', rid, prompt, response, error_type FROM llm_logs_text
+        WHERE rid = ?1 AND EXISTS (SELECT 1 FROM {FTS_TABLE}_docsize WHERE id = ?1)
+    """, [(rowid,) for rowid in rowids])
+
+
+# ============================================================
+# BACKFILL / MAINTENANCE
+# ============================================================
+def backfill_fts(conn, chunk=FTS_BACKFILL_CHUNK):
+    """
+    Index every llm_logs row missing from the index (rows logged before the
+    index existed, bulk loads, rows inserted by other writers at any rowid),
+    in rowid order and chunks (one commit per chunk). Resumable.
+    Returns the number of rows indexed.
+    """
+    last, total = 0, 0
+    while True:
+        rowids = [r[0] for r in conn.execute(f"""
+            SELECT l.rowid FROM llm_logs l
+            WHERE l.rowid > ?
+              AND NOT EXISTS (SELECT 1 FROM {FTS_TABLE}_docsize d WHERE d.id = l.rowid)
+            ORDER BY l.rowid
+            LIMIT ?
+        """, (last, chunk))]
+        if not rowids:
+            break
+        with conn:
+            index_rows(conn, rowids)
+        total += len(rowids)
+        last = rowids[-1]
+    return total
+
+
+def rebuild_fts(conn):
+    """Repair: re-create the whole index from llm_logs_text (e.g. after a full VACUUM)."""
+    with conn:
+        conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def optimize_fts(conn):
+    """Merge index segments; worth running after large backfills."""
+    with conn:
+        conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+
+
+# ============================================================
+# QUERYING
+# ============================================================
+def quote_fts(text):
+    """Plain-text fallback: every word becomes a quoted term (implicit AND)."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def search_sql(columns, limit=True):
+    """
+    Ranked search over llm_logs for `:q` (FTS5 query syntax: "phrases",
+    prefix*, AND / OR / NOT, column filters like prompt:foo).
+    `columns` are SQL expressions over llm_logs aliased as `l`.
+    Adds prompt_snippet / response_snippet with [matches] marked and a bm25 score.
+    """
+    return f"""
+        SELECT
+            {", ".join(columns)},
+            snippet({FTS_TABLE}, 0, '[', ']', '…', {SNIPPET_TOKENS}) AS prompt_snippet,
+            snippet({FTS_TABLE}, 1, '[', ']', '…', {SNIPPET_TOKENS}) AS response_snippet,
+            bm25({FTS_TABLE}) AS score
+        FROM {FTS_TABLE}
+        JOIN llm_logs l ON l.rowid = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :q
+        ORDER BY rank
+        {"LIMIT :limit" if limit else ""}
+    """
+
+
+if __name__ == "__main__":
+    # python -m core.search [backfill|rebuild|optimize]
+    command = sys.argv[1] if len(sys.argv) > 1 else "backfill"
+    init_db()
+    conn = get_connection()
+
+    if command == "rebuild":
+        rebuild_fts(conn)
+        print(f"[SEARCH] {FTS_TABLE} rebuilt from llm_logs")
+    elif command == "optimize":
+        optimize_fts(conn)
+        print(f"[SEARCH] {FTS_TABLE} optimized")
+    else:
+        n = backfill_fts(conn)
+        print(f"[SEARCH] {n} row(s) indexed")
@@ -0,0 +1,277 @@
+# core/sketch.py
+# DDSketch-style latency sketches: log-spaced bins with a fixed relative
+# error, mergeable by adding counts, stored per (metric, resolution, bucket, model).
+
+import math
+
+from core.rollups import RESOLUTIONS
+
+RELATIVE_ACCURACY = 0.01         # every quantile is within ±1% of the true value
+MIN_VALUE = 1e-3                 # values at or below this count as zero
+SKETCH_FORMAT = 1                # first byte of a serialized sketch
+
+# Metrics sketched from each log event (successful calls only; ttft_ms only exists for streamed calls)
+SKETCH_METRICS = ("latency_ms", "ttft_ms")
+
+
+class DDSketch:
+    """
+    Quantile sketch with relative error `alpha`: value x lands in bin
+    ceil(log_gamma(x)), gamma = (1 + alpha) / (1 - alpha). Two sketches with
+    the same alpha merge exactly by adding bin counts.
+    """
+
+    def __init__(self, alpha=RELATIVE_ACCURACY):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, n=1):
+        if value <= MIN_VALUE:
+            self.zero_count += n
+        else:
+            i = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.count += n
+        self.sum += value * n
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError("Cannot merge sketches with different accuracy")
+        for i, c in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def bin_value(self, i):
+        # Midpoint (in relative terms) of bin i: (gamma^(i-1), gamma^i]
+        return 2 * self.gamma ** i / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Nearest-rank q-th percentile (q in 0–100); None if empty."""
+        if not self.count:
+            return None
+        target = max(1, math.ceil(q / 100 * self.count))
+        if target <= self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if seen >= target:
+                # Clamp to the exact extremes so p0/p100 are not approximated
+                return min(max(self.bin_value(i), self.min), self.max)
+        return self.max
+
+    def histogram(self, max_bars=30):
+        """[(lower_ms, upper_ms, count)] with adjacent bins combined into ≤ max_bars bars."""
+        if not self.bins:
+            return [(0.0, MIN_VALUE, self.zero_count)] if self.zero_count else []
+        lo, hi = min(self.bins), max(self.bins)
+        step = max(1, math.ceil((hi - lo + 1) / max_bars))
+        bars = []
+        if self.zero_count:
+            bars.append((0.0, MIN_VALUE, self.zero_count))
+        for start in range(lo, hi + 1, step):
+            count = sum(self.bins.get(i, 0) for i in range(start, start + step))
+            bars.append((self.gamma ** (start - 1), self.gamma ** (start + step - 1), count))
+        return bars
+
+    # ---------------- SERIALIZATION ----------------
+    def to_bytes(self):
+        """
+        Format byte, then varints: zero_count, number of bins, and per bin the
+        zigzag delta of its index and its count; then sum/min/max as text.
+        A few hundred bytes even for wide latency ranges.
+        """
+        out = bytearray([SKETCH_FORMAT])
+        _put_varint(out, self.zero_count)
+        _put_varint(out, len(self.bins))
+        prev = 0
+        for i in sorted(self.bins):
+            _put_varint(out, _zigzag(i - prev))
+            _put_varint(out, self.bins[i])
+            prev = i
+        out += f"{self.alpha!r},{self.sum!r},{self.min!r},{self.max!r}".encode()
+        return bytes(out)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data or data[0] != SKETCH_FORMAT:
+            raise ValueError("Unknown sketch format")
+        pos = 1
+        zero_count, pos = _get_varint(data, pos)
+        n_bins, pos = _get_varint(data, pos)
+        bins, prev = {}, 0
+        for _ in range(n_bins):
+            delta, pos = _get_varint(data, pos)
+            count, pos = _get_varint(data, pos)
+            prev += _unzigzag(delta)
+            bins[prev] = count
+        alpha, total, lo, hi = data[pos:].decode().split(",")
+
+        sketch = cls(float(alpha))
+        sketch.bins = bins
+        sketch.zero_count = zero_count
+        sketch.count = zero_count + sum(bins.values())
+        sketch.sum = float(total)
+        sketch.min = None if lo == "None" else float(lo)
+        sketch.max = None if hi == "None" else float(hi)
+        return sketch
+
+
+def _zigzag(n):
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n):
+    return n // 2 if n % 2 == 0 else -(n + 1) // 2
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    shift = result = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+# ============================================================
+# STORAGE — llm_sketches
+# ============================================================
+SKETCH_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS llm_sketches (
+        metric TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        bucket_ms INTEGER NOT NULL,
+        model_name TEXT NOT NULL,
+        sketch BLOB NOT NULL,
+        PRIMARY KEY (metric, resolution, bucket_ms, model_name)
+    ) WITHOUT ROWID
+"""
+
+UPSERT_SKETCH_SQL = """
+    INSERT INTO llm_sketches (metric, resolution, bucket_ms, model_name, sketch)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (metric, resolution, bucket_ms, model_name) DO UPDATE SET sketch = excluded.sketch
+"""
+
+
+def _sketch_values(events):
+    """(model, ts_ms, metric, value) for every sketched metric of every successful event."""
+    for e in events:
+        if e.get("error_type") is not None:
+            continue
+        for metric in SKETCH_METRICS:
+            value = e.get(metric)
+            if value is not None:
+                yield e.get("model_name") or "", e["ts_ms"], metric, value
+
+
+def record_sketches(conn, events):
+    """
+    Merge new events into the stored sketches of every resolution.
+    Must run after the log insert, inside the caller's write transaction,
+    so the read-merge-write of each sketch cannot race another writer.
+    """
+    values = list(_sketch_values(events))
+    if not values:
+        return
+
+    for name, width in RESOLUTIONS:
+        pending = {}
+        for model, ts, metric, value in values:
+            key = (metric, name, ts - ts % width, model)
+            pending.setdefault(key, DDSketch()).add(value)
+
+        rows = []
+        for key, sketch in pending.items():
+            row = conn.execute(
+                "SELECT sketch FROM llm_sketches WHERE metric = ? AND resolution = ? AND bucket_ms = ? AND model_name = ?",
+                key
+            ).fetchone()
+            if row is not None:
+                sketch.merge(DDSketch.from_bytes(row[0]))
+            rows.append((*key, sketch.to_bytes()))
+        conn.executemany(UPSERT_SKETCH_SQL, rows)
+
+
+def rebuild_sketches(conn, since_ms=None, chunk=5000):
+    """Recompute llm_sketches (buckets from since_ms on) from llm_logs (caller owns the transaction)."""
+    params = {"since_ms": since_ms}
+    conn.execute("DELETE FROM llm_sketches WHERE :since_ms IS NULL OR bucket_ms >= :since_ms", params)
+    cols = ", ".join(SKETCH_METRICS)
+    for name, width in RESOLUTIONS:
+        sketches = {}
+        cur = conn.execute(f"""
+            SELECT COALESCE(model_name, ''), ts_ms - ts_ms % {width}, {cols}
+            FROM llm_logs
+            WHERE ts_ms IS NOT NULL AND error_type IS NULL
+              AND (:since_ms IS NULL OR ts_ms >= :since_ms)
+        """, params)
+        while True:
+            batch = cur.fetchmany(chunk)
+            if not batch:
+                break
+            for model, bucket, *values in batch:
+                for metric, value in zip(SKETCH_METRICS, values):
+                    if value is not None:
+                        sketches.setdefault((metric, name, bucket, model), DDSketch()).add(value)
+        conn.executemany(UPSERT_SKETCH_SQL, [
+            (*key, sketch.to_bytes()) for key, sketch in sketches.items()
+        ])
+
+
+def sketch_range_sql(metric, resolution, start_ms=None, end_ms=None, model=None):
+    """
+    (query, params) for the stored sketches of one metric over a range.
+    None means "any"; open bounds are left out so the primary key is
+    range-seeked on bucket_ms.
+    """
+    where = ["metric = :metric", "resolution = :resolution"]
+    params = {"metric": metric, "resolution": resolution}
+    if start_ms is not None:
+        where.append("bucket_ms >= :start_ms")
+        params["start_ms"] = start_ms
+    if end_ms is not None:
+        where.append("bucket_ms < :end_ms")
+        params["end_ms"] = end_ms
+    if model is not None:
+        where.append("model_name = :model")
+        params["model"] = model
+    return f"SELECT model_name, sketch FROM llm_sketches WHERE {' AND '.join(where)}", params
+
+
+def merge_sketch_rows(rows):
+    """[(model_name, blob), ...] → {model_name: DDSketch}, merged per model."""
+    merged = {}
+    for model, blob in rows:
+        sketch = DDSketch.from_bytes(blob)
+        if model in merged:
+            merged[model].merge(sketch)
+        else:
+            merged[model] = sketch
+    return merged
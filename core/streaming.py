@@ -0,0 +1,80 @@
+# core/streaming.py
+# Timing of streamed completions: time to first token (TTFT), generation
+# time, tokens/sec and inter-token latency (ITL) percentiles.
+
+import time
+
+from core.utils import percentile
+
+# Columns written to llm_logs for streamed calls (NULL for non-streamed ones)
+STREAM_COLUMNS = ("ttft_ms", "gen_ms", "tokens_per_s", "itl_p50_ms", "itl_p95_ms", "itl_p99_ms")
+
+
+class StreamTimer:
+    """
+    Call start() right before sending the request and mark() as each
+    content chunk arrives; metrics() then summarizes the stream.
+    """
+
+    def __init__(self):
+        self.started = None
+        self.first = None
+        self.last = None
+        self.chunks = 0
+        self.gaps = []
+
+    def start(self):
+        self.started = time.perf_counter()
+        return self
+
+    def mark(self):
+        now = time.perf_counter()
+        if self.first is None:
+            self.first = now
+        else:
+            self.gaps.append((now - self.last) * 1000)
+        self.last = now
+        self.chunks += 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def metrics(self, tokens_out=None):
+        """
+        {ttft_ms, gen_ms, tokens_per_s, itl_p50_ms, itl_p95_ms, itl_p99_ms}.
+        tokens/sec is over the generation phase (first to last token) and uses
+        the provider's completion token count when given, else the chunk count.
+        All None if no content arrived.
+        """
+        if self.first is None:
+            return dict.fromkeys(STREAM_COLUMNS)
+
+        gen_ms = (self.last - self.first) * 1000
+        tokens = tokens_out or self.chunks
+        gaps = sorted(self.gaps)
+        return {
+            "ttft_ms": (self.first - self.started) * 1000,
+            "gen_ms": gen_ms,
+            # After the first token, tokens - 1 more arrived during gen_ms
+            "tokens_per_s": (tokens - 1) / (gen_ms / 1000) if gen_ms > 0 and tokens > 1 else None,
+            "itl_p50_ms": percentile(gaps, 50),
+            "itl_p95_ms": percentile(gaps, 95),
+            "itl_p99_ms": percentile(gaps, 99),
+        }
+
+
+def chunk_text(chunk):
+    """Content delta of one streamed chat.completions chunk ('' if none)."""
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    delta = getattr(choices[0], "delta", None)
+    return getattr(delta, "content", None) or ""
+
+
+def chunk_usage(chunk):
+    """Usage carried by a streamed chunk: OpenAI-style `usage` or Groq's `x_groq.usage`."""
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
@@ -0,0 +1,633 @@
+# core/synth.py
+# Large synthetic datasets for capacity planning and the dashboard benchmarks.
+# Every column is sampled with NumPy a chunk at a time and bulk-loaded with
+# executemany, one transaction per chunk:
+#   traffic     — diurnal (UTC afternoon peak) with quieter weekends
+#   models      — per-model traffic share, TTFT, tokens/s, error rate and price
+#   errors      — a low base rate plus bursts: one model failing (and slow) for minutes
+#   prompts     — Zipf-distributed reuse of a pool of prompts built from templates
+#   users       — Zipf activity over --users; a session is a user's 30-minute window
+# plus multimodal inputs/outputs on a few calls and the alert incidents the
+# bursts and slow hours would have raised.
+#
+# The database is written at whatever schema version it is at (a new file is
+# created at --schema-version, default latest): only existing columns are
+# filled, and bodies go to llm_payloads only once it exists. Same --seed and
+# --end give the same rows.
+
+import sys
+import json
+import time
+import uuid
+import argparse
+
+import numpy as np
+
+from core.alerts import (
+    LATENCY_STATIC, TTFT_STATIC, ERROR_RATE_STATIC, MIN_WINDOW_EVENTS, alert_fingerprint
+)
+from core.currency import DISPLAY_CURRENCY, FALLBACK_RATES
+from core.streaming import STREAM_COLUMNS
+from core.utils import now_ms, iso_to_ms
+
+SYNTH_CHUNK = 200_000            # rows per transaction (fixed: the sampling is seeded per chunk)
+HOUR_MS = 3_600_000
+DAY_MS = 86_400_000
+SESSION_MS = 30 * 60_000
+
+# name: (traffic share, median TTFT ms, median tokens/s, base error rate, USD per 1M tokens in / out)
+MODEL_PROFILES = {
+    "llama-3.1-8b-instant":    (0.45, 180, 750, 0.010, 0.05, 0.08),
+    "llama-3.3-70b-versatile": (0.30, 350, 275, 0.015, 0.59, 0.79),
+    "mixtral-8x7b-32768":      (0.15, 260, 480, 0.020, 0.24, 0.24),
+    "gemma2-9b-it":            (0.10, 200, 600, 0.010, 0.20, 0.20),
+}
+
+PROMPT_TEMPLATES = (
+    "Summarize ticket #{n} for the support team",
+    "Translate order {n} confirmation into Hindi",
+    "Write a SQL query that returns the top {r} customers by revenue for region {n}",
+    "Explain error code E{n} in plain words",
+    "Draft a reply to review {n} from a customer who rated us {r} stars",
+    "Extract the invoice total from document {n}",
+    "What is the refund policy for order {n}?",
+    "Rewrite paragraph {r} of onboarding guide {n} in a friendlier tone",
+    "Generate {r} multiple-choice questions about chapter {n}",
+    "You are a support assistant for an online store. Answer only from the policy below, "
+    "cite the section you used, and say so when the policy does not cover the question. "
+    "Policy: orders ship within 2 business days; returns are accepted within 30 days of "
+    "delivery when the item is unused and in its original packaging; refunds go back to "
+    "the original payment method within 5 to 7 business days of the return being received; "
+    "gift cards and final-sale items cannot be returned; damaged items are replaced free of "
+    "charge when reported within 48 hours with a photo. Question about order {n}: can I "
+    "return it after {r} days?",
+)
+RESPONSE_SENTENCES = (
+    "Here is a short summary of the request.",
+    "The customer reports that the order arrived late and asks for a partial refund.",
+    "Based on the policy, the item can be returned within the stated window.",
+    "The query groups orders by customer and sorts them by total revenue.",
+    "This error usually means the upstream service timed out.",
+    "Please retry the operation after a few seconds.",
+    "Let me know if you need anything else.",
+)
+PROMPT_POOL = 20_000             # distinct prompt texts
+RESPONSE_POOL = 5_000            # distinct response texts (cached / templated answers)
+PROMPT_ZIPF = 1.1
+USER_ZIPF = 1.2
+
+STREAMED_SHARE = 0.3
+RATED_SHARE = 0.05
+INPUT_SHARE = 0.03               # calls with a multimodal input
+OUTPUT_SHARE = 0.01              # calls with a multimodal output
+TEMPERATURES = ((0.0, 0.15), (0.2, 0.25), (0.7, 0.5), (1.0, 0.1))
+INPUT_TYPES = (("image", "png", 0.7), ("audio", "mp3", 0.15), ("pdf", "pdf", 0.15))
+
+BURSTS_PER_DAY = 0.5
+BURST_MINUTES = (5, 45)
+BURST_ERROR_RATE = 0.4
+BURST_SLOWDOWN = 2.5
+WEEKEND_TRAFFIC = 0.6
+SLOW_HOUR_SHARE = 0.1            # share of calls over the threshold that makes a model-hour an incident,
+SLOW_HOUR_RATIO = 2.0            # ... and this many times the model's usual share
+
+ERRORS = (
+    "Error code: 500 - {'error': {'message': 'Internal server error', 'type': 'internal_server_error'}}",
+    "Error code: 503 - {'error': {'message': 'Service Unavailable', 'type': 'service_unavailable'}}",
+    "Request timed out.",
+)
+BURST_ERRORS = (
+    "Error code: 429 - {'error': {'message': 'Rate limit reached', 'type': 'tokens', 'code': 'rate_limit_exceeded'}}",
+    "Error code: 503 - {'error': {'message': 'Service Unavailable', 'type': 'service_unavailable'}}",
+)
+
+
+# ============================================================
+# SAMPLING
+# ============================================================
+def _zipf_p(n, s):
+    p = 1.0 / np.arange(1, n + 1) ** s
+    return p / p.sum()
+
+
+def _shares(pairs):
+    values, p = zip(*pairs)
+    return np.array(values), np.array(p) / sum(p)
+
+
+def sample_timestamps(rng, rows, start_ms, end_ms):
+    """Sorted epoch ms in [start_ms, end_ms): hourly diurnal weights, quieter weekends."""
+    hours = np.arange(start_ms - start_ms % HOUR_MS, end_ms, HOUR_MS)
+    lo = np.maximum(hours, start_ms)
+    width = np.minimum(hours + HOUR_MS, end_ms) - lo
+    hour_of_day = (hours // HOUR_MS) % 24
+    weekday = (hours // DAY_MS + 3) % 7          # 1970-01-01 was a Thursday; 5, 6 = weekend
+    weights = (0.25 + 0.75 * (0.5 - 0.5 * np.cos(2 * np.pi * (hour_of_day - 3) / 24)))
+    weights = weights * np.where(weekday >= 5, WEEKEND_TRAFFIC, 1.0) * width / HOUR_MS
+
+    picked = rng.choice(len(hours), size=rows, p=weights / weights.sum())
+    ts = lo[picked] + (rng.random(rows) * width[picked]).astype(np.int64)
+    ts.sort()
+    return ts
+
+
+def sample_bursts(rng, start_ms, end_ms, n_models):
+    """[(start_ms, end_ms, model index)] — windows where one model mostly fails."""
+    days = (end_ms - start_ms) / DAY_MS
+    n = rng.poisson(BURSTS_PER_DAY * days)
+    starts = np.sort(rng.integers(start_ms, end_ms, size=n))
+    lengths = rng.integers(BURST_MINUTES[0], BURST_MINUTES[1] + 1, size=n) * 60_000
+    models = rng.integers(0, n_models, size=n)
+    return list(zip(starts.tolist(), (starts + lengths).tolist(), models.tolist()))
+
+
+def build_prompt_pool(rng):
+    """PROMPT_POOL prompts from PROMPT_TEMPLATES, most popular first."""
+    template = np.arange(PROMPT_POOL) % len(PROMPT_TEMPLATES)
+    n = rng.integers(1, 100_000, size=PROMPT_POOL)
+    r = rng.integers(2, 20, size=PROMPT_POOL)
+    return [PROMPT_TEMPLATES[t].format(n=a, r=b) for t, a, b in zip(template.tolist(), n.tolist(), r.tolist())]
+
+
+def build_response_pool(rng):
+    lengths = np.clip(rng.lognormal(np.log(4), 0.8, size=RESPONSE_POOL), 1, 60).astype(int)
+    picks = rng.integers(0, len(RESPONSE_SENTENCES), size=lengths.sum())
+    out, at = [], 0
+    for k, length in enumerate(lengths.tolist()):
+        body = " ".join(RESPONSE_SENTENCES[i] for i in picks[at:at + length].tolist())
+        out.append(f"Answer {k}: {body}")
+        at += length
+    return out
+
+
+def _nullable(values, keep):
+    """values as a list, with None where `keep` is False."""
+    values = values.astype(object)
+    values[~keep] = None
+    return values.tolist()
+
+
+def _hex_ids(rng, n):
+    words = rng.integers(0, 2 ** 63, size=(n, 2), dtype=np.int64)
+    return [f"{a:016x}{b:016x}" for a, b in words.tolist()]
+
+
+class SyntheticCalls:
+    """
+    One dataset: sample(i, ts) draws the columns of chunk i as arrays,
+    batch(i, first, ts) turns them into the rows to insert for the columns
+    `log_cols` of the target llm_logs.
+    """
+
+    def __init__(self, seed, start_ms, end_ms, users, log_cols):
+        from core.payloads import encode_payload, preview
+        from core.prompts import prompt_fingerprint, EXAMPLE_MAX_CHARS
+
+        self.seed = seed
+        self.tag = f"syn-{seed}-{end_ms}"
+        rng = np.random.default_rng([seed, 0])
+        self.models = np.array(list(MODEL_PROFILES), dtype=object)
+        profiles = np.array(list(MODEL_PROFILES.values()))
+        self.model_p = profiles[:, 0] / profiles[:, 0].sum()
+        self.ttft, self.tps, self.error_rate, self.price_in, self.price_out = profiles[:, 1:].T
+
+        self.bursts = sample_bursts(rng, start_ms, end_ms, len(self.models))
+        self.prompts = np.array(build_prompt_pool(rng), dtype=object)
+        self.responses = np.array(build_response_pool(rng), dtype=object)
+        self.prompt_words = np.array([len(p.split()) for p in self.prompts])
+        self.prompt_p = _zipf_p(PROMPT_POOL, PROMPT_ZIPF)
+        self.response_p = _zipf_p(RESPONSE_POOL, PROMPT_ZIPF)
+
+        self.user_names = np.array([f"user-{k:05d}" for k in range(users)], dtype=object)
+        self.user_p = _zipf_p(users, USER_ZIPF)
+        # Each user's session windows start at their own offset
+        self.user_phase = rng.integers(0, SESSION_MS, size=users)
+
+        self.temperatures, self.temperature_p = _shares(TEMPERATURES)
+        self.inr_rate = FALLBACK_RATES["INR"]
+        self.display_rate = FALLBACK_RATES.get(DISPLAY_CURRENCY, 1.0)
+
+        # Bodies are encoded (and prompts fingerprinted) once per pool entry
+        self.log_cols = log_cols
+        self.use_payloads = "prompt_hash" in log_cols
+        self.use_templates = "prompt_fp" in log_cols
+        if self.use_payloads:
+            self.prompt_payloads = [encode_payload(t) for t in self.prompts]
+            self.response_payloads = [encode_payload(t) for t in self.responses]
+            self.prompt_hash = np.array([p[0] for p in self.prompt_payloads], dtype=object)
+            self.response_hash = np.array([p[0] for p in self.response_payloads], dtype=object)
+            self.prompt_preview = np.array([preview(t) for t in self.prompts], dtype=object)
+            self.response_preview = np.array([preview(t) for t in self.responses], dtype=object)
+        if self.use_templates:
+            fingerprints = [prompt_fingerprint(p) for p in self.prompts]
+            self.templates = list(dict.fromkeys(fingerprints))
+            position = {fp: k for k, (fp, _) in enumerate(self.templates)}
+            self.template_of = np.array([position[fp] for fp, _ in fingerprints])
+            self.examples = [None] * len(self.templates)
+            for k, text in zip(self.template_of.tolist(), self.prompts):
+                self.examples[k] = self.examples[k] or text[:EXAMPLE_MAX_CHARS]
+            self.prompt_fp = np.array([fp for fp, _ in fingerprints], dtype=np.int64)
+
+    def sample(self, index, ts):
+        rng = np.random.default_rng([self.seed, 3, index])
+        n = len(ts)
+        model = rng.choice(len(self.models), size=n, p=self.model_p)
+        user = rng.choice(len(self.user_names), size=n, p=self.user_p)
+        prompt = rng.choice(PROMPT_POOL, size=n, p=self.prompt_p)
+        response = rng.choice(RESPONSE_POOL, size=n, p=self.response_p)
+
+        # Error bursts: the burst's model fails often and slows down for its duration
+        error_p = self.error_rate[model]
+        slow = np.ones(n)
+        in_burst = np.zeros(n, dtype=bool)
+        for b_start, b_end, b_model in self.bursts:
+            lo, hi = np.searchsorted(ts, (b_start, b_end))
+            if lo == hi:
+                continue
+            hit = model[lo:hi] == b_model
+            error_p[lo:hi][hit] = BURST_ERROR_RATE
+            slow[lo:hi][hit] = BURST_SLOWDOWN
+            in_burst[lo:hi] |= hit
+        is_error = rng.random(n) < error_p
+        ok = ~is_error
+
+        streamed = ok & (rng.random(n) < STREAMED_SHARE)
+        tokens_in = (self.prompt_words[prompt] * 1.3 + rng.lognormal(np.log(250), 0.9, size=n)).astype(np.int64)
+        tokens_out = np.clip(rng.lognormal(np.log(220), 0.8, size=n), 1, 4096).astype(np.int64)
+        tokens_out[is_error] = 0
+
+        ttft = self.ttft[model] * rng.lognormal(0, 0.35, size=n) * slow
+        tps = self.tps[model] * rng.lognormal(0, 0.2, size=n) / slow
+        gen_ms = (tokens_out - 1) / tps * 1000
+        latency = ttft + gen_ms + rng.exponential(20, size=n)
+        # Failures come back after a connect / queueing delay, or a timeout
+        latency[is_error] = rng.lognormal(np.log(400), 1.0, size=is_error.sum())
+        itl_p50 = 1000 / tps
+        itl_p95 = itl_p50 * rng.lognormal(np.log(1.8), 0.2, size=n)
+        itl_p99 = itl_p95 * rng.lognormal(np.log(1.6), 0.2, size=n)
+
+        cost_usd = (tokens_in * self.price_in[model] + tokens_out * self.price_out[model]) / 1_000_000
+        base_errors = rng.integers(0, len(ERRORS), size=n)
+        burst_errors = rng.integers(0, len(BURST_ERRORS), size=n)
+        error_type = np.where(in_burst, np.array(BURST_ERRORS, dtype=object)[burst_errors],
+                              np.array(ERRORS, dtype=object)[base_errors])
+
+        has_input = rng.random(n) < INPUT_SHARE
+        rated = ok & (rng.random(n) < RATED_SHARE)
+        rating = rng.choice(np.arange(1, 6), size=n, p=(0.05, 0.05, 0.15, 0.35, 0.4))
+        temperature = rng.choice(self.temperatures, size=n, p=self.temperature_p)
+
+        return {
+            "ts_ms": ts, "model": model, "user": user, "prompt": prompt, "response": response,
+            "is_error": is_error, "streamed": streamed, "tokens_in": tokens_in, "tokens_out": tokens_out,
+            "latency_ms": np.rint(latency).astype(np.int64), "ttft_ms": ttft, "gen_ms": gen_ms,
+            "tokens_per_s": tps, "itl_p50_ms": itl_p50, "itl_p95_ms": itl_p95, "itl_p99_ms": itl_p99,
+            "cost_usd": cost_usd, "error_type": error_type, "rated": rated, "rating": rating,
+            "temperature": temperature,
+            "has_input": has_input,
+            "input_type": rng.choice(len(INPUT_TYPES), size=n, p=[t[2] for t in INPUT_TYPES]),
+            "has_output": ok & (rng.random(n) < OUTPUT_SHARE),
+            "file_bytes": rng.lognormal(np.log(200_000), 1.0, size=n).astype(np.int64),
+            "file_hash": _hex_ids(rng, int(has_input.sum())),    # one per input, in row order
+        }
+
+
+    def batch(self, index, first, ts):
+        """Sampled arrays plus the rows for every table, for chunk `index` (rows first..)."""
+        c = self.sample(index, ts)
+        n = len(ts)
+        ok = ~c["is_error"]
+        usd = c["cost_usd"]
+        ids = [f"{self.tag}-{i:09d}" for i in range(first, first + n)]
+        day = np.datetime_as_string(ts.astype("datetime64[ms]").astype("datetime64[D]")).tolist()
+        cols = {
+            "id": ids,
+            "timestamp": np.datetime_as_string(ts.astype("datetime64[ms]"), unit="us").tolist(),
+            "session_id": [
+                f"sess-{u}-{w}" for u, w in zip(
+                    c["user"].tolist(), ((ts + self.user_phase[c["user"]]) // SESSION_MS).tolist())
+            ],
+            "user_id": self.user_names[c["user"]].tolist(),
+            "model_name": self.models[c["model"]].tolist(),
+            "tokens_in": c["tokens_in"].tolist(),
+            "tokens_out": c["tokens_out"].tolist(),
+            "latency_ms": c["latency_ms"].tolist(),
+            "cost_usd": usd.tolist(),
+            "cost_inr": (usd * self.inr_rate).tolist(),
+            "temperature": c["temperature"].tolist(),
+            "error_type": _nullable(c["error_type"], c["is_error"]),
+            "rating": _nullable(c["rating"], c["rated"]),
+            "ts_ms": ts.tolist(),
+            "day": day,
+            "cost_display": (usd * self.display_rate).tolist(),
+            "display_currency": [DISPLAY_CURRENCY] * n,
+        }
+        for col in STREAM_COLUMNS:
+            cols[col] = _nullable(c[col], c["streamed"])
+        if self.use_payloads:
+            cols["prompt_hash"] = self.prompt_hash[c["prompt"]].tolist()
+            cols["prompt_preview"] = self.prompt_preview[c["prompt"]].tolist()
+            cols["response_hash"] = _nullable(self.response_hash[c["response"]], ok)
+            cols["response_preview"] = _nullable(self.response_preview[c["response"]], ok)
+        else:
+            cols["prompt"] = self.prompts[c["prompt"]].tolist()
+            cols["response"] = _nullable(self.responses[c["response"]], ok)
+        if self.use_templates:
+            cols["prompt_fp"] = self.prompt_fp[c["prompt"]].tolist()
+        names = [col for col in cols if col in self.log_cols]
+
+        payloads = []
+        if self.use_payloads:
+            payloads = _payload_rows(self.prompt_payloads, np.bincount(c["prompt"], minlength=PROMPT_POOL))
+            payloads += _payload_rows(self.response_payloads, np.bincount(c["response"][ok], minlength=RESPONSE_POOL))
+
+        # Multimodal rows hang off the calls that had them
+        inputs = np.flatnonzero(c["has_input"]).tolist()
+        outputs = np.flatnonzero(c["has_output"]).tolist()
+        return {
+            "arrays": c,
+            "log_columns": names,
+            "logs": list(zip(*(cols[col] for col in names))),
+            "payloads": payloads,
+            "templates": self.template_rows(c, usd) if self.use_templates else [],
+            "inputs": [
+                (f"{ids[i]}-in", ids[i], INPUT_TYPES[t][0], f"uploads/{day[i]}/{ids[i]}.{INPUT_TYPES[t][1]}",
+                 file_hash, json.dumps({"bytes": size}))
+                for i, t, size, file_hash in zip(
+                    inputs, c["input_type"][inputs].tolist(), c["file_bytes"][inputs].tolist(), c["file_hash"])
+            ],
+            "outputs": [
+                (f"{ids[i]}-out", ids[i], "image", f"outputs/{day[i]}/{ids[i]}.png", json.dumps({"bytes": size}))
+                for i, size in zip(outputs, c["file_bytes"][outputs].tolist())
+            ],
+        }
+
+    def template_rows(self, c, usd):
+        """UPSERT_TEMPLATE_SQL rows for one chunk, aggregated per template."""
+        t = self.template_of[c["prompt"]]
+        size = len(self.templates)
+        calls = np.bincount(t, minlength=size)
+        first = np.full(size, np.iinfo(np.int64).max)
+        last = np.zeros(size, dtype=np.int64)
+        np.minimum.at(first, t, c["ts_ms"])
+        np.maximum.at(last, t, c["ts_ms"])
+
+        def total(values):
+            return np.bincount(t, weights=values, minlength=size).tolist()
+
+        sums = [total(c["latency_ms"]), total(c["tokens_in"]), total(c["tokens_out"]),
+                total(usd), total(usd * self.inr_rate)]
+        errors = np.bincount(t, weights=c["is_error"], minlength=size)
+        return [
+            (fp, template, self.examples[k], int(first[k]), int(last[k]), int(calls[k]), int(errors[k]),
+             *(s[k] for s in sums))
+            for k, (fp, template) in enumerate(self.templates) if calls[k]
+        ]
+
+
+def _payload_rows(encoded, refs):
+    """UPSERT_PAYLOAD_SQL rows for the pool entries referenced `refs` times."""
+    return [(*encoded[i][:3], int(refs[i]), encoded[i][3]) for i in np.flatnonzero(refs).tolist()]
+
+
+# ============================================================
+# ALERTS
+# ============================================================
+class AlertMaterial:
+    """
+    What the alert engine would have seen, folded chunk by chunk: model-hours
+    with unusually many calls over the latency / TTFT thresholds, and the
+    calls inside each error burst. rows() turns them into llm_alerts incidents.
+    """
+
+    def __init__(self, gen):
+        self.gen = gen
+        self.hours = {}          # (alert_type, model, hour) → [calls, hits, first, last, peak]
+        self.bursts = {}         # burst index → [calls, errors, first error, last error]
+
+    def add(self, c):
+        ok, s = ~c["is_error"], c["streamed"]
+        latency = c["latency_ms"][ok]
+        self._hours("HIGH_LATENCY", c["model"][ok], c["ts_ms"][ok], latency > LATENCY_STATIC, latency)
+        self._hours("HIGH_TTFT", c["model"][s], c["ts_ms"][s], c["ttft_ms"][s] > TTFT_STATIC, c["ttft_ms"][s])
+
+        for k, (b_start, b_end, m) in enumerate(self.gen.bursts):
+            lo, hi = np.searchsorted(c["ts_ms"], (b_start, b_end))
+            hit = c["model"][lo:hi] == m
+            if not hit.any():
+                continue
+            errors = c["ts_ms"][lo:hi][hit & c["is_error"][lo:hi]]
+            entry = self.bursts.setdefault(k, [0, 0, sys.maxsize, 0])
+            entry[0] += int(hit.sum())
+            entry[1] += len(errors)
+            if len(errors):
+                entry[2] = min(entry[2], int(errors[0]))
+                entry[3] = max(entry[3], int(errors[-1]))
+
+    def _hours(self, alert_type, model, ts, hit, values):
+        keys, inverse = np.unique(model * 10**8 + ts // HOUR_MS, return_inverse=True)
+        calls = np.bincount(inverse, minlength=len(keys))
+        hits = np.bincount(inverse, weights=hit, minlength=len(keys))
+        first = np.full(len(keys), np.iinfo(np.int64).max)
+        last = np.zeros(len(keys), dtype=np.int64)
+        peak = np.zeros(len(keys))
+        np.minimum.at(first, inverse[hit], ts[hit])
+        np.maximum.at(last, inverse[hit], ts[hit])
+        np.maximum.at(peak, inverse[hit], values[hit])
+        for k, key in enumerate(keys.tolist()):
+            entry = self.hours.setdefault((alert_type, key // 10**8, key % 10**8), [0, 0, sys.maxsize, 0, 0.0])
+            entry[0] += int(calls[k])
+            entry[1] += int(hits[k])
+            entry[2] = min(entry[2], int(first[k]))
+            entry[3] = max(entry[3], int(last[k]))
+            entry[4] = max(entry[4], float(peak[k]))
+
+    def rows(self, rng, end_ms):
+        """llm_alerts rows as dicts; incidents last seen over a day before end_ms are resolved."""
+        from core.utils import ms_to_iso
+
+        def incident(alert_type, model, severity, message, value, expected, count, first, last):
+            return {
+                "id": str(uuid.UUID(bytes=rng.bytes(16), version=4)),
+                "timestamp": ms_to_iso(first), "alert_type": alert_type, "message": message,
+                "severity": severity, "value": value, "expected": expected,
+                "resolved": int(last < end_ms - DAY_MS),
+                "fingerprint": alert_fingerprint(alert_type, model, severity), "model_name": model,
+                "count": count, "first_seen": ms_to_iso(first), "last_seen": ms_to_iso(last),
+                "peak_value": value,
+            }
+
+        # Each model's usual share of slow calls, the baseline an hour is judged against
+        totals = {}
+        for (alert_type, m, _), (calls, hits, *_) in self.hours.items():
+            t = totals.setdefault((alert_type, m), [0, 0])
+            t[0] += calls
+            t[1] += hits
+
+        out = []
+        for (alert_type, m, _), (calls, hits, first, last, peak) in sorted(self.hours.items()):
+            all_calls, all_hits = totals[(alert_type, m)]
+            share = max(SLOW_HOUR_SHARE, SLOW_HOUR_RATIO * all_hits / all_calls)
+            if hits < MIN_WINDOW_EVENTS or hits < share * calls:
+                continue
+            model = self.gen.models[m]
+            if alert_type == "HIGH_LATENCY":
+                message = f"[{model}] Latency {peak:.0f}ms exceeded threshold {LATENCY_STATIC:.0f}ms"
+                threshold = LATENCY_STATIC
+            else:
+                message = f"[{model}] Time to first token {peak:.0f}ms exceeded threshold {TTFT_STATIC:.0f}ms"
+                threshold = TTFT_STATIC
+            out.append(incident(alert_type, model, "warning", message, peak, threshold, hits, first, last))
+
+        for k, (calls, errors, first, last) in sorted(self.bursts.items()):
+            if errors < MIN_WINDOW_EVENTS:
+                continue
+            rate = errors / calls * 100
+            model = self.gen.models[self.gen.bursts[k][2]]
+            message = f"[{model}] 5-min error rate {rate:.1f}% exceeded threshold {ERROR_RATE_STATIC:.1f}%"
+            out.append(incident("ERROR_SPIKE", model, "critical", message, rate, ERROR_RATE_STATIC, errors, first, last))
+        return out
+
+
+# ============================================================
+# LOADING
+# ============================================================
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def open_database(db_path, schema=None):
+    """
+    (connection, schema version, latest version) for db_path. A new (or
+    empty) file is created at `schema` (default latest); an existing one is
+    used as it is.
+    """
+    from core.db import connect, init_schema, schema_version, MIGRATIONS
+
+    conn = connect(db_path=db_path)
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'schema_version'").fetchone()
+    if not exists:
+        init_schema(conn, schema)
+    version = schema_version(conn)
+    if exists and schema is not None and schema != version:
+        print(f"[SYNTH] {db_path} is already at schema v{version}; --schema-version {schema} is ignored")
+    return conn, version, MIGRATIONS[-1][0]
+
+
+def generate(db_path, rows, days=30, seed=0, users=None, end_ms=None, schema=None, chunk=SYNTH_CHUNK):
+    """
+    Append `rows` synthetic calls over the `days` days before end_ms (default
+    now) to db_path. Returns {rows, alerts, schema_version, load_s, index_s,
+    derived_s, rows_per_s}.
+    """
+    from core.search import FTS_TABLE, create_fts, drop_fts_triggers, backfill_fts
+    from core.analytics import rebuild_daily_metrics
+    from core.payloads import UPSERT_PAYLOAD_SQL
+    from core.prompts import UPSERT_TEMPLATE_SQL
+
+    end_ms = end_ms or now_ms()
+    start_ms = end_ms - days * DAY_MS
+    users = users or max(50, rows // 500)
+    conn, version, latest = open_database(db_path, schema)
+    alert_cols = table_columns(conn, "llm_alerts")
+
+    started = time.perf_counter()
+    gen = SyntheticCalls(seed, start_ms, end_ms, users, set(table_columns(conn, "llm_logs")))
+    ts = sample_timestamps(np.random.default_rng([seed, 1]), rows, start_ms, end_ms)
+    material = AlertMaterial(gen)
+
+    has_fts = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)).fetchone()
+    if has_fts:
+        # Indexed in one pass after the load (pre-v16 schemas would otherwise fire a trigger per row)
+        drop_fts_triggers(conn)
+    # A load at least the size of the table is faster to index afterwards, in one sorted pass
+    indexes = []
+    if rows >= (conn.execute("SELECT MAX(rowid) FROM llm_logs").fetchone()[0] or 0):
+        indexes = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'llm_logs' AND sql IS NOT NULL"
+        ).fetchall()
+        for name, _ in indexes:
+            conn.execute(f"DROP INDEX {name}")
+    conn.commit()
+
+    for index, first in enumerate(range(0, rows, chunk)):
+        b = gen.batch(index, first, ts[first:first + chunk])
+        names = b["log_columns"]
+        with conn:
+            conn.executemany(
+                f"INSERT INTO llm_logs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})", b["logs"]
+            )
+            if gen.use_payloads:
+                conn.executemany(UPSERT_PAYLOAD_SQL, b["payloads"])
+            if gen.use_templates:
+                conn.executemany(UPSERT_TEMPLATE_SQL, b["templates"])
+            conn.executemany("""
+                INSERT INTO llm_multimodal_inputs (id, log_id, input_type, file_path, file_hash, metadata)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, b["inputs"])
+            conn.executemany("""
+                INSERT INTO llm_multimodal_outputs (id, log_id, output_type, file_path, metadata)
+                VALUES (?, ?, ?, ?, ?)
+            """, b["outputs"])
+        material.add(b["arrays"])
+        print(f"[SYNTH] {first + len(b['logs']):,}/{rows:,} rows")
+
+    alerts = material.rows(np.random.default_rng([seed, 2]), end_ms)
+    with conn:
+        conn.executemany(
+            f"INSERT INTO llm_alerts ({', '.join(alert_cols)}) VALUES ({', '.join('?' * len(alert_cols))})",
+            [tuple(a.get(col) for col in alert_cols) for a in alerts]
+        )
+    load_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with conn:
+        for _, sql in indexes:
+            conn.execute(sql)
+    if has_fts:
+        create_fts(conn)
+        conn.commit()
+        backfill_fts(conn)
+    index_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if version == latest:
+        rebuild_daily_metrics(conn)
+    else:
+        print(f"[SYNTH] schema v{version} < v{latest}: daily metrics, rollups and sketches left as they are "
+              f"— migrate, then run python -m core.analytics rebuild")
+    derived_s = time.perf_counter() - started
+    conn.close()
+
+    return {
+        "rows": rows,
+        "alerts": len(alerts),
+        "schema_version": version,
+        "load_s": round(load_s, 2),
+        "index_s": round(index_s, 2),
+        "derived_s": round(derived_s, 2),
+        "rows_per_s": round(rows / load_s) if load_s else None,
+    }
+
+
+if __name__ == "__main__":
+    # python -m core.synth --rows N [--days D] [--seed S] [--users U] [--end ISO] [--schema-version V] [--db PATH]
+    from core.db import DB_PATH
+
+    parser = argparse.ArgumentParser(prog="python -m core.synth", description="Bulk-load synthetic llm_logs")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, help="distinct users (default rows / 500, at least 50)")
+    parser.add_argument("--end", help="UTC date/time the data ends at (ISO, default now)")
+    parser.add_argument("--schema-version", type=int, help="schema version of a new database (default latest)")
+    parser.add_argument("--db", default=DB_PATH)
+    args = parser.parse_args()
+
+    result = generate(
+        args.db, args.rows, args.days, args.seed, args.users,
+        iso_to_ms(args.end) if args.end else None, args.schema_version
+    )
+    print(f"[SYNTH] {result['rows']:,} rows + {result['alerts']} alerts → {args.db} (schema v{result['schema_version']})")
+    print(f"[SYNTH] load {result['load_s']}s ({result['rows_per_s']:,} rows/s), "
+          f"indexes {result['index_s']}s, rollups {result['derived_s']}s")
@@ -1 +1,56 @@
- 
+# core/utils.py
+
+import math
+import time
+from datetime import datetime, date, timedelta, timezone
+
+DAY_MS = 86_400_000
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def ms_to_iso(ms):
+    """Epoch ms → naive UTC ISO string (same format as llm_logs.timestamp)."""
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+def iso_to_ms(iso):
+    """Naive UTC ISO string → epoch ms."""
+    return int(datetime.fromisoformat(iso).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def ms_to_day(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def day_start_ms(day):
+    """'YYYY-MM-DD' or date → epoch ms at 00:00 UTC."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def time_range_bounds(range_option, from_date=None, to_date=None):
+    """
+    Dashboard time-range selector → (start_ms, end_ms) for a range scan
+    on llm_logs.ts_ms. Either bound may be None (open range).
+    """
+    today = datetime.now(timezone.utc).date()
+
+    if range_option == "Last 7 days":
+        return day_start_ms(today - timedelta(days=7)), None
+    if range_option == "Last 30 days":
+        return day_start_ms(today - timedelta(days=30)), None
+    if range_option == "Custom range" and from_date and to_date:
+        return day_start_ms(from_date), day_start_ms(to_date) + DAY_MS
+    return None, None
+
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0–100) of an already sorted list; None if empty."""
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[rank]
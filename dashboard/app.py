@@ -1,7 +1,6 @@
 # dashboard/app.py
 
 import streamlit as st
-import sqlite3
 import pandas as pd
 from datetime import datetime, timedelta
 import time
@@ -11,17 +10,19 @@ import sys, os
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(ROOT)
 
-from core.db import init_db
-init_db()
+from core.utils import time_range_bounds
+from core.rollups import (
+    pick_resolution, rollup_where, kpi_sql, series_sql, RESOLUTION_MS, MIN_CHART_POINTS
+)
+from core.export import logs_where, export_logs, export_path, EXPORT_FORMATS
+from dashboard.data import get_data, show_cache_stats
+
+EXPORT_DOWNLOAD_MAX_MB = 200     # larger exports are left on disk instead of offered for download
 
-# ---------- DB PATH ----------
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "llm_logs.db"))
 
-def get_data(query, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params or {})
-    conn.close()
-    return df
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
 
 
 st.set_page_config(page_title="LLM Observability Dashboard", layout="wide")
@@ -61,60 +62,81 @@ error_filter = st.sidebar.selectbox("Errors", ["All", "Only errors", "Only succe
 
 
 # ---------- WHERE CLAUSE ----------
-where = []
-params = {}
-
-if range_option == "Last 7 days":
-    where.append("date(timestamp) >= date('now', '-7 days')")
-elif range_option == "Last 30 days":
-    where.append("date(timestamp) >= date('now', '-30 days')")
-elif range_option == "Custom range" and from_date and to_date:
-    where.append("date(timestamp) BETWEEN :from AND :to")
-    params["from"] = str(from_date)
-    params["to"] = str(to_date)
-
-if model_filter != "All":
-    where.append("model_name = :model")
-    params["model"] = model_filter
-if user_filter != "All":
-    where.append("user_id = :user")
-    params["user"] = user_filter
-if session_filter != "All":
-    where.append("session_id = :session")
-    params["session"] = session_filter
-if error_filter == "Only errors":
-    where.append("error_type IS NOT NULL")
-elif error_filter == "Only successful":
-    where.append("error_type IS NULL")
-
-WHERE = ("WHERE " + " AND ".join(where)) if where else ""
+# Time range → epoch-ms bounds so the filter range-scans idx_logs_ts_id
+start_ms, end_ms = time_range_bounds(range_option, from_date, to_date)
+log_filters = dict(
+    start_ms=start_ms, end_ms=end_ms,
+    model=None if model_filter == "All" else model_filter,
+    user=None if user_filter == "All" else user_filter,
+    session=None if session_filter == "All" else session_filter,
+    errors=error_filter
+)
+WHERE, params = logs_where(**log_filters)
 
 
 # ============================================================
-# 🔥 DAILY METRICS
+# 🔥 KPIs + TRENDS (from rollups)
 # ============================================================
-query_daily = f"SELECT * FROM llm_metrics_daily {WHERE.replace('timestamp', 'date')} ORDER BY date DESC"
+# llm_rollup_{minute,hour,day} carry the model / user / error dimensions, so
+# every filter combination costs O(buckets). Sessions are not a rollup
+# dimension; with a session selected the same aggregates run on llm_logs.
+kpi_resolution = pick_resolution(start_ms, end_ms)
+chart_resolution = pick_resolution(start_ms, end_ms, min_buckets=MIN_CHART_POINTS)
+
+if session_filter == "All":
+    ROLLUP_WHERE, rollup_params = rollup_where(
+        start_ms, end_ms,
+        model=None if model_filter == "All" else model_filter,
+        user=None if user_filter == "All" else user_filter,
+        errors=error_filter
+    )
+    query_kpi = kpi_sql(kpi_resolution, ROLLUP_WHERE)
+    query_series = series_sql(chart_resolution, ROLLUP_WHERE)
+else:
+    rollup_params = params
+    width = RESOLUTION_MS[chart_resolution]
+    query_kpi = f"""
+        SELECT COUNT(*) AS total_requests,
+               TOTAL(error_type IS NOT NULL) AS error_count,
+               AVG(latency_ms) AS avg_latency_ms,
+               TOTAL(cost_usd) AS total_cost_usd,
+               TOTAL(cost_inr) AS total_cost_inr
+        FROM llm_logs {WHERE}
+    """
+    query_series = f"""
+        SELECT ts_ms - ts_ms % {width} AS bucket_ms,
+               COUNT(*) AS total_requests,
+               AVG(latency_ms) AS avg_latency_ms
+        FROM llm_logs {WHERE}
+        GROUP BY bucket_ms
+        ORDER BY bucket_ms
+    """
+
 try:
-    daily = get_data(query_daily, params)
+    kpi = get_data(query_kpi, rollup_params)
+    series = get_data(query_series, rollup_params)
 except Exception:
-    daily = pd.DataFrame()
+    kpi, series = pd.DataFrame(), pd.DataFrame()
 
-if not daily.empty:
+if not kpi.empty and kpi["total_requests"][0]:
     c1, c2, c3, c4 = st.columns(4)
-    c1.metric("Total Requests", int(daily['total_requests'].sum()))
-    c2.metric("Avg Latency (ms)", f"{int(daily['avg_latency_ms'].mean())}")
-    c3.metric("Total Errors", int(daily['error_count'].sum()))
+    c1.metric("Total Requests", int(kpi["total_requests"][0]))
+    c2.metric("Avg Latency (ms)", f"{int(kpi['avg_latency_ms'][0] or 0)}")
+    c3.metric("Total Errors", int(kpi["error_count"][0]))
 
-    total_usd = round(daily['total_cost_usd'].sum(), 4)
-    total_inr = round(daily['total_cost_inr'].sum(), 2)
+    total_usd = round(kpi["total_cost_usd"][0], 4)
+    total_inr = round(kpi["total_cost_inr"][0], 2)
 
     c4.metric("Total Cost", f"₹{total_inr}  |  ${total_usd}")
 
-    st.subheader("📅 Daily Activity")
-    st.line_chart(daily.set_index("date")["total_requests"])
+    series["time"] = pd.to_datetime(series["bucket_ms"], unit="ms")
+    series = series.set_index("time")
+
+    st.subheader(f"📅 Activity (per {chart_resolution})")
+    st.line_chart(series["total_requests"])
 
     st.subheader("⚡ Latency Trend")
-    st.line_chart(daily.set_index("date")["avg_latency_ms"])
+    st.line_chart(series["avg_latency_ms"])
 else:
     st.warning("No data for selected filters.")
 
@@ -123,13 +145,15 @@ else:
 # 🔥 RECENT LOG ENTRIES
 # ============================================================
 st.subheader("📁 Recent Log Entries (Last 100)")
+st.caption("Prompts are truncated — open the Log Explorer for full bodies and older pages.")
 
 try:
     logs_raw = get_data(f"""
-        SELECT timestamp, session_id, user_id, model_name, prompt, latency_ms, error_type, cost_usd, cost_inr
+        SELECT timestamp, session_id, user_id, model_name, prompt_preview AS prompt,
+               latency_ms, error_type, cost_usd, cost_inr
         FROM llm_logs
         {WHERE}
-        ORDER BY timestamp DESC
+        ORDER BY ts_ms DESC
         LIMIT 100
     """, params)
     st.dataframe(logs_raw)
@@ -138,20 +162,46 @@ except Exception:
 
 
 # ============================================================
-# 🔄 AUTO REFRESH + CSV EXPORT
+# ⬇ EXPORT (every filtered row, streamed to a file)
+# ============================================================
+st.subheader("⬇ Export Filtered Logs")
+e1, e2, e3 = st.columns([1, 1, 1])
+export_format = e1.selectbox("Format", EXPORT_FORMATS)
+export_bodies = e2.checkbox("Include prompt/response", value=True)
+
+if e3.button("Export all filtered rows"):
+    total = int(get_data(f"SELECT COUNT(*) AS n FROM llm_logs {WHERE}", params)["n"][0])
+    bar = st.progress(0.0, text=f"0 / {total:,} rows")
+    where_l, params_l = logs_where(**log_filters, prefix="l.")
+    path = export_path(export_format)
+    export_logs(
+        path, export_format, where_l, params_l, bodies=export_bodies,
+        progress=lambda n: bar.progress(min(n / max(total, 1), 1.0), text=f"{n:,} / {total:,} rows")
+    )
+    st.session_state.last_export = path
+
+last_export = st.session_state.get("last_export")
+if last_export and os.path.exists(last_export):
+    size_mb = os.path.getsize(last_export) / (1024 * 1024)
+    st.caption(f"Written to `{last_export}` ({size_mb:.1f} MB)")
+    if size_mb <= EXPORT_DOWNLOAD_MAX_MB:
+        st.download_button(
+            label=f"⬇ Download {os.path.basename(last_export)}",
+            data=lambda: read_file(last_export),
+            file_name=os.path.basename(last_export)
+        )
+    else:
+        st.info("Too large to download through the browser — copy the file from the path above.")
+
+
+# ============================================================
+# 🔄 AUTO REFRESH
 # ============================================================
 st.markdown("---")
 
+show_cache_stats()
+
 auto_refresh = st.checkbox("🔄 Auto Refresh every 20 seconds (Overview)")
 if auto_refresh:
     time.sleep(20)
     st.experimental_rerun()
-
-if 'logs_raw' in locals() and not logs_raw.empty:
-    csv_data = logs_raw.to_csv(index=False).encode("utf-8")
-    st.download_button(
-        label="⬇ Download Filtered Logs (CSV)",
-        data=csv_data,
-        file_name="llm_logs_filtered.csv",
-        mime="text/csv"
-    )
@@ -0,0 +1,186 @@
+# dashboard/data.py
+# Shared DB access for the dashboard pages (pooled read-only connections)
+# with a query cache that is invalidated whenever the database changes.
+
+import os
+import sys
+import time
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from core.db import init_db, get_connection, pooled_read_connection, record_query, caller_name
+from core.rollups import pick_resolution
+from core.sketch import sketch_range_sql, merge_sketch_rows
+from core.retention import read_archive
+
+# Make sure tables/migrations exist before opening read-only connections
+init_db()
+
+CACHE_MAX_ENTRIES = 256
+
+
+# ============================================================
+# QUERY CACHE
+# ============================================================
+class QueryCache:
+    """
+    LRU of query results keyed on (query, params, generation).
+
+    `PRAGMA data_version` changes on a connection whenever another connection
+    commits. The pooled read-only connection is checked before every lookup;
+    a change bumps the process-wide generation, so every cached result from
+    before the write stops matching. A connection seen for the first time also
+    bumps it, since it has no earlier version to compare with.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._seen_versions = {}
+        self._lock = threading.Lock()
+        self.stats = {}
+
+    def current_generation(self, conn):
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            last = self._seen_versions.get(id(conn))
+            if last != version:
+                self.generation += 1
+                self._entries.clear()
+            self._seen_versions[id(conn)] = version
+            return self.generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, df, compute_ms):
+        with self._lock:
+            self._entries[key] = (df, compute_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result and the hit/miss stats."""
+        with self._lock:
+            self._entries.clear()
+            self.stats = {}
+
+    def record(self, page, hit, ms):
+        with self._lock:
+            s = self.stats.setdefault(page, {"hits": 0, "misses": 0, "saved_ms": 0.0, "query_ms": 0.0})
+            if hit:
+                s["hits"] += 1
+                s["saved_ms"] += ms
+            else:
+                s["misses"] += 1
+                s["query_ms"] += ms
+
+
+query_cache = QueryCache()
+
+
+def _freeze(params):
+    if not params:
+        return ()
+    if isinstance(params, dict):
+        return tuple(sorted(params.items()))
+    return tuple(params)
+
+
+def get_data(query, params=None, caller=None, cache=True):
+    caller = caller or caller_name(2)
+
+    with pooled_read_connection(caller) as conn:
+        key = None
+        if cache:
+            key = (query, _freeze(params), query_cache.current_generation(conn))
+            entry = query_cache.get(key)
+            if entry is not None:
+                df, compute_ms = entry
+                query_cache.record(caller, True, compute_ms)
+                return df.copy()
+
+        start = time.perf_counter()
+        df = pd.read_sql_query(query, conn, params=params or {})
+        elapsed = (time.perf_counter() - start) * 1000
+
+    record_query(caller, elapsed)
+    if cache:
+        query_cache.put(key, df, elapsed)
+        query_cache.record(caller, False, elapsed)
+        return df.copy()
+    return df
+
+
+def get_sketches(start_ms=None, end_ms=None, model=None, metric="latency_ms"):
+    """{model_name: DDSketch} merged over the range from llm_sketches (cached like get_data)."""
+    query, params = sketch_range_sql(metric, pick_resolution(start_ms, end_ms), start_ms, end_ms, model)
+    df = get_data(query, params, caller=caller_name(2))
+    return merge_sketch_rows(zip(df["model_name"], df["sketch"]))
+
+
+def get_archive(start_day, end_day, text=None, limit=None, caller=None):
+    """
+    Archived rows from the retention Parquet files (see core.retention.read_archive),
+    cached like get_data: a retention run commits to llm_archive, which invalidates it.
+    """
+    caller = caller or caller_name(2)
+
+    with pooled_read_connection(caller) as conn:
+        key = ("archive", start_day, end_day, text, limit, query_cache.current_generation(conn))
+    entry = query_cache.get(key)
+    if entry is not None:
+        df, compute_ms = entry
+        query_cache.record(caller, True, compute_ms)
+        return df.copy()
+
+    start = time.perf_counter()
+    df = read_archive(start_day, end_day, text=text, limit=limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    query_cache.put(key, df, elapsed)
+    query_cache.record(caller, False, elapsed)
+    return df.copy()
+
+
+def cache_stats(page=None):
+    """{page: {hits, misses, hit_ratio, saved_ms, query_ms}} (or one page's dict)."""
+    with query_cache._lock:
+        stats = {p: dict(s) for p, s in query_cache.stats.items()}
+    for s in stats.values():
+        total = s["hits"] + s["misses"]
+        s["hit_ratio"] = s["hits"] / total if total else 0.0
+    if page is not None:
+        return stats.get(page, {"hits": 0, "misses": 0, "hit_ratio": 0.0, "saved_ms": 0.0, "query_ms": 0.0})
+    return stats
+
+
+def show_cache_stats(page=None):
+    """Sidebar footer with this page's cache hit ratio and time saved."""
+    import streamlit as st
+
+    page = page or caller_name(2)
+    s = cache_stats(page)
+    st.sidebar.markdown("---")
+    st.sidebar.caption(
+        f"⚡ Query cache — hit ratio {s['hit_ratio'] * 100:.0f}% "
+        f"({s['hits']} hits / {s['misses']} misses), "
+        f"saved {s['saved_ms']:.0f} ms vs {s['query_ms']:.0f} ms spent querying"
+    )
+
+
+def execute_write(query, params=()):
+    """Single write from the dashboard (e.g. resolving an alert)."""
+    conn = get_connection()
+    with conn:
+        conn.execute(query, params)
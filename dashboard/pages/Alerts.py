@@ -1,27 +1,25 @@
 # dashboard/pages/Alerts.py
 
 import streamlit as st
-import sqlite3
-import pandas as pd
-import os
+
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
+
+from dashboard.data import get_data, execute_write, show_cache_stats
 
 st.set_page_config(page_title="🚨 Alerts Center", layout="wide")
 st.title("🚨 Alerts Center — Real-Time Issues & System Warnings")
 
-# ---------- ALWAYS use the same DB as main.py ----------
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "llm_logs.db"))
+PAGE_SIZES = [25, 50, 100, 200]
 
-def get_data(query, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params or {})
-    conn.close()
-    return df
 
-def resolve_alert(alert_id):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("UPDATE llm_alerts SET resolved = 1 WHERE id = ?", (alert_id,))
-    conn.commit()
-    conn.close()
+def resolve_alerts(alert_ids):
+    if not alert_ids:
+        return
+    marks = ", ".join("?" for _ in alert_ids)
+    execute_write(f"UPDATE llm_alerts SET resolved = 1 WHERE id IN ({marks})", tuple(alert_ids))
+
 
 # ---------------- FILTER PANEL ----------------
 st.sidebar.header("🔎 Filters")
@@ -29,6 +27,15 @@ st.sidebar.header("🔎 Filters")
 severity_filter = st.sidebar.selectbox("Severity", ["All", "critical", "warning", "info"])
 status_filter    = st.sidebar.selectbox("Status",   ["All", "Only Unresolved", "Only Resolved"])
 
+try:
+    alert_types = get_data("SELECT DISTINCT alert_type FROM llm_alerts")["alert_type"].dropna().tolist()
+    alert_models = get_data("SELECT DISTINCT model_name FROM llm_alerts")["model_name"].dropna().tolist()
+except Exception:
+    alert_types, alert_models = [], []
+
+type_filter = st.sidebar.selectbox("Alert Type", ["All"] + alert_types)
+model_filter = st.sidebar.selectbox("Model", ["All"] + alert_models)
+
 where = []
 params = {}
 
@@ -41,50 +48,85 @@ if status_filter == "Only Unresolved":
 elif status_filter == "Only Resolved":
     where.append("resolved = 1")
 
-WHERE = ("WHERE " + " AND ".join(where)) if where else ""
+if type_filter != "All":
+    where.append("alert_type = :alert_type")
+    params["alert_type"] = type_filter
+if model_filter != "All":
+    where.append("model_name = :model")
+    params["model"] = model_filter
 
-alerts = get_data(f"SELECT * FROM llm_alerts {WHERE} ORDER BY timestamp DESC", params)
+WHERE = ("WHERE " + " AND ".join(where)) if where else ""
 
-if alerts.empty:
+# ---------------- METRICS SUMMARY (SQL aggregates) ----------------
+summary = get_data(f"""
+    SELECT
+        COUNT(*) AS incidents,
+        COALESCE(SUM(count), 0) AS occurrences,
+        COALESCE(SUM(severity = 'critical'), 0) AS critical,
+        COALESCE(SUM(resolved = 0), 0) AS unresolved
+    FROM llm_alerts {WHERE}
+""", params).iloc[0]
+
+if summary["incidents"] == 0:
     st.success("🎉 No alerts found. System looks healthy!")
+    show_cache_stats()
     st.stop()
 
-# ---------------- METRICS SUMMARY ----------------
-c1, c2, c3 = st.columns(3)
-c1.metric("Total Alerts", len(alerts))
-c2.metric("Critical Alerts", len(alerts[alerts["severity"] == "critical"]))
-c3.metric("Unresolved Alerts", len(alerts[alerts["resolved"] == 0]))
+c1, c2, c3, c4 = st.columns(4)
+c1.metric("Incidents", int(summary["incidents"]))
+c2.metric("Total Occurrences", int(summary["occurrences"]))
+c3.metric("Critical Incidents", int(summary["critical"]))
+c4.metric("Unresolved Incidents", int(summary["unresolved"]))
 
 # ---------------- COLOR BADGE ----------------
 def badge(sev):
     return "🟥 Critical" if sev == "critical" else "🟧 Warning" if sev == "warning" else "🟩 Info"
 
-# ---------------- ALERT LIST ----------------
-st.subheader("📋 Alert List")
-for _, row in alerts.iterrows():
-    with st.container():
-        st.write("---")
-        c1, c2 = st.columns([6, 1])
-
-        with c1:
-            st.markdown(
-                f"""
-                **{badge(row['severity'])} — {row['alert_type']}**
-                - 📄 **Message:** {row['message']}
-                - 📌 **Value:** `{row['value']}`
-                - 🎯 **Expected:** `{row['expected']}`
-                - 🕒 **Time:** {row['timestamp']}
-                """
-            )
-
-        with c2:
-            if row["resolved"] == 0:
-                if st.button("✔ Resolve", key=row["id"]):
-                    resolve_alert(row["id"])
-                    st.rerun()
-            else:
-                st.markdown("### 🟢 Resolved")
-
-# ---------------- RAW TABLE ----------------
-st.subheader("📁 Raw Data Table")
-st.dataframe(alerts)
+# ---------------- INCIDENT LIST (one page at a time) ----------------
+st.subheader("📋 Incidents")
+
+p1, p2 = st.columns([1, 3])
+page_size = p1.selectbox("Rows per page", PAGE_SIZES, index=1)
+pages = max(1, -(-int(summary["incidents"]) // page_size))
+page = p2.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+
+alerts = get_data(f"""
+    SELECT id, severity, alert_type, model_name, message, count, peak_value, expected,
+           first_seen, last_seen, resolved
+    FROM llm_alerts
+    {WHERE}
+    ORDER BY last_seen DESC
+    LIMIT :limit OFFSET :offset
+""", {**params, "limit": page_size, "offset": (page - 1) * page_size})
+
+alerts.insert(0, "select", False)
+alerts["severity"] = alerts["severity"].map(badge)
+alerts["resolved"] = alerts["resolved"].map(lambda r: "🟢 Resolved" if r else "🔴 Open")
+
+edited = st.data_editor(
+    alerts,
+    hide_index=True,
+    column_config={
+        "select": st.column_config.CheckboxColumn("✔", help="Select to resolve"),
+        "id": None
+    },
+    disabled=[c for c in alerts.columns if c != "select"],
+    key=f"alerts_page_{page}_{page_size}"
+)
+
+b1, b2 = st.columns(2)
+selected = edited.loc[edited["select"], "id"].tolist()
+
+if b1.button(f"✔ Resolve selected ({len(selected)})", disabled=not selected):
+    resolve_alerts(selected)
+    st.rerun()
+
+if b2.button(f"✔ Resolve all open incidents matching filters ({int(summary['unresolved'])})",
+             disabled=summary["unresolved"] == 0):
+    execute_write(
+        f"UPDATE llm_alerts SET resolved = 1 {WHERE + ' AND' if WHERE else 'WHERE'} resolved = 0",
+        params
+    )
+    st.rerun()
+
+show_cache_stats()
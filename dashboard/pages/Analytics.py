@@ -1,68 +1,131 @@
 # dashboard/pages/Analytics.py
+# Everything here is aggregated in SQLite (or read from rollups), so memory
+# stays flat no matter how many rows llm_logs holds.
 
 import streamlit as st
-import sqlite3
 import pandas as pd
+import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
-import os
 
-# ---------- DB PATH (absolute for reliability) ----------
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "llm_logs.db"))
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
+
+from core.analytics import SUM_MOMENTS_SQL, MOMENT_COLUMNS, correlation_from_moments
+from core.export import logs_where
+from core.rollups import pick_resolution, rollup_where, rollup_table
+from core.prompts import TEMPLATE_STATS_SQL
+from core.utils import time_range_bounds, ms_to_day
+from dashboard.data import get_data as query_data, get_sketches, show_cache_stats
 
 st.set_page_config(page_title="📈 Deep Analytics", layout="wide")
 st.title("📈 Deep Analytics — LLM Performance Insights")
 
+HEATMAP_BINS = 30
+
 
 # ---------- DB QUERY HELPER (safe) ----------
-def get_data(query):
+def get_data(query, params=None):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
+        return query_data(query, params)
     except Exception:
         return pd.DataFrame()
 
 
-# ---------- Load logs ----------
-logs = get_data("SELECT * FROM llm_logs ORDER BY timestamp DESC")
+# ---------- Time range ----------
+range_option = st.sidebar.selectbox(
+    "Time Range",
+    ["Last 30 days", "Last 7 days", "All time", "Custom range"]
+)
+
+from_date, to_date = None, None
+if range_option == "Custom range":
+    from_date = st.sidebar.date_input("From")
+    to_date = st.sidebar.date_input("To")
+
+start_ms, end_ms = time_range_bounds(range_option, from_date, to_date)
 
-if logs.empty:
+# Raw-log queries range-scan idx_logs_ts_id (open ends are left out of the
+# WHERE clause so the planner can seek); rollup queries filter by bucket or day
+LOG_WHERE, log_params = logs_where(start_ms, end_ms)
+
+day_params = {
+    "start_day": ms_to_day(start_ms) if start_ms is not None else None,
+    "end_day": ms_to_day(end_ms - 1) if end_ms is not None else None
+}
+DAY_RANGE = "(:start_day IS NULL OR date >= :start_day) AND (:end_day IS NULL OR date <= :end_day)"
+
+
+# ---------- Daily rollup ----------
+daily = get_data(f"""
+    SELECT date, total_requests, error_count, total_cost_usd, total_cost_inr
+    FROM llm_metrics_daily
+    WHERE {DAY_RANGE}
+    ORDER BY date
+""", day_params)
+
+if daily.empty or daily["total_requests"].sum() == 0:
     st.warning("No logs available yet — run `python main.py` to generate logs.")
+    show_cache_stats()
     st.stop()
 
+daily = daily.set_index("date")
+
 
 # ============================================================
 # 💰 COST TREND (USD + INR)
 # ============================================================
 st.subheader("💰 Cost Trend (USD + INR)")
 
-cost_df = logs.copy()
-cost_df["date"] = pd.to_datetime(cost_df["timestamp"]).dt.date
-daily_cost = cost_df.groupby("date")[["cost_usd", "cost_inr"]].sum()
-
-st.line_chart(daily_cost)
+st.line_chart(daily[["total_cost_usd", "total_cost_inr"]].rename(
+    columns={"total_cost_usd": "cost_usd", "total_cost_inr": "cost_inr"}
+))
 
 
 # ============================================================
-# ⚡ Tokens vs Latency KDE HEATMAP
+# ⚡ Tokens vs Latency 2D HISTOGRAM
 # ============================================================
 st.subheader("⚡ Tokens vs Latency Heatmap")
 
-fig, ax = plt.subplots()
-sns.kdeplot(
-    data=logs,
-    x="tokens_in",
-    y="latency_ms",
-    fill=True,
-    cmap="viridis",
-    thresh=0.05,
-    ax=ax
-)
-ax.set_xlabel("Tokens In")
-ax.set_ylabel("Latency (ms)")
-st.pyplot(fig)
+HEATMAP_WHERE = (f"{LOG_WHERE} AND" if LOG_WHERE else "WHERE") + " tokens_in IS NOT NULL AND latency_ms IS NOT NULL"
+
+bounds = get_data(f"""
+    SELECT MAX(tokens_in) AS max_tokens, MAX(latency_ms) AS max_latency
+    FROM llm_logs
+    {HEATMAP_WHERE}
+""", log_params)
+
+if bounds.empty or pd.isna(bounds["max_tokens"][0]):
+    st.info("No token/latency data in this range.")
+else:
+    # Bin in SQL: only HEATMAP_BINS² counts come back, never the raw rows
+    x_width = max(float(bounds["max_tokens"][0]), 1.0) / HEATMAP_BINS
+    y_width = max(float(bounds["max_latency"][0]), 1.0) / HEATMAP_BINS
+    cells = get_data(f"""
+        SELECT
+            MIN(CAST(tokens_in / :x_width AS INTEGER), :last_bin) AS x_bin,
+            MIN(CAST(latency_ms / :y_width AS INTEGER), :last_bin) AS y_bin,
+            COUNT(*) AS n
+        FROM llm_logs
+        {HEATMAP_WHERE}
+        GROUP BY x_bin, y_bin
+    """, {**log_params, "x_width": x_width, "y_width": y_width, "last_bin": HEATMAP_BINS - 1})
+
+    grid = np.zeros((HEATMAP_BINS, HEATMAP_BINS))
+    grid[cells["y_bin"].to_numpy(), cells["x_bin"].to_numpy()] = cells["n"].to_numpy()
+
+    fig, ax = plt.subplots()
+    mesh = ax.pcolormesh(
+        np.arange(HEATMAP_BINS + 1) * x_width,
+        np.arange(HEATMAP_BINS + 1) * y_width,
+        np.ma.masked_equal(grid, 0),
+        cmap="viridis"
+    )
+    fig.colorbar(mesh, ax=ax, label="Requests")
+    ax.set_xlabel("Tokens In")
+    ax.set_ylabel("Latency (ms)")
+    st.pyplot(fig)
 
 
 # ============================================================
@@ -70,17 +133,36 @@ st.pyplot(fig)
 # ============================================================
 st.subheader("🤖 Model Performance Comparison")
 
-model_df = logs.groupby("model_name").agg({
-    "latency_ms": "mean",
-    "cost_usd": "mean",
-    "cost_inr": "mean",
-    "error_type": lambda x: x.notnull().mean() * 100
-}).rename(columns={"error_type": "error_rate(%)"})
-
-st.dataframe(model_df)
+# Per-model averages from the hour/day rollups, percentiles from the sketches
+ROLLUP_WHERE, rollup_params = rollup_where(start_ms, end_ms)
+model_df = get_data(f"""
+    SELECT
+        model_name,
+        TOTAL(requests) AS requests,
+        TOTAL(sum_latency_ms) / NULLIF(TOTAL(requests), 0) AS latency_ms,
+        TOTAL(sum_cost_usd) / NULLIF(TOTAL(requests), 0) AS cost_usd,
+        TOTAL(sum_cost_inr) / NULLIF(TOTAL(requests), 0) AS cost_inr,
+        TOTAL(CASE WHEN is_error = 1 THEN requests ELSE 0 END) * 100
+            / NULLIF(TOTAL(requests), 0) AS "error_rate(%)"
+    FROM {rollup_table(pick_resolution(start_ms, end_ms))}
+    {ROLLUP_WHERE}
+    GROUP BY model_name
+""", rollup_params)
+
+if not model_df.empty:
+    model_df = model_df.set_index("model_name")
+    try:
+        sketches = get_sketches(start_ms, end_ms)
+    except Exception:
+        sketches = {}
+    for q in (50, 95, 99):
+        model_df[f"p{q}_latency_ms"] = [
+            sketches[m].quantile(q) if m in sketches else None for m in model_df.index
+        ]
+    st.dataframe(model_df)
 
-st.bar_chart(model_df["latency_ms"])
-st.bar_chart(model_df["cost_inr"])
+    st.bar_chart(model_df["latency_ms"])
+    st.bar_chart(model_df["cost_inr"])
 
 
 # ============================================================
@@ -88,13 +170,34 @@ st.bar_chart(model_df["cost_inr"])
 # ============================================================
 st.subheader("🧠 Prompt Effectiveness Ranking")
 
-prompt_df = logs.groupby("prompt").agg({
-    "cost_inr": "mean",
-    "latency_ms": "mean",
-    "error_type": lambda x: x.notnull().mean() * 100
-}).rename(columns={"error_type": "error_rate(%)"}).sort_values("error_rate(%)")
-
-st.dataframe(prompt_df.head(20))
+# Grouped by template fingerprint; all-time stats come straight from prompt_templates
+if start_ms is None and end_ms is None:
+    prompt_df = get_data(f"""
+        {TEMPLATE_STATS_SQL}
+        ORDER BY "error_rate(%)", calls DESC
+        LIMIT 20
+    """)
+else:
+    where_l, params_l = logs_where(start_ms, end_ms, prefix="l.")
+    prompt_df = get_data(f"""
+        SELECT
+            t.template,
+            COUNT(*) AS calls,
+            AVG(l.cost_inr) AS avg_cost_inr,
+            AVG(l.latency_ms) AS avg_latency,
+            AVG(l.error_type IS NOT NULL) * 100 AS "error_rate(%)"
+        FROM llm_logs l
+        JOIN prompt_templates t ON t.fingerprint = l.prompt_fp
+        {where_l}
+        GROUP BY l.prompt_fp
+        ORDER BY "error_rate(%)", calls DESC
+        LIMIT 20
+    """, params_l)
+
+if not prompt_df.empty:
+    prompt_df = prompt_df[["template", "calls", "avg_cost_inr", "avg_latency", "error_rate(%)"]]
+
+st.dataframe(prompt_df.set_index("template") if not prompt_df.empty else prompt_df)
 
 
 # ============================================================
@@ -102,11 +205,7 @@ st.dataframe(prompt_df.head(20))
 # ============================================================
 st.subheader("⚠ Error Spike Days")
 
-err_df = logs.copy()
-err_df["date"] = pd.to_datetime(err_df["timestamp"]).dt.date
-error_days = err_df.groupby("date")["error_type"].apply(lambda x: x.notnull().sum())
-
-st.line_chart(error_days)
+st.line_chart(daily["error_count"])
 
 
 # ============================================================
@@ -114,8 +213,18 @@ st.line_chart(error_days)
 # ============================================================
 st.subheader("🔍 Correlation Matrix — What affects latency and cost?")
 
-corr = logs[["tokens_in", "tokens_out", "latency_ms", "cost_inr", "cost_usd"]].corr()
+# Built from per-day sums / squares / cross-products (llm_moments_daily)
+moments = get_data(SUM_MOMENTS_SQL, day_params)
+
+if moments.empty or moments["n"][0] < 2:
+    st.info("Not enough requests in this range for correlations.")
+else:
+    corr = pd.DataFrame(correlation_from_moments(
+        {c: float(moments[c][0]) for c in MOMENT_COLUMNS}
+    )).astype(float)
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    sns.heatmap(corr, annot=True, cmap="coolwarm", vmin=-1, vmax=1, ax=ax)
+    st.pyplot(fig)
 
-fig, ax = plt.subplots(figsize=(6, 4))
-sns.heatmap(corr, annot=True, cmap="coolwarm", ax=ax)
-st.pyplot(fig)
+show_cache_stats()
@@ -1,18 +1,13 @@
 # dashboard/pages/3_Errors.py
 
 import streamlit as st
-import sqlite3
 import pandas as pd
-import os
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "llm_logs.db")
-DB_PATH = os.path.abspath(DB_PATH)
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
 
-def get_data(query, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params or {})
-    conn.close()
-    return df
+from dashboard.data import get_data, show_cache_stats
 
 st.title("⚠ Error Diagnostics")
 
@@ -59,13 +54,14 @@ st.subheader("Recent Error Logs (Last 100)")
 
 try:
     errors = get_data(f"""
-        SELECT timestamp, model_name, prompt, error_type, latency_ms
+        SELECT timestamp, model_name, prompt_preview AS prompt, error_type, latency_ms
         FROM llm_logs
         {WHERE}
-        ORDER BY timestamp DESC
+        ORDER BY ts_ms DESC
         LIMIT 100
     """, params)
     st.dataframe(errors)
 except Exception:
     st.info("No error logs to show yet.")
 
+show_cache_stats()
@@ -1,59 +1,246 @@
 # dashboard/pages/4_Logs.py
 
 import streamlit as st
-import sqlite3
 import pandas as pd
-import os
+from datetime import date, datetime, time as dtime, timedelta, timezone
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "llm_logs.db")
-DB_PATH = os.path.abspath(DB_PATH)
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
 
-def get_data(query, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params or {})
-    conn.close()
-    return df
+from core.search import search_sql, quote_fts
+from core.payloads import LOG_WITH_BODIES_SQL
+from core.retention import load_archived_log
+from dashboard.data import get_data, get_archive, show_cache_stats
+
+SEARCH_LIMIT = 500
+ARCHIVE_LIMIT = 1000
+SNIPPET_ROWS = 20
+PAGE_SIZES = [50, 100, 200]
 
 st.title("📄 Log Explorer")
 
 st.sidebar.header("Filters — Logs")
 
+source = st.sidebar.radio(
+    "Source", ["Live", "Archive"], horizontal=True,
+    help="Archive: days exported to Parquet by the retention job, with full prompts and responses"
+)
 search_text = st.sidebar.text_input("Search text in prompt/response", "")
 
-where = []
-params = {}
 
-if search_text:
-    where.append("(prompt LIKE :q OR response LIKE :q)")
-    params["q"] = f"%{search_text}%"
+def show_log_detail(log, prompt, response):
+    st.subheader("🔎 Log Detail")
+    st.markdown(
+        f"**{log['model_name']}** · {log['timestamp']} · session `{log['session_id']}` · "
+        f"user `{log['user_id']}` · {log['latency_ms']} ms · "
+        f"{log['tokens_in']} → {log['tokens_out']} tokens"
+    )
+    if log["error_type"]:
+        st.error(log["error_type"])
+    st.text_area("Prompt", prompt or "", height=150, disabled=True)
+    st.text_area("Response", response or "", height=250, disabled=True)
+    if log.get("metadata"):
+        st.code(log["metadata"], language="json")
 
-WHERE = ("WHERE " + " AND ".join(where)) if where else ""
 
-try:
-    df = get_data(f"""
-        SELECT
-            timestamp,
-            session_id,
-            user_id,
-            model_name,
-            prompt,
-            response,
-            tokens_in,
-            tokens_out,
-            latency_ms,
-            cost_usd,
-            cost_inr,
-            error_type
-        FROM llm_logs
-        {WHERE}
-        ORDER BY timestamp DESC
-        LIMIT 500
+# ============================================================
+# 🗄️ ARCHIVE (Parquet partitions written by core.retention)
+# ============================================================
+if source == "Archive":
+    archived = get_data("SELECT day FROM llm_archive ORDER BY day")
+    if archived.empty:
+        st.info("Nothing archived yet — days are archived by `python -m core.retention run`.")
+        show_cache_stats()
+        st.stop()
+
+    first = date.fromisoformat(archived["day"].iloc[0])
+    last = date.fromisoformat(archived["day"].iloc[-1])
+    picked = st.sidebar.date_input(
+        "Archived days", value=(max(first, last - timedelta(days=6)), last),
+        min_value=first, max_value=last, key="archive_days"
+    )
+    start_day, end_day = (picked[0], picked[-1]) if picked else (last, last)
+    st.sidebar.caption("Archive search matches plain text (case-insensitive).")
+
+    df = get_archive(
+        start_day.isoformat(), end_day.isoformat(),
+        text=search_text.strip() or None, limit=ARCHIVE_LIMIT
+    )
+    st.caption(
+        f"{len(df)} archived row(s) from {start_day} to {end_day}"
+        + (f" — only the newest {ARCHIVE_LIMIT} are shown" if len(df) >= ARCHIVE_LIMIT else "")
+    )
+
+    if df.empty:
+        st.info("No archived logs match.")
+    else:
+        event = st.dataframe(
+            df,
+            column_order=[c for c in df.columns if c not in ("id", "ts_ms")],
+            hide_index=True,
+            on_select="rerun",
+            selection_mode="single-row",
+            key="archive_table",
+            width="stretch"
+        )
+        rows = event.selection.rows
+        if rows:
+            picked_row = df.iloc[rows[0]]
+            log = load_archived_log(picked_row["day"], picked_row["id"])
+            if log is not None:
+                show_log_detail(log, log["prompt"], log["response"])
+        else:
+            st.caption("Select a row to load its full prompt and response.")
+
+    show_cache_stats()
+    st.stop()
+
+
+st.sidebar.caption(
+    'Full-text search: `"exact phrase"`, `prefix*`, `timeout NOT retry`, `a OR b`, `prompt:summary`'
+)
+
+page_size = st.sidebar.selectbox("Rows per page", PAGE_SIZES)
+
+# The list only carries previews; full bodies are loaded for the opened row
+LIST_COLUMNS = [
+    "l.id", "l.ts_ms", "l.timestamp", "l.session_id", "l.user_id", "l.model_name",
+    "l.prompt_preview AS prompt",
+    "l.response_preview AS response",
+    "l.tokens_in", "l.tokens_out", "l.latency_ms", "l.cost_usd", "l.cost_inr", "l.error_type"
+]
+HIDDEN = ["id", "ts_ms", "prompt_snippet", "response_snippet", "score"]
+
+
+# ---------- Keyset cursor ----------
+# Pages are sought on (ts_ms, id): the cursor is the last row of the previous
+# page, so page 1000 costs the same index seek as page 1.
+if "logs_cursor" not in st.session_state:
+    st.session_state.logs_cursor = None
+    st.session_state.logs_history = []
+
+
+def go_latest():
+    st.session_state.logs_cursor = None
+    st.session_state.logs_history = []
+
+
+def go_older(last_row):
+    st.session_state.logs_history.append(st.session_state.logs_cursor)
+    st.session_state.logs_cursor = last_row
+
+
+def go_newer():
+    st.session_state.logs_cursor = st.session_state.logs_history.pop()
+
+
+def go_to_time(day, at):
+    jump_ms = int(datetime.combine(day, at, tzinfo=timezone.utc).timestamp() * 1000)
+    # (jump_ms + 1, '') sorts after every row at or before jump_ms
+    st.session_state.logs_cursor = (jump_ms + 1, "")
+    st.session_state.logs_history = []
+
+
+st.sidebar.subheader("Jump to time (UTC)")
+jump_day = st.sidebar.date_input("Date", value=None, key="jump_day")
+jump_at = st.sidebar.time_input("Time", value=dtime(23, 59), key="jump_time")
+st.sidebar.button(
+    "Go", disabled=jump_day is None,
+    on_click=lambda: go_to_time(st.session_state.jump_day, st.session_state.jump_time)
+)
+
+
+def search(text):
+    """Ranked FTS5 search; queries that are not valid FTS5 syntax are retried as plain words."""
+    try:
+        return get_data(search_sql(LIST_COLUMNS), {"q": text, "limit": SEARCH_LIMIT})
+    except Exception:
+        st.sidebar.warning("Not a valid search expression — searching for the words instead.")
+        return get_data(search_sql(LIST_COLUMNS), {"q": quote_fts(text), "limit": SEARCH_LIMIT})
+
+
+def browse_page(cursor, size):
+    """One page in (ts_ms, id) DESC order, plus one extra row to tell if there is another page."""
+    where, params = "", {"limit": size + 1}
+    if cursor is not None:
+        where = "WHERE (l.ts_ms, l.id) < (:cursor_ts, :cursor_id)"
+        params.update(cursor_ts=cursor[0], cursor_id=cursor[1])
+    return get_data(f"""
+        SELECT {", ".join(LIST_COLUMNS)}
+        FROM llm_logs l
+        {where}
+        ORDER BY l.ts_ms DESC, l.id DESC
+        LIMIT :limit
     """, params)
+
+
+searching = bool(search_text.strip())
+has_more = False
+
+try:
+    if searching:
+        df = search(search_text)
+    else:
+        df = browse_page(st.session_state.logs_cursor, page_size)
+        has_more = len(df) > page_size
+        df = df.head(page_size)
 except Exception:
     df = pd.DataFrame()
 
+
+# ---------- Page controls ----------
+if not searching:
+    c1, c2, c3, c4 = st.columns([1, 1, 1, 3])
+    c1.button("⏮ Latest", on_click=go_latest, disabled=st.session_state.logs_cursor is None)
+    c2.button("◀ Newer", on_click=go_newer, disabled=not st.session_state.logs_history)
+    c3.button(
+        "Older ▶", disabled=not has_more, on_click=go_older,
+        args=((int(df["ts_ms"].iloc[-1]), df["id"].iloc[-1]),) if has_more else ()
+    )
+    if not df.empty:
+        c4.caption(
+            f"Page {len(st.session_state.logs_history) + 1} · "
+            f"{df['timestamp'].iloc[0]} → {df['timestamp'].iloc[-1]}"
+        )
+
+if not df.empty and searching:
+    st.caption(f"{len(df)} best match(es), [matched terms] in brackets")
+    for row in df.head(SNIPPET_ROWS).itertuples():
+        with st.container(border=True):
+            st.markdown(f"**{row.model_name}** · {row.timestamp} · `{row.session_id}`")
+            st.text(f"Prompt:   {row.prompt_snippet}")
+            st.text(f"Response: {row.response_snippet}")
+            if row.error_type:
+                st.text(f"Error:    {row.error_type}")
+
+selected = None
 if not df.empty:
-    st.dataframe(df, use_container_width=True)
+    event = st.dataframe(
+        df,
+        column_order=[c for c in df.columns if c not in HIDDEN],
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key="logs_table",
+        width="stretch"
+    )
+    rows = event.selection.rows
+    if rows:
+        selected = df["id"].iloc[rows[0]]
+    else:
+        st.caption("Select a row to load its full prompt and response.")
 else:
     st.info("No logs found for current filters/search.")
 
+
+# ============================================================
+# 🔎 SELECTED LOG (full bodies, loaded on demand)
+# ============================================================
+if selected is not None:
+    detail = get_data(LOG_WITH_BODIES_SQL, {"id": selected})
+    if not detail.empty:
+        log = detail.iloc[0]
+        show_log_detail(log, log["prompt_text"], log["response_text"])
+
+show_cache_stats()
@@ -1,18 +1,15 @@
 # dashboard/pages/1_Models.py
 
 import streamlit as st
-import sqlite3
 import pandas as pd
-import os
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "llm_logs.db")
-DB_PATH = os.path.abspath(DB_PATH)
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
 
-def get_data(query, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params or {})
-    conn.close()
-    return df
+from core.utils import time_range_bounds
+from core.rollups import pick_resolution, rollup_where, rollup_table
+from dashboard.data import get_data, get_sketches, show_cache_stats
 
 st.title("🤖 Model Analytics")
 
@@ -27,29 +24,38 @@ except Exception:
 
 model_filter = st.sidebar.selectbox("Model", ["All"] + models)
 
-where = []
-params = {}
+range_option = st.sidebar.selectbox(
+    "Time Range",
+    ["All time", "Last 7 days", "Last 30 days", "Custom range"]
+)
 
-if model_filter != "All":
-    where.append("model_name = :model")
-    params["model"] = model_filter
+from_date, to_date = None, None
+if range_option == "Custom range":
+    from_date = st.sidebar.date_input("From")
+    to_date = st.sidebar.date_input("To")
 
-WHERE = ("WHERE " + " AND ".join(where)) if where else ""
+start_ms, end_ms = time_range_bounds(range_option, from_date, to_date)
+
+# Per-model totals come from the time-bucketed rollups, percentiles from the sketches
+resolution = pick_resolution(start_ms, end_ms)
+WHERE, params = rollup_where(start_ms, end_ms, model=None if model_filter == "All" else model_filter)
 
 try:
     df = get_data(f"""
         SELECT
             model_name,
-            COUNT(*) AS calls,
-            AVG(latency_ms) AS avg_latency,
-            MIN(latency_ms) AS min_latency,
-            MAX(latency_ms) AS max_latency,
-            SUM(tokens_in) AS total_tokens_in,
-            SUM(tokens_out) AS total_tokens_out,
-            SUM(cost_usd) AS total_cost_usd,
-            SUM(cost_inr) AS total_cost_inr,
-            SUM(CASE WHEN error_type IS NOT NULL THEN 1 ELSE 0 END) AS errors
-        FROM llm_logs
+            TOTAL(requests) AS calls,
+            TOTAL(sum_latency_ms) / NULLIF(TOTAL(requests), 0) AS avg_latency,
+            MAX(max_latency_ms) AS max_latency,
+            TOTAL(sum_tokens_in) AS total_tokens_in,
+            TOTAL(sum_tokens_out) AS total_tokens_out,
+            TOTAL(sum_cost_usd) AS total_cost_usd,
+            TOTAL(sum_cost_inr) AS total_cost_inr,
+            TOTAL(CASE WHEN is_error = 1 THEN requests ELSE 0 END) AS errors,
+            TOTAL(streamed) AS streamed_calls,
+            TOTAL(sum_ttft_ms) / NULLIF(TOTAL(streamed), 0) AS avg_ttft,
+            TOTAL(sum_tokens_per_s) / NULLIF(TOTAL(streamed), 0) AS avg_tokens_per_s
+        FROM {rollup_table(resolution)}
         {WHERE}
         GROUP BY model_name
         ORDER BY calls DESC
@@ -58,17 +64,63 @@ except Exception:
     df = pd.DataFrame()
 
 if not df.empty:
+    # Tail latency from the merged per-bucket sketches (successful calls only)
+    try:
+        sketches = get_sketches(start_ms, end_ms, None if model_filter == "All" else model_filter)
+    except Exception:
+        sketches = {}
+    df.insert(2, "min_latency", [
+        sketches[m].min if m in sketches else None for m in df["model_name"]
+    ])
+    for q in (50, 95, 99):
+        df[f"p{q}_latency"] = [
+            sketches[m].quantile(q) if m in sketches else None for m in df["model_name"]
+        ]
+
+    # Time to first token of streamed calls
+    try:
+        ttft_sketches = get_sketches(
+            start_ms, end_ms, None if model_filter == "All" else model_filter, metric="ttft_ms"
+        )
+    except Exception:
+        ttft_sketches = {}
+    for q in (50, 95):
+        df[f"p{q}_ttft"] = [
+            ttft_sketches[m].quantile(q) if m in ttft_sketches else None for m in df["model_name"]
+        ]
+
     st.subheader("Model Summary")
     st.dataframe(df)
 
     st.subheader("Calls per Model")
     st.bar_chart(df.set_index("model_name")["calls"])
 
-    st.subheader("Average Latency per Model (ms)")
-    st.bar_chart(df.set_index("model_name")["avg_latency"])
+    st.subheader("Latency Percentiles per Model (ms)")
+    st.bar_chart(df.set_index("model_name")[["p50_latency", "p95_latency", "p99_latency"]])
+
+    streamed = df[df["streamed_calls"] > 0]
+    if not streamed.empty:
+        st.subheader("Streaming: Time to First Token (ms)")
+        st.bar_chart(streamed.set_index("model_name")[["p50_ttft", "p95_ttft"]])
+
+        st.subheader("Streaming: Tokens per Second")
+        st.bar_chart(streamed.set_index("model_name")["avg_tokens_per_s"])
+
+    st.subheader("Latency Histogram")
+    if sketches:
+        hist_model = st.selectbox("Model", sorted(sketches), key="hist_model")
+        bars = sketches[hist_model].histogram()
+        hist = pd.DataFrame(
+            {"requests": [c for _, _, c in bars]},
+            index=[f"{lo:,.0f}–{hi:,.0f}" for lo, hi, _ in bars]
+        )
+        st.bar_chart(hist)
+    else:
+        st.info("No successful calls in this range.")
 
     st.subheader("Total Cost per Model (₹)")
     st.bar_chart(df.set_index("model_name")["total_cost_inr"])
 else:
     st.info("No model analytics available yet. Run `python main.py` more times.")
 
+show_cache_stats()
@@ -0,0 +1,112 @@
+# dashboard/pages/Overhead.py
+
+import streamlit as st
+import pandas as pd
+
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
+
+from core.utils import time_range_bounds
+from core.rollups import pick_resolution
+from core.overhead import overhead_where
+from core.sketch import merge_sketch_rows
+from dashboard.data import get_data, show_cache_stats
+
+st.title("⏱️ Pipeline Overhead")
+st.caption(
+    "Time the observability pipeline spends on each call, per stage (see core/overhead.py). "
+    "`pipeline` = route + cost + log, the latency this project adds; `llm` is the time in the client, for scale. "
+    "`write.*` stages run in the caller with sync logging, and in the writer thread or collector otherwise."
+)
+
+st.sidebar.header("Filters — Overhead")
+
+range_option = st.sidebar.selectbox(
+    "Time Range",
+    ["All time", "Last 7 days", "Last 30 days", "Custom range"]
+)
+
+from_date, to_date = None, None
+if range_option == "Custom range":
+    from_date = st.sidebar.date_input("From")
+    to_date = st.sidebar.date_input("To")
+
+start_ms, end_ms = time_range_bounds(range_option, from_date, to_date)
+resolution = pick_resolution(start_ms, end_ms)
+RANGE, params = overhead_where(resolution, start_ms, end_ms)
+
+try:
+    summary = get_data(f"""
+        SELECT stage,
+               TOTAL(calls) AS samples,
+               TOTAL(sum_ms) / NULLIF(TOTAL(calls), 0) AS avg_ms,
+               MAX(max_ms) AS max_ms,
+               TOTAL(sum_ms) AS total_ms
+        FROM llm_overhead
+        {RANGE}
+        GROUP BY stage
+        ORDER BY stage
+    """, params)
+except Exception:
+    summary = pd.DataFrame()
+
+if not summary.empty:
+    # Tail latency per stage from the merged per-bucket sketches
+    try:
+        rows = get_data(f"SELECT stage, sketch FROM llm_overhead {RANGE}", params)
+        sketches = merge_sketch_rows(zip(rows["stage"], rows["sketch"]))
+    except Exception:
+        sketches = {}
+    for q in (50, 95, 99):
+        summary[f"p{q}_ms"] = [
+            sketches[s].quantile(q) if s in sketches else None for s in summary["stage"]
+        ]
+
+    stats = summary.set_index("stage")
+    c1, c2, c3 = st.columns(3)
+    if "pipeline" in stats.index:
+        c1.metric("Avg Overhead per Call (ms)", f"{stats['avg_ms']['pipeline']:.2f}")
+        c2.metric("p95 Overhead per Call (ms)", f"{stats['p95_ms']['pipeline'] or 0:.2f}")
+        pipeline_ms = stats["total_ms"]["pipeline"]
+        llm_ms = stats["total_ms"].get("llm", 0)
+        if pipeline_ms + llm_ms:
+            c3.metric("Share of Call Time", f"{100 * pipeline_ms / (pipeline_ms + llm_ms):.2f}%")
+
+    st.subheader("Stages")
+    st.dataframe(summary.drop(columns="total_ms"))
+
+    stages = [s for s in summary["stage"] if s != "llm"]
+    st.subheader("Percentiles per Stage (ms)")
+    st.bar_chart(summary[summary["stage"] != "llm"].set_index("stage")[["p50_ms", "p95_ms", "p99_ms"]])
+
+    # -------- OVER TIME ----------
+    try:
+        series = get_data(f"""
+            SELECT bucket_ms, stage, sum_ms / calls AS avg_ms, sum_ms
+            FROM llm_overhead
+            {RANGE}
+            ORDER BY bucket_ms
+        """, params)
+    except Exception:
+        series = pd.DataFrame()
+
+    if not series.empty:
+        series["time"] = pd.to_datetime(series["bucket_ms"], unit="ms")
+
+        chosen = st.multiselect("Stages", stages, default=[s for s in stages if not s.startswith("write.")])
+        if chosen:
+            st.subheader(f"Average Stage Time (ms, per {resolution})")
+            avg = series[series["stage"].isin(chosen)].pivot(index="time", columns="stage", values="avg_ms")
+            st.line_chart(avg)
+
+        sums = series.pivot(index="time", columns="stage", values="sum_ms")
+        if "pipeline" in sums and "llm" in sums:
+            st.subheader(f"Overhead Share of Call Time (%, per {resolution})")
+            share = 100 * sums["pipeline"] / (sums["pipeline"] + sums["llm"])
+            st.line_chart(share.rename("overhead_pct"))
+else:
+    st.info("No overhead samples yet. Stage timings are written every few seconds by processes that log calls "
+            "(set LLM_OBS_OVERHEAD=0 to turn them off).")
+
+show_cache_stats()
@@ -1,18 +1,14 @@
 # dashboard/pages/2_Prompts.py
 
 import streamlit as st
-import sqlite3
 import pandas as pd
-import os
 
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "llm_logs.db")
-DB_PATH = os.path.abspath(DB_PATH)
+import sys, os
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(ROOT)
 
-def get_data(query, params=None):
-    conn = sqlite3.connect(DB_PATH)
-    df = pd.read_sql_query(query, conn, params=params or {})
-    conn.close()
-    return df
+from core.prompts import TEMPLATE_STATS_SQL
+from dashboard.data import get_data, show_cache_stats
 
 st.title("🧠 Prompt Intelligence")
 
@@ -27,42 +23,58 @@ except Exception:
 
 model_filter = st.sidebar.selectbox("Model", ["All"] + models)
 
-where = []
-params = {}
-
-if model_filter != "All":
-    where.append("model_name = :model")
-    params["model"] = model_filter
-
-WHERE = ("WHERE " + " AND ".join(where)) if where else ""
-
+# Prompts are grouped by template fingerprint (numbers, ids and quoted values
+# masked at log time). All models → the prompt_templates dimension table, O(templates);
+# one model → an integer GROUP BY over that model's rows.
 try:
-    df = get_data(f"""
-        SELECT
-            prompt,
-            COUNT(*) AS calls,
-            AVG(latency_ms) AS avg_latency,
-            SUM(cost_inr) AS total_cost_inr,
-            SUM(CASE WHEN error_type IS NOT NULL THEN 1 ELSE 0 END) AS errors
-        FROM llm_logs
-        {WHERE}
-        GROUP BY prompt
-        HAVING prompt IS NOT NULL AND prompt != ''
-        ORDER BY calls DESC
-        LIMIT 50
-    """, params)
+    if model_filter == "All":
+        df = get_data(f"{TEMPLATE_STATS_SQL} ORDER BY calls DESC LIMIT 50")
+    else:
+        df = get_data("""
+            SELECT
+                t.fingerprint, t.template, t.example_prompt,
+                COUNT(*) AS calls,
+                TOTAL(l.error_type IS NOT NULL) AS errors,
+                AVG(l.error_type IS NOT NULL) * 100 AS "error_rate(%)",
+                AVG(l.latency_ms) AS avg_latency,
+                TOTAL(l.cost_usd) AS total_cost_usd,
+                TOTAL(l.cost_inr) AS total_cost_inr,
+                AVG(l.cost_inr) AS avg_cost_inr,
+                MAX(l.ts_ms) AS last_seen_ms
+            FROM llm_logs l
+            JOIN prompt_templates t ON t.fingerprint = l.prompt_fp
+            WHERE l.model_name = :model
+            GROUP BY l.prompt_fp
+            ORDER BY calls DESC
+            LIMIT 50
+        """, {"model": model_filter})
 except Exception:
     df = pd.DataFrame()
 
 if not df.empty:
-    st.subheader("Top 50 Prompts (by usage)")
-    st.dataframe(df)
+    df["last_seen"] = pd.to_datetime(df["last_seen_ms"], unit="ms")
+    # Short, unique labels for the charts
+    df["label"] = [
+        f"{t[:60]}{'…' if len(t) > 60 else ''} #{fp & 0xFFFF:04x}"
+        for t, fp in zip(df["template"].fillna(""), df["fingerprint"])
+    ]
+
+    st.subheader("Top 50 Prompt Templates (by usage)")
+    st.dataframe(
+        df,
+        column_order=[
+            "template", "calls", "errors", "error_rate(%)", "avg_latency",
+            "total_cost_inr", "avg_cost_inr", "last_seen", "example_prompt"
+        ],
+        hide_index=True
+    )
 
-    st.subheader("Most Used Prompts")
-    st.bar_chart(df.set_index("prompt")["calls"])
+    st.subheader("Most Used Templates")
+    st.bar_chart(df.set_index("label")["calls"])
 
-    st.subheader("Most Expensive Prompts (₹)")
-    st.bar_chart(df.set_index("prompt")["total_cost_inr"])
+    st.subheader("Most Expensive Templates (₹)")
+    st.bar_chart(df.set_index("label")["total_cost_inr"].sort_values(ascending=False))
 else:
     st.info("No prompt analytics yet. Generate more interactions.")
 
+show_cache_stats()
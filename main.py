@@ -1,48 +1,125 @@
 # main.py
 
-import time, os
+import time, os, sys, json, argparse
+from functools import partial
 from pathlib import Path
 from dotenv import load_dotenv
-from groq import Groq
 
-from core.db import init_db, get_connection
+from core.db import init_db
 from core.logger import LLMLogger
-from core.analytics import update_daily_metrics
-from core.currency import get_inr_rate
-from core.alerts import run_alert_checks
+from core.currency import get_rate_service, DISPLAY_CURRENCY
+from core.alerts import AlertEngine
+from core.router import ModelRouter
+from core.batch import BatchRunner, BATCH_CONCURRENCY, MAX_RETRIES, format_report
+from core.streaming import StreamTimer, chunk_text, chunk_usage
+from core.clients import make_client
+from core.overhead import CallOverhead, maybe_profile
+from core.metrics import get_registry, start_metrics_server
 
 env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(env_path)
 
-init_db()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Opt-in collector mode: events, alert incidents and FX rates go to the collector
+# daemon, the database's only writer, which also creates and migrates the schema
+if os.getenv("LLM_OBS_COLLECTOR_URL"):
+    LLMLogger.enable_collector(url=os.getenv("LLM_OBS_COLLECTOR_URL"))
+else:
+    init_db()
+    # Opt-in buffered logging: rows are committed in batches by a background thread
+    if os.getenv("LLM_LOG_ASYNC") == "1":
+        LLMLogger.enable_async()
 
+# Alerts are evaluated in memory from every logged event (success or error)
+alert_engine = AlertEngine()
+LLMLogger.add_listener(alert_engine.observe)
+
+# Prometheus counters/histograms are updated from every logged event too (see core/metrics.py);
+# LLM_OBS_METRICS_PORT serves them on /metrics from this process
+LLMLogger.add_listener(get_registry().observe)
+if os.getenv("LLM_OBS_METRICS_PORT"):
+    start_metrics_server()
+
+# FX rates are cached in memory for the day and refreshed in the background after midnight
+fx = get_rate_service()
+fx.start_prefetch()
+
+# The LLM client is built on first use from LLM_OBS_LLM_BACKEND ("groq" or "fake",
+# see core/clients.py), or swapped in with set_client()
+client = None
+
+# Batch mode retries 429s itself (with jitter, under its rate limits)
+batch_client = None
+
+
+def get_client():
+    global client
+    if client is None:
+        client = make_client()
+    return client
+
+
+def get_batch_client():
+    global batch_client
+    if batch_client is None:
+        batch_client = get_client().with_options(max_retries=0)
+    return batch_client
+
+
+def set_client(llm_client):
+    """Route every following call through `llm_client` (anything shaped like groq.Groq)."""
+    global client, batch_client
+    client = llm_client
+    batch_client = None
+    # The model catalog belongs to the client; fetch the new one in the background
+    router.catalog.clear()
+    router.warm_up()
 
-def get_available_groq_model():
-    try:
-        model_list = client.models.list()
-        model_ids = [m.id for m in model_list.data]
-        preferred = ["llama", "mixtral", "gemma"]
-
-        for k in preferred:
-            for m in model_ids:
-                if k in m.lower():
-                    print(f"[MODEL SELECTED] {m}")
-                    return m
-        
-        print(f"[MODEL SELECTED] {model_ids[0]}")
-        return model_ids[0]
 
+def list_groq_models():
+    try:
+        return [m.id for m in get_client().models.list().data]
     except Exception as e:
         raise RuntimeError(f"Failed fetching models: {e}")
 
 
+# Catalog is cached with a TTL and refreshed in the background; routing uses
+# recent latency/error stats from llm_logs (see core/router.py)
+router = ModelRouter(list_groq_models)
+# The catalog is fetched by the first call, which is what builds the client
+router.stats.prefetch()
+
+
+def get_available_groq_model():
+    model, decision = router.choose()
+    print(f"[MODEL SELECTED] {model} ({decision['policy']})")
+    return model, decision
+
+
 def call_llm(prompt, session_id="default", user_id="anonymous", temperature=0.7):
-    model = get_available_groq_model()
+    return complete(prompt, session_id, user_id, temperature)["response"]
+
+
+# ===== COST HANDLING =====
+def compute_costs(tokens):
+    """(cost_usd, cost_inr, cost_display) for `tokens` total tokens."""
+    cost_usd = (tokens / 1_000_000) * 5
+    return cost_usd, fx.convert(cost_usd, "INR"), fx.convert(cost_usd, DISPLAY_CURRENCY)
+
+
+def complete(prompt, session_id="default", user_id="anonymous", temperature=0.7, llm_client=None):
+    """
+    One logged completion. Returns {response, model, log_id, tokens_in,
+    tokens_out, latency_ms}; errors are logged and re-raised.
+    """
+    call = CallOverhead()
+    with call.stage("route"):
+        model, route = get_available_groq_model()
+    metadata = json.dumps({"route": route})
     start = time.time()
+    latency = 0
 
     try:
-        result = client.chat.completions.create(
+        result = (llm_client or get_client()).chat.completions.create(
             model=model,
             messages=[{"role": "user", "content": prompt}],
             temperature=temperature
@@ -51,74 +128,208 @@ def call_llm(prompt, session_id="default", user_id="anonymous", temperature=0.7)
         latency = int((time.time() - start) * 1000)
         response = result.choices[0].message.content
 
-        # ===== COST HANDLING =====
-        tokens = result.usage.total_tokens
-        cost_usd = (tokens / 1_000_000) * 5
-        cost_inr = cost_usd * get_inr_rate()
-
-        log_id = LLMLogger.log_text_interaction(
-            session_id=session_id,
-            user_id=user_id,
-            model_name=model,
-            prompt=prompt,
-            response=response,
-            tokens_in=result.usage.prompt_tokens,
-            tokens_out=result.usage.completion_tokens,
-            latency_ms=latency,
-            cost_usd=cost_usd,
-            cost_inr=cost_inr,
-            temperature=temperature
-        )
+        # Everything from here on is observability overhead inside the caller's latency
+        with maybe_profile("complete"):
+            with call.stage("cost"):
+                cost_usd, cost_inr, cost_display = compute_costs(result.usage.total_tokens)
+
+            with call.stage("log"):
+                log_id = LLMLogger.log_text_interaction(
+                    session_id=session_id,
+                    user_id=user_id,
+                    model_name=model,
+                    prompt=prompt,
+                    response=response,
+                    tokens_in=result.usage.prompt_tokens,
+                    tokens_out=result.usage.completion_tokens,
+                    latency_ms=latency,
+                    cost_usd=cost_usd,
+                    cost_inr=cost_inr,
+                    temperature=temperature,
+                    metadata=metadata,
+                    cost_display=cost_display,
+                    display_currency=DISPLAY_CURRENCY
+                )
 
         # -------- METRICS + ALERTS ----------
-        update_daily_metrics()
+        # llm_metrics_daily is updated incrementally and alerts are evaluated
+        # in memory, both from the logged event — no extra DB reads here
+
+        print(f"[LOGGED] → {log_id}")
+        return {
+            "response": response,
+            "model": model,
+            "log_id": log_id,
+            "tokens_in": result.usage.prompt_tokens,
+            "tokens_out": result.usage.completion_tokens,
+            "latency_ms": latency
+        }
+
+    except Exception as e:
+        latency = int((time.time() - start) * 1000)
+
+        with call.stage("log"):
+            LLMLogger.log_text_interaction(
+                session_id=session_id,
+                user_id=user_id,
+                model_name=model,
+                prompt=prompt,
+                response=None,
+                tokens_in=0,
+                tokens_out=0,
+                latency_ms=latency,
+                cost_usd=0,
+                cost_inr=0,
+                temperature=temperature,
+                error_type=str(e),
+                metadata=metadata
+            )
+        raise
+    finally:
+        call.finish(latency)
 
-        # Fetch log row + daily row for alert engine
-        conn = get_connection()
-        cur = conn.cursor()
 
-        log_row = cur.execute("SELECT * FROM llm_logs WHERE id = ?", (log_id,)).fetchone()
-        daily_row = cur.execute("SELECT * FROM llm_metrics_daily ORDER BY date DESC LIMIT 1").fetchone()
+# ============================================================
+# STREAMING MODE
+# ============================================================
+def stream_llm(prompt, session_id="default", user_id="anonymous", temperature=0.7, llm_client=None):
+    """
+    Yield response text chunks as they arrive. The call is logged once the
+    stream ends, with TTFT, generation time, tokens/sec and inter-token gap
+    percentiles (see core/streaming.py). A consumer that stops early is
+    logged as a cancelled call; errors are logged and re-raised.
+    """
+    call = CallOverhead()
+    with call.stage("route"):
+        model, route = get_available_groq_model()
+    metadata = json.dumps({"route": route, "stream": True})
+    timer = StreamTimer().start()
+    parts, usage, error = [], None, None
 
-        if log_row and daily_row:
-            # Convert log_row to dict
-            log_cols = [c[1] for c in cur.execute("PRAGMA table_info(llm_logs)")]
-            log_row = dict(zip(log_cols, log_row))
+    try:
+        stream = (llm_client or get_client()).chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in stream:
+            usage = chunk_usage(chunk) or usage
+            text = chunk_text(chunk)
+            if text:
+                timer.mark()
+                parts.append(text)
+                yield text
+    except GeneratorExit:
+        error = "cancelled: stream closed by caller"
+        raise
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        latency = int(timer.elapsed_ms())
+        tokens_in = usage.prompt_tokens if usage else 0
+        tokens_out = usage.completion_tokens if usage else timer.chunks
+        with maybe_profile("stream"):
+            with call.stage("cost"):
+                cost_usd, cost_inr, cost_display = compute_costs(
+                    usage.total_tokens if usage else tokens_out
+                )
 
-            # Convert daily_row to dict
-            daily_cols = [c[1] for c in cur.execute("PRAGMA table_info(llm_metrics_daily)")]
-            daily_row = dict(zip(daily_cols, daily_row))
+            with call.stage("log"):
+                log_id = LLMLogger.log_text_interaction(
+                    session_id=session_id,
+                    user_id=user_id,
+                    model_name=model,
+                    prompt=prompt,
+                    response="".join(parts) or None,
+                    tokens_in=tokens_in,
+                    tokens_out=tokens_out,
+                    latency_ms=latency,
+                    cost_usd=cost_usd,
+                    cost_inr=cost_inr,
+                    temperature=temperature,
+                    error_type=error,
+                    metadata=metadata,
+                    cost_display=cost_display,
+                    display_currency=DISPLAY_CURRENCY,
+                    stream_metrics=timer.metrics(tokens_out if usage else None)
+                )
+        call.finish(latency)
+        if error is None:
+            print(f"[LOGGED] → {log_id}")
 
-        conn.close()
 
-        if log_row and daily_row:
-            run_alert_checks(log_row, daily_row)
+# ============================================================
+# BATCH MODE
+# ============================================================
+def batch_runner(concurrency=BATCH_CONCURRENCY, requests_per_min=None, tokens_per_min=None,
+                 max_retries=MAX_RETRIES):
+    """
+    BatchRunner over complete(): runner.run(prompts) yields results as they
+    finish, runner.report() summarizes the run. Every attempt is logged.
+    """
+    return BatchRunner(
+        partial(complete, llm_client=get_batch_client()),
+        concurrency=concurrency,
+        requests_per_min=requests_per_min,
+        tokens_per_min=tokens_per_min,
+        max_retries=max_retries
+    )
 
-        print(f"[LOGGED] → {log_id}")
-        return response
 
-    except Exception as e:
-        latency = int((time.time() - start) * 1000)
+def read_jobs(path):
+    """Prompts from a .jsonl file ({"prompt", "id", "session_id", "user_id", "temperature"}) or one per line."""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                job = json.loads(line)
+                job.setdefault("id", n)
+                yield job
+            else:
+                yield {"id": n, "prompt": line}
 
-        LLMLogger.log_text_interaction(
-            session_id=session_id,
-            user_id=user_id,
-            model_name=model,
-            prompt=prompt,
-            response=None,
-            tokens_in=0,
-            tokens_out=0,
-            latency_ms=latency,
-            cost_usd=0,
-            cost_inr=0,
-            temperature=temperature,
-            error_type=str(e)
-        )
 
-        update_daily_metrics()
-        raise
+def run_batch_cli(args):
+    # Rows are committed in batches by the background writer instead of one transaction per call
+    # (no-op in collector mode, which batches already)
+    LLMLogger.enable_async()
+    runner = batch_runner(args.concurrency, args.rpm, args.tpm, args.max_retries)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        for result in runner.run(read_jobs(args.batch)):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    LLMLogger.flush()
+    print(format_report(runner.report()), file=sys.stderr)
 
 
 if __name__ == "__main__":
-    answer = call_llm("What is quantum computing?")
-    print("\nMODEL RESPONSE:\n", answer)
+    # python main.py                                   → one sample prompt
+    # python main.py --stream "Explain WAL mode"        → print tokens as they arrive
+    # python main.py --batch prompts.jsonl --out results.jsonl --concurrency 8 --rpm 30 --tpm 6000
+    parser = argparse.ArgumentParser(description="Call the LLM (one prompt, or a batch file)")
+    parser.add_argument("--stream", metavar="PROMPT", help="stream one prompt's response to stdout")
+    parser.add_argument("--batch", help="prompt file: .jsonl objects with a 'prompt' key, or one prompt per line")
+    parser.add_argument("--out", default="batch_results.jsonl", help="results as JSONL, in completion order (\"-\" = stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, help="requests per minute limit")
+    parser.add_argument("--tpm", type=int, help="tokens per minute limit")
+    parser.add_argument("--max-retries", type=int, default=MAX_RETRIES, help="retries of rate-limited (429) calls")
+    args = parser.parse_args()
+
+    if args.batch:
+        run_batch_cli(args)
+    elif args.stream:
+        for text in stream_llm(args.stream):
+            print(text, end="", flush=True)
+        print()
+    else:
+        answer = call_llm("What is quantum computing?")
+        print("\nMODEL RESPONSE:\n", answer)